@@ -136,7 +136,8 @@ bool checkSession() {
         json.iteratorGet(i, type, key, value);
         if (type != FirebaseJson::JSON_OBJECT) continue;
         
-        String sessionPath = path + "/" + String(i);
+        // Noeud indexé par session_id; ancien format tableau: la clé est vide, prendre l'index
+        String sessionPath = path + "/" + (key.length() > 0 ? key : String(i));
         
         String status = "";
         if (Firebase.getString(fbData, sessionPath + "/status")) {
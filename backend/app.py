@@ -10,10 +10,12 @@ from routes.rooms import rooms_bp
 from routes.groups import groups_bp
 from routes.subjects import subjects_bp
 from routes.schedule import schedule_bp
-from routes.sessions import sessions_bp, init_scheduler
+from routes.sessions import sessions_bp, start_scheduler_election
 from routes.attendance import attendance_bp
 from routes.dashboard import dashboard_bp
 from routes.teachers import teachers_bp
+from routes.devices import devices_bp
+from firebase_config import firebase
 
 # Create Flask app
 app = Flask(__name__)
@@ -32,6 +34,7 @@ app.register_blueprint(sessions_bp)
 app.register_blueprint(attendance_bp)
 app.register_blueprint(dashboard_bp)
 app.register_blueprint(teachers_bp)
+app.register_blueprint(devices_bp)
 
 # ================ MAIN ROUTES ================
 @app.route('/')
@@ -50,7 +53,11 @@ def home():
             'sessions': '/api/sessions',
             'attendance': '/api/attendance',
             'teachers': '/api/teachers',
+            'device_scans': '/api/devices/<esp32_id>/scans',
+            'device_state': '/api/devices/<esp32_id>/state',
+            'device_wait': '/api/devices/<esp32_id>/wait',
             'dashboard': '/api/dashboard/stats',
+            'storage': '/api/storage/status',
         }
     })
 
@@ -64,6 +71,15 @@ def health_check():
         'authentication': 'Fingerprint Only'
     })
 
+@app.route('/api/storage/status')
+def storage_status():
+    return jsonify({
+        'success': True,
+        'backend': firebase.backend.name,
+        'cache': firebase.cache_stats(),
+        'replica': firebase.replica_status()
+    })
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -78,7 +94,7 @@ def bad_request(error):
     return jsonify({'success': False, 'error': 'Bad request'}), 400
 
 if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-    init_scheduler(app)
+    start_scheduler_election(app)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -1,59 +1,187 @@
 # firebase_config.py
-import firebase_admin
-from firebase_admin import credentials, db
-import json
 import os
+import threading
+from services.cache import TTLCache
+from services.replica import SubtreeReplica
+from services.storage import KEY_PREFIX_END, create_backend_from_env, key_range, split_path
+
+# Collections de référence qui changent rarement: lues via le cache
+CACHED_COLLECTIONS = ('rooms', 'groups', 'subjects', 'teachers')
+
+# Sous-arbres relus en boucle par le scheduler et le dashboard (group_members
+# est écrit par le worker qui traite l'étudiant: pas de cache TTL par
+# processus, mais la réplique voit les écritures des autres workers)
+REPLICATED_PATHS = ('sessions', 'attendance', 'students', 'group_members')
 
 class FirebaseConfig:
-    """Configuration simple de Firebase"""
-    
-    def __init__(self):
-        # Initialiser Firebase une seule fois
-        if not firebase_admin._apps:
-            try:
-                # Chercher le fichier de service
-                service_key_path = "serviceAccountKey.json"
-                
-                if os.path.exists(service_key_path):
-                    cred = credentials.Certificate(service_key_path)
-                    firebase_admin.initialize_app(cred, {
-                        'databaseURL': 'https://iot-attendance-systeme-default-rtdb.europe-west1.firebasedatabase.app'
-                    })
-                    print("✅ Firebase initialisé avec le fichier de service")
-                else:
-                    print("⚠️  ATTENTION: serviceAccountKey.json non trouvé")
-                    print("🔗 Utilisation de la base de données en lecture seule")
-                    
-                    # Initialiser sans credentials (lecture seule)
-                    firebase_admin.initialize_app(options={
-                        'databaseURL': 'https://iot-attendance-systeme-default-rtdb.europe-west1.firebasedatabase.app'
-                    })
-            except Exception as e:
-                print(f"❌ Erreur initialisation Firebase: {e}")
-                raise
-        
-        self.db = db
-        self.root_ref = db.reference('/')
+    """Configuration simple de Firebase
+
+    Les accès passent par un backend de stockage (voir services/storage.py):
+    la Realtime Database via firebase_admin, ou une base locale en mémoire
+    quand STORAGE_BACKEND=local.
+
+    Les lectures sur CACHED_COLLECTIONS passent par un cache TTL; toute
+    écriture faite via cette classe invalide immédiatement les entrées
+    concernées.
+
+    En mode réplique (FIREBASE_REPLICA=1 ou enable_replica()), les
+    REPLICATED_PATHS sont suivis en streaming et lus depuis la mémoire;
+    les écritures faites via cette classe y sont reportées sans attendre
+    leur écho.
+
+    Chaque accès réel au backend est compté par thread (call_count()).
+    """
+    
+    def __init__(self, backend=None):
+        self.backend = backend or create_backend_from_env()
+        self._calls = threading.local()
+        self.root_ref = self.get_ref('/')
+        self.cache = TTLCache(
+            ttl=int(os.environ.get('CACHE_TTL_SECONDS', 300)),
+            max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 512))
+        )
+        self.replicas = {}
+        if os.environ.get('FIREBASE_REPLICA', '').lower() in ('1', 'true', 'yes'):
+            self.enable_replica()
     
     def get_ref(self, path=""):
         """Obtenir une référence à un chemin Firebase"""
-        return self.db.reference(path)
+        self._calls.count = getattr(self._calls, 'count', 0) + 1
+        return self.backend.reference(path)
+    
+    def call_count(self):
+        """Nombre de références obtenues par le thread courant"""
+        return getattr(self._calls, 'count', 0)
+    
+    def enable_replica(self, paths=REPLICATED_PATHS):
+        """Démarrer la réplique en mémoire des sous-arbres donnés"""
+        for path in paths:
+            if path not in self.replicas:
+                self.replicas[path] = SubtreeReplica(self.backend, path).start()
+        return self.replica_status()
+    
+    def disable_replica(self):
+        """Arrêter la réplique et revenir aux lectures directes"""
+        for replica in self.replicas.values():
+            replica.stop()
+        self.replicas = {}
+    
+    def replica_status(self):
+        """Etat de la réplique (synchronisation et fraîcheur)"""
+        return {
+            'enabled': bool(self.replicas),
+            'paths': {path: replica.status() for path, replica in self.replicas.items()}
+        }
+    
+    def _read(self, path):
+        """Lire un chemin, via la réplique ou le cache si possible"""
+        segments = split_path(path)
+        replica = self.replicas.get(segments[0]) if segments else None
+        if replica and replica.synced:
+            return replica.get(segments[1:])
+        
+        if not segments or segments[0] not in CACHED_COLLECTIONS:
+            return self.get_ref(path).get()
+        
+        cache_key = '/'.join(segments)
+        found, data = self.cache.get(cache_key)
+        if found:
+            return data
+        
+        data = self.get_ref(cache_key).get()
+        self.cache.set(cache_key, data)
+        return data
+    
+    def _invalidate(self, path, data=None):
+        """Invalider le cache après une écriture sur path"""
+        base = '/'.join(split_path(path))
+        if isinstance(data, dict) and not base:
+            # Mise à jour multi-chemins depuis la racine: seules les
+            # collections en cache sont concernées
+            for key in data:
+                segments = split_path(key)
+                if segments and segments[0] in CACHED_COLLECTIONS:
+                    self.cache.invalidate('/'.join(segments))
+        else:
+            self.cache.invalidate(base)
+    
+    def _apply_to_replicas(self, path, data, merge=False):
+        """Reporter une écriture dans la réplique (lecture de ses propres écritures)
+
+        ``merge=True`` pour ref.update(): chaque clé de data est un chemin
+        relatif à path, remplacé par sa valeur.
+        """
+        if not self.replicas:
+            return
+        segments = split_path(path)
+        if merge and isinstance(data, dict):
+            writes = [(segments + split_path(key), value) for key, value in data.items()]
+        else:
+            writes = [(segments, data)]
+        for target, value in writes:
+            replica = self.replicas.get(target[0]) if target else None
+            if replica:
+                replica.apply_write(target[1:], value)
+    
+    def cache_stats(self):
+        """Compteurs du cache de lecture"""
+        return self.cache.stats()
     
     def get_all(self, path):
         """Récupérer toutes les données d'un chemin"""
         try:
-            ref = self.get_ref(path)
-            data = ref.get()
+            data = self._read(path)
             return data if data is not None else {}
         except Exception as e:
             print(f"⚠️ Erreur récupération {path}: {e}")
             return {}
     
-    def get_one(self, path, key=None):
-        """Récupérer un élément spécifique"""
+    def get_range(self, path, start=None, end=None, limit_first=None, limit_last=None):
+        """Enfants de path dont la clé est entre start et end (inclus), dans
+        l'ordre des clés: seule cette plage est transférée
+
+        Les bornes sont des clés (ou préfixes): ajouter KEY_PREFIX_END à la fin
+        de ``end`` pour inclure toutes les clés qui commencent par ce préfixe.
+        Une erreur de lecture donne {} (voir ``query_range`` pour la lever).
+        """
         try:
-            ref = self.get_ref(path)
-            data = ref.get()
+            return self.query_range(path, start, end, limit_first, limit_last)
+        except Exception as e:
+            print(f"⚠️ Erreur requête {path} [{start}, {end}]: {e}")
+            return {}
+    
+    def query_range(self, path, start=None, end=None, limit_first=None, limit_last=None):
+        """Comme ``get_range``, mais les erreurs de lecture sont levées: pour
+        les lectures qui ne doivent pas prendre une panne pour un noeud vide
+        (export)"""
+        segments = split_path(path)
+        replica = self.replicas.get(segments[0]) if segments else None
+        if replica and replica.synced:
+            return key_range(replica.get(segments[1:]), start, end, limit_first, limit_last)
+
+        query = self.get_ref(path).order_by_key()
+        if start is not None:
+            query = query.start_at(start)
+        if end is not None:
+            query = query.end_at(end)
+        if limit_first is not None:
+            query = query.limit_to_first(limit_first)
+        if limit_last is not None:
+            query = query.limit_to_last(limit_last)
+        return query.get() or {}
+    
+    def get_one(self, path, key=None, legacy_list=False):
+        """Récupérer un élément spécifique
+
+        Par défaut seul le noeud ``path/key`` est lu. ``legacy_list=True``
+        active l'ancien mode (collection stockée en liste, recherche par
+        fingerprint_id) qui télécharge toute la collection.
+        """
+        try:
+            if key and not legacy_list:
+                return self._read(f"{path}/{key}")
+
+            data = self._read(path)
             
             if key:
                 # If it's a list (like students), search by key
@@ -77,6 +205,8 @@ class FirebaseConfig:
             
             if key:
                 ref.child(key).set(data)
+                self._invalidate(path)
+                self._apply_to_replicas(f"{path}/{key}", data)
                 return key
             else:
                 # If path exists and is a list, append to it
@@ -84,20 +214,28 @@ class FirebaseConfig:
                 if isinstance(existing_data, list):
                     existing_data.append(data)
                     ref.set(existing_data)
+                    self._invalidate(path)
+                    self._apply_to_replicas(path, existing_data)
                     return len(existing_data) - 1
                 else:
                     # Create as new array
                     ref.set([data])
+                    self._invalidate(path)
+                    self._apply_to_replicas(path, [data])
                     return 0
         except Exception as e:
             print(f"⚠️ Erreur création {path}: {e}")
             raise
     
-    def update(self, path, key, data):
-        """Mettre à jour une entrée existante"""
+    def update(self, path, key, data, legacy_list=False):
+        """Mettre à jour une entrée existante
+
+        ``legacy_list=True`` relit toute la collection pour mettre à jour
+        une entrée d'une liste (ancien format des étudiants).
+        """
         try:
             ref = self.get_ref(path)
-            existing_data = ref.get()
+            existing_data = ref.get() if legacy_list else None
             
             if isinstance(existing_data, list):
                 # Find and update item in list
@@ -105,26 +243,36 @@ class FirebaseConfig:
                     if isinstance(item, dict) and str(item.get('fingerprint_id')) == str(key):
                         existing_data[i].update(data)
                         ref.set(existing_data)
+                        self._invalidate(path)
+                        self._apply_to_replicas(path, existing_data)
                         return True
                 return False
             else:
                 # If data is a list, set the child directly (firebase update requires a dict)
                 if isinstance(data, list):
                     ref.child(key).set(data)
+                    self._invalidate(f"{path}/{key}")
+                    self._apply_to_replicas(f"{path}/{key}", data)
                     return True
 
                 # Update in dictionary
                 ref.child(key).update(data)
+                self._invalidate(f"{path}/{key}")
+                self._apply_to_replicas(f"{path}/{key}", data, merge=True)
                 return True
         except Exception as e:
             print(f"⚠️ Erreur mise à jour {path}/{key}: {e}")
             raise
     
-    def delete(self, path, key):
-        """Supprimer une entrée"""
+    def delete(self, path, key, legacy_list=False):
+        """Supprimer une entrée
+
+        ``legacy_list=True`` relit toute la collection pour retirer une
+        entrée d'une liste (ancien format des étudiants).
+        """
         try:
             ref = self.get_ref(path)
-            existing_data = ref.get()
+            existing_data = ref.get() if legacy_list else None
             
             if isinstance(existing_data, list):
                 # Remove item from list
@@ -133,8 +281,12 @@ class FirebaseConfig:
                     if isinstance(item, dict) and str(item.get('fingerprint_id')) != str(key):
                         new_data.append(item)
                 ref.set(new_data)
+                self._invalidate(path)
+                self._apply_to_replicas(path, new_data)
             else:
                 ref.child(key).delete()
+                self._invalidate(f"{path}/{key}")
+                self._apply_to_replicas(f"{path}/{key}", None)
         except Exception as e:
             print(f"⚠️ Erreur suppression {path}/{key}: {e}")
             raise
@@ -144,6 +296,8 @@ class FirebaseConfig:
         try:
             ref = self.get_ref(path)
             ref.update(data)
+            self._invalidate(path, data)
+            self._apply_to_replicas(path, data, merge=True)
         except Exception as e:
             print(f"⚠️ Erreur mise à jour {path}: {e}")
             raise
@@ -153,14 +307,26 @@ class FirebaseConfig:
         try:
             ref = self.get_ref(path)
             ref.delete()
+            self._invalidate(path)
+            self._apply_to_replicas(path, None)
         except Exception as e:
             print(f"⚠️ Erreur suppression {path}: {e}")
             raise
     
+    def transaction(self, path, update_fn):
+        """Mise à jour atomique d'un noeud (compteurs), renvoie la nouvelle valeur"""
+        try:
+            new_value = self.get_ref(path).transaction(update_fn)
+            self._invalidate(path)
+            self._apply_to_replicas(path, new_value)
+            return new_value
+        except Exception as e:
+            print(f"⚠️ Erreur transaction {path}: {e}")
+            raise
+    
     def get_at_path(self, path):
         """Get data at specific path"""
-        ref = self.get_ref(path)
-        return ref.get()
+        return self._read(path)
 
 # Instance globale
 firebase = FirebaseConfig()
\ No newline at end of file
@@ -1,10 +1,21 @@
 # routes/attendance.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from datetime import datetime
-from firebase_config import firebase
+import csv
+import io
+import json
+from firebase_config import firebase, KEY_PREFIX_END
+from utils import attendance_index, find_session, get_attendance_for_dates, group_members
+from services.pagination import MAX_PAGE_SCAN_DAYS, page_args, page_response
+from services.storage import key_before
 
 attendance_bp = Blueprint('attendance', __name__)
 
+# Columns of GET /api/attendance/export, in order
+EXPORT_COLUMNS = ['date', 'session_id', 'session_start', 'session_end', 'room', 'room_name',
+                  'group_id', 'group_name', 'subject', 'subject_name',
+                  'student_id', 'student_name', 'status', 'time']
+
 def parse_session_id(session_id):
     """Parse session_id to extract date, room, time, and group"""
     try:
@@ -46,122 +57,237 @@ def get_room_name(room_id):
     room_data = firebase.get_one('rooms', room_id)
     return room_data.get('name') if room_data else room_id
 
+def collect_attendance_records(all_attendance, all_sessions, all_subjects,
+                               date=None, room=None, group=None, student_id=None):
+    """Flatten attendance nodes into one record per student and session"""
+    filtered_attendance = []
+    
+    for session_id, attendance_record in all_attendance.items():
+        if not isinstance(attendance_record, dict):
+            continue
+        
+        # Parse session_id to get date, room, group
+        session_date, session_room, session_time, session_group = parse_session_id(session_id)
+        if not session_date:
+            continue
+        
+        # Apply filters
+        if date and session_date != date:
+            continue
+        if room and session_room != room:
+            continue
+        if group and session_group != group:
+            continue
+        
+        # Get session details
+        session_details = find_session(all_sessions, session_date, session_room, session_id)
+        
+        # Process present students
+        present_data = attendance_record.get('present', {})
+        if isinstance(present_data, dict):
+            for stud_id, record in present_data.items():
+                if not isinstance(record, dict):
+                    continue
+                
+                if student_id and stud_id != student_id:
+                    continue
+                
+                # Get student info
+                student_data = firebase.get_one('students', stud_id) or {}
+                
+                # Get subject name
+                subject_name = None
+                if session_details and session_details.get('subject'):
+                    subject_code = session_details.get('subject')
+                    subject_name = all_subjects.get(subject_code, {}).get('name', subject_code)
+                
+                filtered_attendance.append({
+                    'date': session_date,
+                    'session_id': session_id,
+                    'group_id': session_group,
+                    'group_name': get_group_name(session_group),
+                    'student_id': stud_id,
+                    'student_name': student_data.get('name') or record.get('name', 'Unknown'),
+                    'status': 'PRESENT',
+                    'time': record.get('time'),
+                    'room': session_room,
+                    'room_name': get_room_name(session_room),
+                    'method': 'FINGERPRINT',
+                    'session_start': session_time,
+                    'session_end': session_details.get('end') if session_details else None,
+                    'subject': session_details.get('subject') if session_details else None,
+                    'subject_name': subject_name
+                })
+        
+        # Process absent students
+        absent_data = attendance_record.get('absent', {})
+        if isinstance(absent_data, dict):
+            for stud_id, record in absent_data.items():
+                if not isinstance(record, dict):
+                    continue
+                
+                if student_id and stud_id != student_id:
+                    continue
+                
+                # Get student info
+                student_data = firebase.get_one('students', stud_id) or {}
+                
+                # Get subject name
+                subject_name = None
+                if session_details and session_details.get('subject'):
+                    subject_code = session_details.get('subject')
+                    subject_name = all_subjects.get(subject_code, {}).get('name', subject_code)
+                
+                filtered_attendance.append({
+                    'date': session_date,
+                    'session_id': session_id,
+                    'group_id': session_group,
+                    'group_name': get_group_name(session_group),
+                    'student_id': stud_id,
+                    'student_name': student_data.get('name') or record.get('name', 'Unknown'),
+                    'status': 'ABSENT',
+                    'time': None,
+                    'room': session_room,
+                    'room_name': get_room_name(session_room),
+                    'method': 'MANUAL',
+                    'session_start': session_time,
+                    'session_end': session_details.get('end') if session_details else None,
+                    'subject': session_details.get('subject') if session_details else None,
+                    'subject_name': subject_name
+                })
+    
+    return filtered_attendance
+
+def attendance_sort_key(record):
+    """Listing order (newest first when reversed): date, start, session, student"""
+    return (record.get('date', ''), record.get('session_start', ''),
+            record.get('session_id', ''), record.get('student_id', ''))
+
+def student_attendance_records(student_id, filters, all_subjects):
+    """Attendance records of one student from the attendance_by_student index"""
+    date = filters.get('date')
+    today = datetime.now().strftime('%Y-%m-%d')
+    history = attendance_index.live_history(student_id, date, date, today)
+    student_data = firebase.get_one('students', student_id) or {}
+    records = []
+    
+    for session_id, entry in history.items():
+        session_date, session_room, session_time, session_group = parse_session_id(session_id)
+        if not session_date:
+            continue
+        if filters.get('room') and session_room != filters['room']:
+            continue
+        if filters.get('group') and session_group != filters['group']:
+            continue
+        
+        subject_code = entry.get('subject')
+        subject_name = all_subjects.get(subject_code, {}).get('name', subject_code) if subject_code else None
+        present = entry.get('status') == 'PRESENT'
+        records.append({
+            'date': session_date,
+            'session_id': session_id,
+            'group_id': session_group,
+            'group_name': get_group_name(session_group),
+            'student_id': student_id,
+            'student_name': student_data.get('name', 'Unknown'),
+            'status': 'PRESENT' if present else 'ABSENT',
+            'time': entry.get('time') if present else None,
+            'room': session_room,
+            'room_name': get_room_name(session_room),
+            'method': 'FINGERPRINT' if present else 'MANUAL',
+            'session_start': session_time,
+            'session_end': entry.get('end'),
+            'subject': subject_code,
+            'subject_name': subject_name
+        })
+    
+    return records
+
+def get_attendance_page(filters, limit, after=None):
+    """One page of attendance records, newest first, reading one day at a time
+
+    ``after`` is the sort position of the previous page's last record; days
+    after it are never read again. A one-item position ``[date]`` resumes
+    before that date: it is returned when MAX_PAGE_SCAN_DAYS days were read
+    without filling the page. A student_id filter is served from the
+    student's attendance_by_student node in one read.
+    """
+    date = filters.get('date')
+    all_subjects = firebase.get_all('subjects') or {}
+    
+    if filters.get('student_id'):
+        records = student_attendance_records(filters['student_id'], filters, all_subjects)
+        records.sort(key=attendance_sort_key, reverse=True)
+        matched = [record for record in records
+                   if not after or list(attendance_sort_key(record)) < after]
+        return page_response(matched, limit, lambda record: list(attendance_sort_key(record)))
+    
+    if date:
+        bound = f"{date.replace('-', '')}_{KEY_PREFIX_END}"
+    elif after:
+        # [date] resumes before that whole date
+        suffix = '' if len(after) == 1 else KEY_PREFIX_END
+        bound = f"{after[0].replace('-', '')}_{suffix}"
+    else:
+        bound = None
+    matched = []
+    resume = None
+    days_read = 0
+    
+    while len(matched) <= limit:
+        # Latest attendance key at or before the bound gives the next day to read
+        chunk = firebase.get_range('attendance', end=bound, limit_last=1)
+        if not chunk:
+            break
+        last_key = next(iter(chunk))
+        day, _, _, _ = parse_session_id(last_key)
+        if not day:
+            bound = key_before(last_key)
+            continue
+        if days_read >= MAX_PAGE_SCAN_DAYS:
+            # Days remain: the next page resumes before the last day read
+            resume = [last_day]
+            break
+        
+        day_attendance = get_attendance_for_dates(day, day, filters.get('room'))
+        day_sessions = {day: firebase.get_all(f'sessions/{day}')}
+        records = collect_attendance_records(day_attendance, day_sessions, all_subjects, **filters)
+        records.sort(key=attendance_sort_key, reverse=True)
+        matched.extend(record for record in records
+                       if not after or list(attendance_sort_key(record)) < after)
+        days_read += 1
+        last_day = day
+        
+        if date:
+            break
+        bound = f"{last_key.split('_')[0]}_"
+    
+    return page_response(matched, limit, lambda record: list(attendance_sort_key(record)), resume)
+
 @attendance_bp.route('/api/attendance', methods=['GET'])
 def get_attendance():
-    """Get attendance with filters"""
+    """Get attendance with filters (paginated when limit or cursor is given)"""
     try:
         date = request.args.get('date')
         room = request.args.get('room')
         group = request.args.get('group')
         student_id = request.args.get('student_id')
         
-        all_attendance = firebase.get_all('attendance') or {}
-        all_sessions = firebase.get_all('sessions') or {}
+        try:
+            paging = page_args(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if paging:
+            filters = {'date': date, 'room': room, 'group': group, 'student_id': student_id}
+            return jsonify({'success': True, **get_attendance_page(filters, *paging)})
+        
+        # The date (and room) filters are pushed down as a key range
+        all_attendance = get_attendance_for_dates(date, date, room)
+        all_sessions = {date: firebase.get_all(f'sessions/{date}')} if date else firebase.get_all('sessions') or {}
         all_subjects = firebase.get_all('subjects') or {}
-        filtered_attendance = []
-        
-        for session_id, attendance_record in all_attendance.items():
-            if not isinstance(attendance_record, dict):
-                continue
-            
-            # Parse session_id to get date, room, group
-            session_date, session_room, session_time, session_group = parse_session_id(session_id)
-            if not session_date:
-                continue
-            
-            # Apply filters
-            if date and session_date != date:
-                continue
-            if room and session_room != room:
-                continue
-            if group and session_group != group:
-                continue
-            
-            # Get session details for more context
-            session_details = None
-            if session_date in all_sessions:
-                date_sessions = all_sessions.get(session_date, {})
-                if isinstance(date_sessions, dict) and session_room in date_sessions:
-                    room_sessions = date_sessions.get(session_room, [])
-                    if isinstance(room_sessions, list):
-                        for session in room_sessions:
-                            if isinstance(session, dict) and session.get('session_id') == session_id:
-                                session_details = session
-                                break
-            
-            # Process present students
-            present_data = attendance_record.get('present', {})
-            if isinstance(present_data, dict):
-                for stud_id, record in present_data.items():
-                    if not isinstance(record, dict):
-                        continue
-                    
-                    if student_id and stud_id != student_id:
-                        continue
-                    
-                    # Get student info
-                    student_data = firebase.get_one('students', stud_id) or {}
-                    
-                    # Get subject name
-                    subject_name = None
-                    if session_details and session_details.get('subject'):
-                        subject_code = session_details.get('subject')
-                        subject_name = all_subjects.get(subject_code, {}).get('name', subject_code)
-                    
-                    filtered_attendance.append({
-                        'date': session_date,
-                        'session_id': session_id,
-                        'group_id': session_group,
-                        'group_name': get_group_name(session_group),
-                        'student_id': stud_id,
-                        'student_name': student_data.get('name') or record.get('name', 'Unknown'),
-                        'status': 'PRESENT',
-                        'time': record.get('time'),
-                        'room': session_room,
-                        'room_name': get_room_name(session_room),
-                        'method': 'FINGERPRINT',
-                        'session_start': session_time,
-                        'session_end': session_details.get('end') if session_details else None,
-                        'subject': session_details.get('subject') if session_details else None,
-                        'subject_name': subject_name
-                    })
-            
-            # Process absent students
-            absent_data = attendance_record.get('absent', {})
-            if isinstance(absent_data, dict):
-                for stud_id, record in absent_data.items():
-                    if not isinstance(record, dict):
-                        continue
-                    
-                    if student_id and stud_id != student_id:
-                        continue
-                    
-                    # Get student info
-                    student_data = firebase.get_one('students', stud_id) or {}
-                    
-                    # Get subject name
-                    subject_name = None
-                    if session_details and session_details.get('subject'):
-                        subject_code = session_details.get('subject')
-                        subject_name = all_subjects.get(subject_code, {}).get('name', subject_code)
-                    
-                    filtered_attendance.append({
-                        'date': session_date,
-                        'session_id': session_id,
-                        'group_id': session_group,
-                        'group_name': get_group_name(session_group),
-                        'student_id': stud_id,
-                        'student_name': student_data.get('name') or record.get('name', 'Unknown'),
-                        'status': 'ABSENT',
-                        'time': None,
-                        'room': session_room,
-                        'room_name': get_room_name(session_room),
-                        'method': 'MANUAL',
-                        'session_start': session_time,
-                        'session_end': session_details.get('end') if session_details else None,
-                        'subject': session_details.get('subject') if session_details else None,
-                        'subject_name': subject_name
-                    })
+        filtered_attendance = collect_attendance_records(
+            all_attendance, all_sessions, all_subjects, date, room, group, student_id
+        )
         
         # Sort by date (descending) and time (descending)
         filtered_attendance.sort(key=lambda x: (
@@ -178,23 +304,159 @@ def get_attendance():
         print(f"Error getting attendance: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def iter_attendance_days(date_from=None, date_to=None):
+    """Yield (date, attendance nodes of that date) in date order, one day in memory at a time
+
+    Read errors are raised (query_range): an unreadable day must not look
+    like a day without attendance.
+    """
+    start = f"{date_from.replace('-', '')}_" if date_from else None
+    end = f"{date_to.replace('-', '')}_{KEY_PREFIX_END}" if date_to else None
+    
+    while True:
+        # First attendance key at or after the bound gives the next day to read
+        chunk = firebase.query_range('attendance', start=start, end=end, limit_first=1)
+        if not chunk:
+            return
+        first_key = next(iter(chunk))
+        day, _, _, _ = parse_session_id(first_key)
+        prefix = first_key.split('_')[0]
+        if day:
+            yield day, firebase.query_range('attendance', f"{prefix}_", f"{prefix}_{KEY_PREFIX_END}")
+        start = f"{prefix}_{KEY_PREFIX_END}"
+
+def iter_export_rows(date_from=None, date_to=None):
+    """Yield one dict per attendance mark between two dates, names from preloaded tables"""
+    students = firebase.get_at_path('students') or {}
+    if isinstance(students, list):
+        students = {f"S{idx + 1}": student for idx, student in enumerate(students)}
+    groups = firebase.get_all('groups') or {}
+    rooms = firebase.get_all('rooms') or {}
+    subjects = firebase.get_all('subjects') or {}
+    
+    def name_of(table, key):
+        entry = table.get(key) if key else None
+        return entry.get('name', key) if isinstance(entry, dict) else key
+    
+    for day, day_attendance in iter_attendance_days(date_from, date_to):
+        day_sessions = {day: firebase.get_at_path(f'sessions/{day}')}
+        for session_id in sorted(day_attendance, key=lambda key: parse_session_id(key)[2] or ''):
+            attendance_record = day_attendance[session_id]
+            if not isinstance(attendance_record, dict):
+                continue
+            _, session_room, session_time, session_group = parse_session_id(session_id)
+            session = find_session(day_sessions, day, session_room, session_id) or {}
+            subject = session.get('subject')
+            
+            for status, key in (('PRESENT', 'present'), ('ABSENT', 'absent')):
+                marks = attendance_record.get(key)
+                if not isinstance(marks, dict):
+                    continue
+                for student_id, record in marks.items():
+                    record = record if isinstance(record, dict) else {}
+                    student = students.get(student_id)
+                    yield {
+                        'date': day,
+                        'session_id': session_id,
+                        'session_start': session_time,
+                        'session_end': session.get('end'),
+                        'room': session_room,
+                        'room_name': name_of(rooms, session_room),
+                        'group_id': session_group,
+                        'group_name': name_of(groups, session_group),
+                        'subject': subject,
+                        'subject_name': name_of(subjects, subject),
+                        'student_id': student_id,
+                        'student_name': (student.get('name') if isinstance(student, dict) else None)
+                                        or record.get('name', 'Unknown'),
+                        'status': status,
+                        'time': record.get('time') if status == 'PRESENT' else None
+                    }
+
+def export_error_trailer(error, fmt):
+    """Last line of an export interrupted by a read error
+
+    The 200 status is already sent once streaming starts, so the file itself
+    says it is incomplete.
+    """
+    if fmt == 'ndjson':
+        return json.dumps({'error': str(error), 'complete': False}, ensure_ascii=False) + '\n'
+    return f"# export incomplete: {error}\n"
+
+def iter_export_lines(rows, fmt):
+    """Serialize rows to CSV (with header) or NDJSON, one line at a time"""
+    if fmt == 'ndjson':
+        try:
+            for row in rows:
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+        except Exception as e:
+            print(f"Error exporting attendance: {e}")
+            yield export_error_trailer(e, fmt)
+        return
+    
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    try:
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    except Exception as e:
+        print(f"Error exporting attendance: {e}")
+        yield buffer.getvalue() + export_error_trailer(e, fmt)
+        return
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+@attendance_bp.route('/api/attendance/export', methods=['GET'])
+def export_attendance():
+    """Stream attendance between two dates as CSV or NDJSON"""
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        fmt = request.args.get('format', 'csv').lower()
+        
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+        try:
+            for value in (date_from, date_to):
+                if value:
+                    datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'from and to must be YYYY-MM-DD dates'}), 400
+        if date_from and date_to and date_from > date_to:
+            return jsonify({'success': False, 'error': 'from must not be after to'}), 400
+        
+        filename = f"attendance_{date_from or 'start'}_{date_to or 'end'}.{'csv' if fmt == 'csv' else 'ndjson'}"
+        lines = iter_export_lines(iter_export_rows(date_from, date_to), fmt)
+        return Response(
+            stream_with_context(lines),
+            mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        print(f"Error exporting attendance: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @attendance_bp.route('/api/attendance/<group_id>/<date>', methods=['GET'])
 def get_attendance_by_group_date(group_id, date):
     """Get attendance for specific group and date"""
     try:
-        # Get all attendance data
-        all_attendance = firebase.get_all('attendance') or {}
-        all_sessions = firebase.get_all('sessions') or {}
+        # Only this date's attendance and sessions
+        all_attendance = get_attendance_for_dates(date, date)
+        all_sessions = {date: firebase.get_all(f'sessions/{date}')}
         all_subjects = firebase.get_all('subjects') or {}
         
         # Get group info
         group_data = firebase.get_one('groups', group_id) or {}
         
-        # Get all students in this group
-        all_students = firebase.get_all('students') or {}
+        # Get the students of this group only (group_members index)
         group_students = []
         
-        for stud_id, student in all_students.items():
+        for stud_id in group_members.members(group_id):
+            student = firebase.get_one('students', stud_id)
             if isinstance(student, dict) and student.get('group') == group_id:
                 group_students.append({
                     'id': stud_id,
@@ -225,16 +487,7 @@ def get_attendance_by_group_date(group_id, date):
                 continue
             
             # Get session details
-            session_details = None
-            if date in all_sessions:
-                date_sessions = all_sessions.get(date, {})
-                if isinstance(date_sessions, dict) and session_room in date_sessions:
-                    room_sessions = date_sessions.get(session_room, [])
-                    if isinstance(room_sessions, list):
-                        for session in room_sessions:
-                            if isinstance(session, dict) and session.get('session_id') == session_id:
-                                session_details = session
-                                break
+            session_details = find_session(all_sessions, date, session_room, session_id)
             
             # Get subject name
             subject_name = None
@@ -315,85 +568,38 @@ def get_attendance_by_student(student_id):
         
         group_id = student_data.get('group')
         
-        # Get all attendance data
-        all_attendance = firebase.get_all('attendance') or {}
-        all_sessions = firebase.get_all('sessions') or {}
+        # One read of the student's own index node; sessions still open are
+        # read back from attendance/<session_id>, which devices write directly
+        today = datetime.now().strftime('%Y-%m-%d')
+        history = attendance_index.live_history(student_id, start_date, end_date, today)
         all_subjects = firebase.get_all('subjects') or {}
         student_attendance = []
         
-        # Search for student in all attendance records
-        for session_id, attendance_record in all_attendance.items():
-            if not isinstance(attendance_record, dict):
-                continue
-            
-            # Parse session_id to get date and group
+        for session_id, entry in history.items():
             session_date, session_room, session_time, session_group = parse_session_id(session_id)
             if not session_date:
                 continue
             
-            # Filter by date range
-            if start_date and session_date < start_date:
-                continue
-            if end_date and session_date > end_date:
-                continue
-            
-            # Filter by student's group (optional, but good for validation)
-            if session_group != group_id:
-                continue
-            
-            # Get session details
-            session_details = None
-            if session_date in all_sessions:
-                date_sessions = all_sessions.get(session_date, {})
-                if isinstance(date_sessions, dict) and session_room in date_sessions:
-                    room_sessions = date_sessions.get(session_room, [])
-                    if isinstance(room_sessions, list):
-                        for session in room_sessions:
-                            if isinstance(session, dict) and session.get('session_id') == session_id:
-                                session_details = session
-                                break
-            
-            # Get subject name
+            subject_code = entry.get('subject')
             subject_name = None
-            if session_details and session_details.get('subject'):
-                subject_code = session_details.get('subject')
+            if subject_code:
                 subject_name = all_subjects.get(subject_code, {}).get('name', subject_code)
             
-            # Check present list
-            present_data = attendance_record.get('present', {})
-            if student_id in present_data:
-                record = present_data[student_id]
-                student_attendance.append({
-                    'date': session_date,
-                    'session_id': session_id,
-                    'group_id': session_group,
-                    'group_name': get_group_name(session_group),
-                    'status': 'PRESENT',
-                    'time': record.get('time'),
-                    'room': session_room,
-                    'room_name': get_room_name(session_room),
-                    'session_start': session_time,
-                    'session_end': session_details.get('end') if session_details else None,
-                    'subject': session_details.get('subject') if session_details else None,
-                    'subject_name': subject_name
-                })
-            # Check absent list
-            elif student_id in attendance_record.get('absent', {}):
-                record = attendance_record['absent'][student_id]
-                student_attendance.append({
-                    'date': session_date,
-                    'session_id': session_id,
-                    'group_id': session_group,
-                    'group_name': get_group_name(session_group),
-                    'status': 'ABSENT',
-                    'time': None,
-                    'room': session_room,
-                    'room_name': get_room_name(session_room),
-                    'session_start': session_time,
-                    'session_end': session_details.get('end') if session_details else None,
-                    'subject': session_details.get('subject') if session_details else None,
-                    'subject_name': subject_name
-                })
+            status = entry.get('status', 'ABSENT')
+            student_attendance.append({
+                'date': session_date,
+                'session_id': session_id,
+                'group_id': session_group,
+                'group_name': get_group_name(session_group),
+                'status': status,
+                'time': entry.get('time') if status == 'PRESENT' else None,
+                'room': session_room,
+                'room_name': get_room_name(session_room),
+                'session_start': session_time,
+                'session_end': entry.get('end'),
+                'subject': subject_code,
+                'subject_name': subject_name
+            })
         
         # Sort by date (descending)
         student_attendance.sort(key=lambda x: x.get('date', ''), reverse=True)
@@ -431,50 +637,25 @@ def check_today_attendance(student_id):
         if not student_data:
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
-        today = datetime.now().strftime('%Y%m%d')
         formatted_today = datetime.now().strftime('%Y-%m-%d')
         group_id = student_data.get('group')
         
-        # Get all attendance data
-        all_attendance = firebase.get_all('attendance') or {}
+        # Today's entries from the student's index node, with the live sheets
+        history = attendance_index.live_history(student_id, formatted_today, formatted_today, formatted_today)
         attendance_records = []
         
-        # Search for today's attendance records for this student
-        for session_id, attendance_record in all_attendance.items():
-            if not isinstance(attendance_record, dict):
-                continue
-            
-            # Parse session_id to get date and group
-            session_date_str = session_id.split('_')[0] if '_' in session_id else ''
-            if session_date_str != today:
-                continue
-            
+        for session_id, entry in history.items():
             session_date, session_room, session_time, session_group = parse_session_id(session_id)
-            if session_group != group_id:
-                continue
-            
-            # Check present list
-            present_data = attendance_record.get('present', {})
-            if student_id in present_data:
-                record = present_data[student_id]
-                attendance_records.append({
-                    'session_id': session_id,
-                    'status': 'PRESENT',
-                    'time': record.get('time'),
-                    'room': session_room,
-                    'room_name': get_room_name(session_room),
-                    'session_time': session_time
-                })
-            # Check absent list
-            elif student_id in attendance_record.get('absent', {}):
-                record = attendance_record['absent'][student_id]
-                attendance_records.append({
-                    'session_id': session_id,
-                    'status': 'ABSENT',
-                    'room': session_room,
-                    'room_name': get_room_name(session_room),
-                    'session_time': session_time
-                })
+            record = {
+                'session_id': session_id,
+                'status': entry.get('status', 'ABSENT'),
+                'room': session_room,
+                'room_name': get_room_name(session_room),
+                'session_time': session_time
+            }
+            if record['status'] == 'PRESENT':
+                record['time'] = entry.get('time')
+            attendance_records.append(record)
         
         has_attendance_today = len(attendance_records) > 0
         is_absent = any(record['status'] == 'ABSENT' for record in attendance_records)
@@ -519,18 +700,15 @@ def get_attendance_stats():
         
         # Get all groups
         all_groups = firebase.get_all('groups') or {}
-        all_attendance = firebase.get_all('attendance') or {}
-        all_students = firebase.get_all('students') or {}
+        all_attendance = get_attendance_for_dates(target_date, target_date)
+        members_by_group = group_members.all()
         
         for group_key, group_data in all_groups.items():
             if group_id and group_key != group_id:
                 continue
             
             # Get students in this group
-            group_students = []
-            for student_key, student in all_students.items():
-                if isinstance(student, dict) and student.get('group') == group_key:
-                    group_students.append(student_key)
+            group_students = members_by_group.get(group_key, [])
             
             # Count attendance for this group on the specified date
             present_count = 0
@@ -607,9 +785,9 @@ def get_today_attendance_for_room(room_id):
         if not room_data:
             return jsonify({'success': False, 'error': 'Room not found'}), 404
         
-        # Get all attendance data
-        all_attendance = firebase.get_all('attendance') or {}
-        all_sessions = firebase.get_all('sessions') or {}
+        # Today's attendance for this room only (key prefix YYYYMMDD_room_)
+        all_attendance = get_attendance_for_dates(formatted_today, formatted_today, room_id)
+        all_sessions = {formatted_today: {room_id: firebase.get_all(f'sessions/{formatted_today}/{room_id}')}}
         attendance_records = []
         
         # Find attendance records for today and this room
@@ -627,16 +805,7 @@ def get_today_attendance_for_room(room_id):
                 continue
             
             # Get session details
-            session_details = None
-            if session_date in all_sessions:
-                date_sessions = all_sessions.get(session_date, {})
-                if isinstance(date_sessions, dict) and session_room in date_sessions:
-                    room_sessions = date_sessions.get(session_room, [])
-                    if isinstance(room_sessions, list):
-                        for session in room_sessions:
-                            if isinstance(session, dict) and session.get('session_id') == session_id:
-                                session_details = session
-                                break
+            session_details = find_session(all_sessions, session_date, session_room, session_id)
             
             # Process present students
             present_data = attendance_record.get('present', {})
@@ -694,4 +863,16 @@ def get_today_attendance_for_room(room_id):
         })
     except Exception as e:
         print(f"Error getting today's attendance for room: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+@attendance_bp.route('/api/attendance/student-index/rebuild', methods=['POST'])
+def rebuild_attendance_index():
+    """Rebuild the attendance_by_student index from the attendance collection"""
+    try:
+        result = attendance_index.rebuild()
+        return jsonify({
+            'success': True,
+            'message': f"Attendance index rebuilt ({result['entries']} entries)",
+            **result
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
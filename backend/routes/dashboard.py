@@ -2,6 +2,7 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 from firebase_config import firebase
+from utils import iter_room_sessions, find_session, get_attendance_for_dates, group_members
 import re
 
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -50,7 +51,7 @@ def get_dashboard_stats():
         today = datetime.now().strftime('%Y-%m-%d')
         
         # Get today's sessions
-        all_sessions = firebase.get_all('sessions') or {}
+        all_sessions = {today: firebase.get_all(f'sessions/{today}')}
         today_sessions = []
         active_sessions = 0
         
@@ -59,16 +60,14 @@ def get_dashboard_stats():
             today_date_sessions = all_sessions.get(today, {})
             if isinstance(today_date_sessions, dict):
                 for room_id, room_sessions in today_date_sessions.items():
-                    if isinstance(room_sessions, list):
-                        for session_data in room_sessions:
-                            if isinstance(session_data, dict):
-                                today_sessions.append(session_data)
-                                if session_data.get('status') == 'OPEN':
-                                    active_sessions += 1
+                    for session_data in iter_room_sessions(room_sessions):
+                        today_sessions.append(session_data)
+                        if session_data.get('status') == 'OPEN':
+                            active_sessions += 1
         
         # Get today's attendance from attendance collection
         today_attendance_count = 0
-        all_attendance = firebase.get_all('attendance') or {}
+        all_attendance = get_attendance_for_dates(today, today)
         
         for session_id, attendance_data in all_attendance.items():
             if not isinstance(attendance_data, dict):
@@ -119,8 +118,9 @@ def get_analytics():
         total_present = 0
         total_absent = 0
         
-        all_attendance = firebase.get_all('attendance') or {}
-        all_students = firebase.get_all('students') or {}
+        # Only the period's keys are read (keys start with YYYYMMDD)
+        all_attendance = get_attendance_for_dates(dates[0], dates[-1])
+        members_by_group = group_members.all()
         
         # Group attendance by date
         date_attendance = {}
@@ -161,7 +161,7 @@ def get_analytics():
         rooms = firebase.get_all('rooms') or {}
         room_utilization = []
         
-        all_sessions = firebase.get_all('sessions') or {}
+        all_sessions = firebase.get_range('sessions', dates[0], dates[-1])
         
         for room_id, room_data in rooms.items():
             if isinstance(room_data, dict) and room_data.get('active'):
@@ -175,9 +175,7 @@ def get_analytics():
                     if not isinstance(date_sessions, dict):
                         continue
                     
-                    room_sessions_list = date_sessions.get(room_id, [])
-                    if isinstance(room_sessions_list, list):
-                        session_count += len(room_sessions_list)
+                    session_count += len(list(iter_room_sessions(date_sessions.get(room_id))))
                 
                 # Calculate utilization percentage
                 utilization = round(min(100, (session_count / days) * 100), 2) if days > 0 else 0
@@ -221,8 +219,7 @@ def get_analytics():
             attendance_rate = (present_count / total_count * 100) if total_count > 0 else 0
             
             # Count students in group
-            students_in_group = sum(1 for student_id, student in all_students.items() 
-                                   if isinstance(student, dict) and student.get('group') == group_id)
+            students_in_group = len(members_by_group.get(group_id, []))
             
             group_attendance.append({
                 'group_id': group_id,
@@ -261,9 +258,13 @@ def get_recent_activity():
     try:
         limit = int(request.args.get('limit', 10))
         
-        all_attendance = firebase.get_all('attendance') or {}
+        # The last `limit` attendance nodes hold at least `limit` records, so
+        # nothing older than their first day can make the list
+        latest = firebase.get_range('attendance', limit_last=limit) if limit > 0 else {}
+        first_date, _, _, _ = parse_session_id(next(iter(latest), ''))
+        all_attendance = get_attendance_for_dates(first_date, None) if first_date else latest
         all_students = firebase.get_all('students') or {}
-        all_sessions = firebase.get_all('sessions') or {}
+        all_sessions = firebase.get_range('sessions', first_date) if first_date else {}
         recent_activity = []
         
         for session_id, attendance_record in all_attendance.items():
@@ -276,16 +277,7 @@ def get_recent_activity():
                 continue
             
             # Get session details for more context
-            session_details = None
-            if session_date in all_sessions:
-                date_sessions = all_sessions.get(session_date, {})
-                if isinstance(date_sessions, dict) and room_id in date_sessions:
-                    room_sessions = date_sessions.get(room_id, [])
-                    if isinstance(room_sessions, list):
-                        for session in room_sessions:
-                            if isinstance(session, dict) and session.get('session_id') == session_id:
-                                session_details = session
-                                break
+            session_details = find_session(all_sessions, session_date, room_id, session_id)
             
             # Process present records
             present_data = attendance_record.get('present', {})
@@ -363,8 +355,8 @@ def get_room_status():
         rooms = firebase.get_all('rooms') or {}
         room_status = []
         
-        all_sessions = firebase.get_all('sessions') or {}
         today = datetime.now().strftime('%Y-%m-%d')
+        all_sessions = {today: firebase.get_all(f'sessions/{today}')}
         current_time = datetime.now().strftime('%H:%M')
         
         for room_id, room_data in rooms.items():
@@ -376,18 +368,15 @@ def get_room_status():
             if today in all_sessions:
                 today_sessions = all_sessions.get(today, {})
                 if isinstance(today_sessions, dict) and room_id in today_sessions:
-                    room_sessions_list = today_sessions.get(room_id, [])
-                    if isinstance(room_sessions_list, list):
-                        # Look for session that matches current time
-                        for session in room_sessions_list:
-                            if isinstance(session, dict):
-                                session_start = session.get('start', '00:00')
-                                session_end = session.get('end', '23:59')
-                                
-                                # Check if current time is within session time
-                                if session_start <= current_time <= session_end:
-                                    current_session = session
-                                    break
+                    # Look for session that matches current time
+                    for session in iter_room_sessions(today_sessions.get(room_id)):
+                        session_start = session.get('start', '00:00')
+                        session_end = session.get('end', '23:59')
+                        
+                        # Check if current time is within session time
+                        if session_start <= current_time <= session_end:
+                            current_session = session
+                            break
             
             # Determine room status
             status = 'IDLE'
@@ -431,8 +420,8 @@ def get_upcoming_sessions():
     """Get upcoming sessions for today"""
     try:
         rooms = firebase.get_all('rooms') or {}
-        all_sessions = firebase.get_all('sessions') or {}
         today = datetime.now().strftime('%Y-%m-%d')
+        all_sessions = {today: firebase.get_all(f'sessions/{today}')}
         current_time = datetime.now().strftime('%H:%M')
         
         upcoming_sessions = []
@@ -441,27 +430,23 @@ def get_upcoming_sessions():
             today_sessions = all_sessions.get(today, {})
             if isinstance(today_sessions, dict):
                 for room_id, room_sessions_list in today_sessions.items():
-                    if not isinstance(room_sessions_list, list):
-                        continue
-                    
                     # Get room info
                     room_data = rooms.get(room_id, {})
                     if not isinstance(room_data, dict):
                         continue
                     
-                    for session in room_sessions_list:
-                        if isinstance(session, dict):
-                            session_start = session.get('start', '00:00')
-                            session_status = session.get('status', '')
-                            
-                            # Only include future sessions that are not CLOSED
-                            if session_start > current_time and session_status != 'CLOSED':
-                                upcoming_sessions.append({
-                                    'room_id': room_id,
-                                    'room_name': room_data.get('name', room_id),
-                                    'session': session,
-                                    'time_until': _calculate_time_until(session_start, current_time)
-                                })
+                    for session in iter_room_sessions(room_sessions_list):
+                        session_start = session.get('start', '00:00')
+                        session_status = session.get('status', '')
+                        
+                        # Only include future sessions that are not CLOSED
+                        if session_start > current_time and session_status != 'CLOSED':
+                            upcoming_sessions.append({
+                                'room_id': room_id,
+                                'room_name': room_data.get('name', room_id),
+                                'session': session,
+                                'time_until': _calculate_time_until(session_start, current_time)
+                            })
         
         # Sort by start time
         upcoming_sessions.sort(key=lambda x: x['session'].get('start', '00:00'))
@@ -479,7 +464,7 @@ def get_group_performance():
     """Get detailed group performance data"""
     try:
         all_groups = firebase.get_all('groups') or {}
-        all_students = firebase.get_all('students') or {}
+        members_by_group = group_members.all()
         all_attendance = firebase.get_all('attendance') or {}
         
         group_performance = []
@@ -489,10 +474,7 @@ def get_group_performance():
                 continue
             
             # Count students in this group
-            students_in_group = [
-                student for student_id, student in all_students.items()
-                if isinstance(student, dict) and student.get('group') == group_id
-            ]
+            students_in_group = members_by_group.get(group_id, [])
             
             # Calculate attendance stats for this group
             total_present = 0
@@ -0,0 +1,466 @@
+# routes/devices.py
+from flask import Blueprint, request, jsonify
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+import os
+import threading
+from firebase_config import firebase
+from services.cache import TTLCache
+from services.indexes import index_items
+from services.room_state import RoomStateTable, state_version
+from utils import (attendance_index, fingerprint_index, get_active_session_for_room,
+                   get_room_by_esp32_id, get_student_by_fingerprint, group_members,
+                   iter_room_sessions)
+
+devices_bp = Blueprint('devices', __name__)
+
+# Scan verdicts returned to the devices
+VERDICT_PRESENT = 'present'
+VERDICT_ALREADY_PRESENT = 'already_present'
+VERDICT_WRONG_GROUP = 'wrong_group'
+VERDICT_UNKNOWN = 'unknown'
+VERDICT_NO_SESSION = 'no_session'
+VERDICT_INVALID = 'invalid'
+
+# Offline batches: replayed scans are remembered under device_scans/<esp32_id>/<seq>
+DEVICE_SCANS_PATH = 'device_scans'
+MAX_BATCH_SCANS = 1000
+# From this batch size, students are read once instead of once per scan
+STUDENT_PRELOAD_THRESHOLD = 50
+# Sequence numbers are integer keys (32-bit, like the RTDB's numeric keys)
+MAX_SEQ = 2 ** 31 - 1
+
+# Packed arrays of GET /api/devices/<esp32_id>/state, in this order
+STATE_SESSION_FIELDS = ['session_id', 'status', 'start', 'end', 'group', 'subject']
+STATE_ROSTER_FIELDS = ['student_id', 'fingerprint_id', 'name']
+
+# Group rosters served to devices, rebuilt at most this often per group
+# (dropped right away by this worker's student writes)
+roster_cache = TTLCache(ttl=int(os.environ.get('DEVICE_ROSTER_TTL_SECONDS', 60)), max_entries=256)
+
+# Long-poll: per-room device state (same payload and `v` as /state),
+# published when sessions change
+room_states = RoomStateTable()
+# Workers re-read today's sessions this often while devices are waiting
+ROOM_STATE_REFRESH_SECONDS = int(os.environ.get('ROOM_STATE_REFRESH_SECONDS', 5))
+MAX_WAIT_SECONDS = 55
+# A waiting device holds a worker thread: long-polls need threaded (gunicorn
+# --threads / gthread) or gevent workers, with DEVICE_MAX_WAITERS kept below
+# the thread count of a process. Past the cap, /wait answers at once. Set it
+# to 0 with gunicorn sync workers (every /wait then answers at once).
+DEVICE_MAX_WAITERS = int(os.environ.get('DEVICE_MAX_WAITERS', 8))
+room_state_refresher = None
+room_state_refresher_lock = threading.Lock()
+room_state_stop = threading.Event()
+
+# Striped locks: two scans of the same student in the same session are
+# checked and written one after the other within a worker
+SCAN_LOCK_STRIPES = 64
+scan_locks = [threading.Lock() for _ in range(SCAN_LOCK_STRIPES)]
+# Batches of one device are replayed one at a time (separate pool, so a long
+# replay does not hold the stripes of unrelated live scans)
+device_locks = [threading.Lock() for _ in range(SCAN_LOCK_STRIPES)]
+
+def scan_lock(session_id, student_id):
+    return scan_locks[hash((session_id, student_id)) % SCAN_LOCK_STRIPES]
+
+@contextmanager
+def scan_locks_for(pairs):
+    """Hold the scan locks of several (session_id, student_id) pairs
+
+    Stripes are taken once each and in index order, so two batches
+    never wait on each other in a cycle.
+    """
+    stripes = sorted({hash(pair) % SCAN_LOCK_STRIPES for pair in pairs})
+    with ExitStack() as stack:
+        for stripe in stripes:
+            stack.enter_context(scan_locks[stripe])
+        yield
+
+def device_lock(esp32_id):
+    return device_locks[hash(esp32_id) % SCAN_LOCK_STRIPES]
+
+def check_scan(session, student_id, student):
+    """Verdict for a scanned student, or None when the student can be marked present"""
+    if not student_id or not isinstance(student, dict) or not student.get('active', True):
+        return {'verdict': VERDICT_UNKNOWN}
+    if student.get('group') != session.get('group'):
+        return {'verdict': VERDICT_WRONG_GROUP, 'student_id': student_id, 'name': student.get('name', '')}
+    return None
+
+def present_updates(session, student_id, student, scan_time):
+    """Multi-path entries moving the student from absent to present (with the per-student index)"""
+    record = {'name': student.get('name', ''), 'time': scan_time}
+    return attendance_index.mark_updates(session.get('session_id'), student_id, 'PRESENT', record, session)
+
+def record_scan(session, fingerprint_id, scan_time):
+    """Mark the student matching fingerprint_id present in session, returns a verdict dict"""
+    student_id, student = get_student_by_fingerprint(fingerprint_id)
+    rejected = check_scan(session, student_id, student)
+    if rejected:
+        return rejected
+
+    verdict = {'student_id': student_id, 'name': student.get('name', '')}
+    session_id = session.get('session_id')
+    with scan_lock(session_id, student_id):
+        existing = firebase.get_one(f'attendance/{session_id}/present', student_id)
+        if isinstance(existing, dict):
+            return {**verdict, 'verdict': VERDICT_ALREADY_PRESENT, 'time': existing.get('time')}
+
+        # absent -> present, present record and per-student index in one write
+        firebase.update_at_path('/', present_updates(session, student_id, student, scan_time))
+    return {**verdict, 'verdict': VERDICT_PRESENT, 'time': scan_time}
+
+def parse_scan_timestamp(value):
+    """Device timestamp (ISO string or epoch seconds) -> datetime, or None"""
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return datetime.fromtimestamp(value)
+        if isinstance(value, str) and value:
+            return datetime.fromisoformat(value.replace('Z', ''))
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None
+
+def parse_seq(value):
+    """Sequence number (int or digit string) in [0, MAX_SEQ], or None"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        seq = value
+    elif isinstance(value, str) and value.isdigit():
+        seq = int(value)
+    else:
+        return None
+    return seq if 0 <= seq <= MAX_SEQ else None
+
+def session_at(room_sessions, scanned_at):
+    """Session of a room whose time window contains scanned_at (and not closed before it)"""
+    scan_time = scanned_at.strftime('%H:%M')
+    for session in iter_room_sessions(room_sessions):
+        if not (session.get('start', '') <= scan_time <= session.get('end', '')):
+            continue
+        closed_at = session.get('closed_at')
+        if closed_at and closed_at < scanned_at.isoformat():
+            continue
+        return session
+    return None
+
+def make_student_lookup(scan_count):
+    """fingerprint_id -> (student_id, student) for one batch, memoized
+
+    Large batches read students/ once; small ones go through the
+    fingerprint index like live scans.
+    """
+    students = firebase.get_all('students') if scan_count >= STUDENT_PRELOAD_THRESHOLD else None
+    memo = {}
+
+    def lookup(fingerprint_id):
+        key = str(fingerprint_id)
+        if key not in memo:
+            student_id = fingerprint_index.lookup(key) if students is not None else None
+            student = students.get(student_id) if isinstance(students, dict) and student_id else None
+            if isinstance(student, dict) and str(student.get('fingerprint_id')) == key:
+                memo[key] = (student_id, student)
+            else:
+                memo[key] = get_student_by_fingerprint(fingerprint_id)
+        return memo[key]
+
+    return lookup
+
+def apply_scan_batch(esp32_id, room_id, scans):
+    """Replay buffered scans of one device: dedup by seq, one write for the whole batch
+
+    Scans are resolved without locks first; the present check and the write
+    then run under the scan locks of every (session, student) to mark, so a
+    live scan of the same student cannot slip in between. Returns the
+    per-scan results, in the order of the batch.
+    """
+    seqs = [parse_seq(scan.get('seq')) if isinstance(scan, dict) else None for scan in scans]
+    valid_seqs = [seq for seq in seqs if seq is not None]
+    seen = {}
+    if valid_seqs:
+        # Integer keys: the RTDB may answer with a list
+        seen = dict(index_items(firebase.get_range(
+            f'{DEVICE_SCANS_PATH}/{esp32_id}', str(min(valid_seqs)), str(max(valid_seqs))
+        )))
+
+    lookup = make_student_lookup(len(scans))
+    day_sessions = {}
+    updates = {}
+    results = [None] * len(scans)
+    pending = []
+    # Repeats, within the batch, of a seq that is still pending
+    repeats = []
+
+    def remember(index, seq, result):
+        # Remember the outcome so a replay of this seq is not applied twice
+        outcome = {key: value for key, value in result.items() if key in ('verdict', 'student_id', 'session_id')}
+        updates[f'{DEVICE_SCANS_PATH}/{esp32_id}/{seq}'] = {**outcome, 'received_at': datetime.now().isoformat()}
+        seen[str(seq)] = outcome
+        results[index] = {'seq': seq, **result}
+
+    for index, (scan, seq) in enumerate(zip(scans, seqs)):
+        if seq is None:
+            results[index] = {'seq': scan.get('seq') if isinstance(scan, dict) else None, 'verdict': VERDICT_INVALID}
+            continue
+        if str(seq) in seen:
+            if seen[str(seq)] is None:
+                repeats.append((index, seq))
+            else:
+                results[index] = {'seq': seq, **seen[str(seq)], 'duplicate': True}
+            continue
+
+        result = {'verdict': VERDICT_INVALID}
+        scanned_at = parse_scan_timestamp(scan.get('timestamp'))
+        if scanned_at and scan.get('fingerprint_id') not in (None, ''):
+            date = scanned_at.strftime('%Y-%m-%d')
+            if date not in day_sessions:
+                day_sessions[date] = firebase.get_all(f'sessions/{date}/{room_id}')
+            session = session_at(day_sessions[date], scanned_at)
+
+            if not session:
+                result = {'verdict': VERDICT_NO_SESSION}
+            else:
+                student_id, student = lookup(scan['fingerprint_id'])
+                result = check_scan(session, student_id, student)
+                if not result:
+                    # Decided under the scan locks below
+                    seen[str(seq)] = None
+                    pending.append((index, seq, session, student_id, student, scanned_at.strftime('%H:%M')))
+                    continue
+                result['session_id'] = session.get('session_id')
+        remember(index, seq, result)
+
+    with scan_locks_for((session.get('session_id'), student_id) for _, _, session, student_id, _, _ in pending):
+        present = {}
+        for index, seq, session, student_id, student, scan_time in pending:
+            session_id = session.get('session_id')
+            if session_id not in present:
+                present[session_id] = dict(index_items(firebase.get_all(f'attendance/{session_id}/present')))
+            if student_id in present[session_id]:
+                result = {'verdict': VERDICT_ALREADY_PRESENT, 'student_id': student_id}
+            else:
+                updates.update(present_updates(session, student_id, student, scan_time))
+                present[session_id][student_id] = {'time': scan_time}
+                result = {'verdict': VERDICT_PRESENT, 'student_id': student_id, 'time': scan_time}
+            remember(index, seq, {**result, 'session_id': session_id})
+
+        if updates:
+            firebase.update_at_path('/', updates)
+
+    for index, seq in repeats:
+        results[index] = {'seq': seq, **seen[str(seq)], 'duplicate': True}
+    return results
+
+@devices_bp.route('/api/devices/<esp32_id>/scans', methods=['POST'])
+def post_scan(esp32_id):
+    """Record a fingerprint scan from an ESP32 and return a compact verdict"""
+    try:
+        data = request.get_json(silent=True) or {}
+        fingerprint_id = data.get('fingerprint_id')
+        if fingerprint_id in (None, ''):
+            return jsonify({'success': False, 'error': 'fingerprint_id is required'}), 400
+
+        room_id, room = get_room_by_esp32_id(esp32_id)
+        if not room_id:
+            return jsonify({'success': False, 'error': 'Room not found for ESP32'}), 404
+
+        session = get_active_session_for_room(room_id)
+        if not session:
+            return jsonify({'success': True, 'verdict': VERDICT_NO_SESSION})
+
+        result = record_scan(session, fingerprint_id, datetime.now().strftime('%H:%M'))
+        return jsonify({'success': True, 'session_id': session.get('session_id'), **result})
+    except Exception as e:
+        print(f"Error recording scan from {esp32_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@devices_bp.route('/api/devices/<esp32_id>/scans/batch', methods=['POST'])
+def post_scan_batch(esp32_id):
+    """Replay a batch of scans buffered offline by an ESP32 (idempotent per seq)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        scans = data.get('scans')
+        if not isinstance(scans, list) or not scans:
+            return jsonify({'success': False, 'error': 'scans must be a non-empty list'}), 400
+        if len(scans) > MAX_BATCH_SCANS:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_SCANS} scans per batch'}), 400
+
+        room_id, room = get_room_by_esp32_id(esp32_id)
+        if not room_id:
+            return jsonify({'success': False, 'error': 'Room not found for ESP32'}), 404
+
+        with device_lock(esp32_id):
+            results = apply_scan_batch(esp32_id, room_id, scans)
+
+        return jsonify({
+            'success': True,
+            'results': results,
+            'applied': sum(1 for result in results if result['verdict'] == VERDICT_PRESENT and not result.get('duplicate')),
+            'duplicates': sum(1 for result in results if result.get('duplicate'))
+        })
+    except Exception as e:
+        print(f"Error replaying scans from {esp32_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def current_or_next_session(room_sessions, now):
+    """The room's session running now (ACTIVE or about to be), else today's next SCHEDULED one"""
+    current_time = now.strftime('%H:%M')
+    upcoming = []
+    for session in iter_room_sessions(room_sessions):
+        status = session.get('status')
+        if status in ('ACTIVE', 'SCHEDULED') and session.get('start', '') <= current_time <= session.get('end', ''):
+            return session
+        if status == 'SCHEDULED' and session.get('start', '') > current_time:
+            upcoming.append(session)
+    return min(upcoming, key=lambda session: session.get('start', '')) if upcoming else None
+
+def packed_session(session):
+    return [session.get(field) for field in STATE_SESSION_FIELDS] if session else None
+
+def device_state(room_id, room_sessions, now):
+    """Payload of /state and /wait: the room's current or next session and its group roster"""
+    session = current_or_next_session(room_sessions, now)
+    return {
+        'room': room_id,
+        'session': packed_session(session),
+        'roster': group_roster(session.get('group')) if session and session.get('group') else []
+    }
+
+def publish_room_states(day_sessions, now=None):
+    """Publish the state of every room of a day's sessions tree ({room_id: sessions})"""
+    now = now or datetime.now()
+    if not isinstance(day_sessions, dict):
+        return
+    for room_id, room_sessions in day_sessions.items():
+        room_states.publish(room_id, device_state(room_id, room_sessions, now))
+
+def publish_room_state(room_id):
+    """Re-read one room's sessions for today and publish its state"""
+    now = datetime.now()
+    room_sessions = firebase.get_all(f"sessions/{now.strftime('%Y-%m-%d')}/{room_id}")
+    room_states.publish(room_id, device_state(room_id, room_sessions, now))
+
+def publish_updated_rooms(paths):
+    """After a multi-path session write: re-publish today's rooms it touched
+
+    Only rooms already in the table (some device has waited on them) are
+    re-read, so the write path costs nothing when no device long-polls.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    rooms = {parts[2] for parts in (path.split('/') for path in paths)
+             if len(parts) > 2 and parts[0] == 'sessions' and parts[1] == today}
+    for room_id in rooms:
+        if room_states.get(room_id)[0] is not None:
+            publish_room_state(room_id)
+
+def refresh_room_states_loop():
+    """Catch transitions made by another worker: one read of today's sessions per tick, only while someone waits"""
+    while not room_state_stop.wait(ROOM_STATE_REFRESH_SECONDS):
+        if not room_states.waiters:
+            continue
+        try:
+            now = datetime.now()
+            day_sessions = firebase.get_all(f"sessions/{now.strftime('%Y-%m-%d')}")
+            publish_room_states(day_sessions, now)
+            # Rooms without sessions today fall back to "no session"
+            for room_id in list(room_states.states):
+                if room_id not in day_sessions:
+                    room_states.publish(room_id, device_state(room_id, None, now))
+        except Exception as e:
+            print(f"⚠️ Error refreshing room states: {e}")
+
+def ensure_room_state_refresher():
+    global room_state_refresher
+    with room_state_refresher_lock:
+        if room_state_refresher is None:
+            room_state_refresher = threading.Thread(
+                target=refresh_room_states_loop, name='room-state-refresher', daemon=True
+            )
+            room_state_refresher.start()
+
+def stop_room_state_refresher():
+    """Stop the refresher thread (it is restarted by the next /wait)"""
+    global room_state_refresher
+    with room_state_refresher_lock:
+        room_state_stop.set()
+        if room_state_refresher is not None:
+            room_state_refresher.join(timeout=ROOM_STATE_REFRESH_SECONDS)
+        room_state_refresher = None
+        room_state_stop.clear()
+
+def invalidate_group_rosters(*group_ids):
+    """Drop cached rosters after a student write (enrollment, group move, deactivation)"""
+    for group_id in group_ids:
+        if group_id:
+            roster_cache.invalidate(str(group_id))
+
+def group_roster(group_id):
+    """Packed [student_id, fingerprint_id, name] rows of a group's active students"""
+    found, roster = roster_cache.get(group_id)
+    if found:
+        return roster
+
+    roster = []
+    for student_id in sorted(group_members.members(group_id)):
+        student = firebase.get_one('students', student_id)
+        if isinstance(student, dict) and student.get('active', True) and student.get('group') == group_id:
+            roster.append([student_id, student.get('fingerprint_id'), student.get('name', '')])
+    roster_cache.set(group_id, roster)
+    return roster
+
+@devices_bp.route('/api/devices/<esp32_id>/state', methods=['GET'])
+def get_device_state(esp32_id):
+    """Current or next session of the device's room and its group roster, as packed arrays
+
+    Carries an ETag: a poll with a matching If-None-Match gets a 304 with no body.
+    """
+    try:
+        room_id, room = get_room_by_esp32_id(esp32_id)
+        if not room_id:
+            return jsonify({'success': False, 'error': 'Room not found for ESP32'}), 404
+
+        now = datetime.now()
+        room_sessions = firebase.get_all(f"sessions/{now.strftime('%Y-%m-%d')}/{room_id}")
+        state = device_state(room_id, room_sessions, now)
+        version = state_version(state)
+
+        response = jsonify({'success': True, 'v': version, **state})
+        response.set_etag(version)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"Error building state for {esp32_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@devices_bp.route('/api/devices/<esp32_id>/wait', methods=['GET'])
+def wait_device_state(esp32_id):
+    """Long-poll: return as soon as the room's state differs from `since`
+
+    `since` is the `v` of the last /state or /wait answer (empty on the first
+    call); returns with changed=false after `timeout` seconds (default 25,
+    max 55). When DEVICE_MAX_WAITERS requests already wait in this worker,
+    answers at once with `retry_after` (seconds) instead of waiting.
+    """
+    try:
+        since = request.args.get('since') or None
+        try:
+            timeout = min(max(float(request.args.get('timeout', 25)), 0), MAX_WAIT_SECONDS)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'timeout must be a number'}), 400
+
+        room_id, room = get_room_by_esp32_id(esp32_id)
+        if not room_id:
+            return jsonify({'success': False, 'error': 'Room not found for ESP32'}), 404
+
+        ensure_room_state_refresher()
+        if room_states.get(room_id)[0] is None:
+            publish_room_state(room_id)
+
+        version, state, changed, waited = room_states.wait(room_id, since, timeout, DEVICE_MAX_WAITERS)
+        response = {'success': True, 'v': version, 'changed': changed, **state}
+        if not waited:
+            response['retry_after'] = ROOM_STATE_REFRESH_SECONDS
+        return jsonify(response)
+    except Exception as e:
+        print(f"Error waiting on state for {esp32_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
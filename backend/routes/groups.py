@@ -1,6 +1,7 @@
 # routes/groups.py
 from flask import Blueprint, request, jsonify
 from firebase_config import firebase
+from utils import group_members
 import uuid
 from datetime import datetime
 
@@ -37,10 +38,11 @@ def get_group(group_id):
 def get_group_students(group_id):
     """Get students in a group"""
     try:
-        all_students = firebase.get_all('students') or {}
         group_students = {}
         
-        for student_id, student_data in all_students.items():
+        # Only this group's members are read (group_members index)
+        for student_id in group_members.members(group_id):
+            student_data = firebase.get_one('students', student_id)
             if isinstance(student_data, dict) and student_data.get('group') == group_id:
                 group_students[student_id] = student_data
         
@@ -127,11 +129,7 @@ def delete_group(group_id):
             return jsonify({'success': False, 'error': 'Group not found'}), 404
         
         # Check if group has students
-        all_students = firebase.get_all('students') or {}
-        has_students = any(
-            isinstance(student, dict) and student.get('group') == group_id 
-            for student in all_students.values()
-        )
+        has_students = bool(group_members.members(group_id))
         
         if has_students:
             return jsonify({
@@ -147,4 +145,17 @@ def delete_group(group_id):
             'message': 'Group deleted successfully'
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@groups_bp.route('/api/groups/members/rebuild', methods=['POST'])
+def rebuild_group_members():
+    """Rebuild the group_members index from the students collection"""
+    try:
+        result = group_members.rebuild()
+        return jsonify({
+            'success': True,
+            'message': f"Group members index rebuilt ({result['members']} members)",
+            **result
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -1,6 +1,7 @@
 # routes/schedule.py
 from flask import Blueprint, request, jsonify
 from firebase_config import firebase
+from routes.sessions import regenerate_room_day
 from datetime import datetime
 import calendar
 
@@ -12,6 +13,14 @@ def get_day_of_week():
     today_index = datetime.now().weekday()
     return days[today_index]
 
+def sync_room_day_sessions(room_id, day):
+    """Regenerate a room/day's sessions; the schedule write stands if this fails"""
+    try:
+        return regenerate_room_day(room_id, day)
+    except Exception as e:
+        print(f"Error regenerating sessions for {room_id}/{day}: {e}")
+        return {'room': room_id, 'day': day, 'error': str(e)}
+
 @schedule_bp.route('/api/schedule', methods=['GET'])
 def get_schedule():
     """Get all schedule"""
@@ -293,10 +302,14 @@ def add_schedule_entry():
         # Update the schedule
         firebase.update('schedule', f'{room_id}/{day}', day_schedule)
         
+        # Materialize the new entry on the upcoming dates of this room/day
+        sessions_report = sync_room_day_sessions(room_id, day)
+        
         return jsonify({
             'success': True,
             'message': 'Schedule entry added',
-            'data': new_entry
+            'data': new_entry,
+            'sessions': sessions_report
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -342,9 +355,13 @@ def delete_schedule_entry():
         # Update the schedule
         firebase.update('schedule', f'{room_id}/{day}', updated_schedule)
         
+        # Drop the pre-generated sessions of the removed entry
+        sessions_report = sync_room_day_sessions(room_id, day)
+        
         return jsonify({
             'success': True,
-            'message': 'Schedule entry deleted'
+            'message': 'Schedule entry deleted',
+            'sessions': sessions_report
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
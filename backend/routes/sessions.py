@@ -2,14 +2,49 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 from firebase_config import firebase
+from utils import attendance_index, get_students_by_id, group_members, iter_room_sessions
+from routes.devices import publish_updated_rooms
+from services.leader import create_lease_from_env
+from services.job_metrics import JobMetrics
+from services.pagination import MAX_PAGE_SCAN_DAYS, page_args, page_response
+from services.storage import key_before
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 import atexit
+import os
+
+try:
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+except ImportError:  # SQLAlchemy not installed: jobs are kept in memory only
+    SQLAlchemyJobStore = None
 
 sessions_bp = Blueprint('sessions', __name__)
 
 # Initialize scheduler globally
 scheduler = None
+scheduler_app = None
+# Leader election between WSGI workers: only the leader runs the scheduler
+leader_lease = None
+# Rolling execution metrics of the jobs run through job_with_context
+job_metrics = JobMetrics(call_counter=firebase.call_count)
+
+# Number of days (today included) materialized ahead by horizon generation
+SESSION_HORIZON_DAYS = int(os.environ.get('SESSION_HORIZON_DAYS', 14))
+
+# Persistent job store (SQLite by default, "memory" to disable)
+SCHEDULER_JOBSTORE_URL = os.environ.get(
+    'SCHEDULER_JOBSTORE_URL',
+    'sqlite:///' + os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scheduler_jobs.sqlite')
+)
+
+# Sessions are closed this many minutes after their end time
+CLOSE_DELAY_MINUTES = 5
+# A SCHEDULED session can still be auto-activated this long after its start
+ACTIVATION_GRACE_MINUTES = 15
 
 def get_day_of_week(date_str=None):
     """Get day of week from date string"""
@@ -32,55 +67,145 @@ def get_day_of_week(date_str=None):
         days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
         return days[datetime.now().weekday()]
 
+def create_job_store():
+    """Job store of the scheduler: persistent unless SQLAlchemy is missing"""
+    if SCHEDULER_JOBSTORE_URL == 'memory':
+        return MemoryJobStore()
+    if SQLAlchemyJobStore is None:
+        print("⚠️ SQLAlchemy not installed, scheduler jobs are kept in memory only")
+        return MemoryJobStore()
+    return SQLAlchemyJobStore(url=SCHEDULER_JOBSTORE_URL)
+
+def job_with_context(job_name, *args):
+    """Run a registered job with Flask app context
+
+    Module-level (jobs reference it by name) so a persistent job store
+    can serialize them.
+    """
+    job_func = SCHEDULED_JOBS[job_name]
+    with job_metrics.track(job_name):
+        if scheduler_app is None:
+            return job_func(*args)
+        with scheduler_app.app_context():
+            return job_func(*args)
+
+def on_job_event(event):
+    """Count runs skipped because the previous one was still running, or missed"""
+    job = scheduler.get_job(event.job_id) if scheduler else None
+    job_name = job.args[0] if job and job.args else event.job_id
+    if event.code == EVENT_JOB_MAX_INSTANCES:
+        job_metrics.record_event(job_name, 'skipped_overlap')
+        print(f"⚠️ Job {event.job_id} skipped: previous run still in progress")
+    else:
+        job_metrics.record_event(job_name, 'missed')
+
+def collect_missed_runs(now):
+    """Inspect persisted jobs before resuming, return the ids that missed a run
+
+    Overdue per-session triggers are dropped: the startup catch-up applies
+    all of them in one batched reconcile pass instead of one job each.
+    """
+    missed = []
+    for job in scheduler.get_jobs():
+        if job.next_run_time is None or job.next_run_time > now:
+            continue
+        missed.append(job.id)
+        if job.id.startswith(('activate_', 'close_')):
+            scheduler.remove_job(job.id)
+    return missed
+
+def catch_up_missed_runs(missed):
+    """Startup catch-up: regenerate if a generation run was missed, then reconcile once"""
+    missed = set(missed or [])
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        if 'horizon_session_generation' in missed:
+            generate_horizon_sessions_job()
+        elif 'daily_session_generation' in missed:
+            generate_daily_sessions_job()
+        elif not load_day_sessions(today):
+            # First start of the day with nothing generated yet
+            generate_sessions_for_date(today)
+
+        transitions = sum(1 for job_id in missed if job_id.startswith(('activate_', 'close_')))
+        print(f"⏪ Catching up {len(missed)} missed run(s) ({transitions} session transition(s))")
+        return reconcile_sessions_job()
+
+    except Exception as e:
+        print(f"❌ Error catching up missed runs: {str(e)}")
+        job_metrics.mark_failed(e)
+
 def init_scheduler(app):
     """Initialize APScheduler with Flask app"""
-    global scheduler
+    global scheduler, scheduler_app
 
     if scheduler is not None and scheduler.running:
         print("⚠️ Scheduler already running, skipping initialization")
         return scheduler
 
-    scheduler = BackgroundScheduler()
-
-    # Use app context wrapper for jobs
-    def job_with_context(job_func):
-        """Wrapper to run jobs with Flask app context"""
-        def wrapped_job():
-            with app.app_context():
-                job_func()
-        return wrapped_job
+    scheduler = BackgroundScheduler(
+        jobstores={'default': create_job_store()},
+        job_defaults={'coalesce': True, 'max_instances': 1}
+    )
+    scheduler_app = app
+    scheduler.add_listener(on_job_event, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+    job_metrics.set_interval('generate_daily_sessions', 24 * 3600)
+    job_metrics.set_interval('generate_horizon_sessions', 24 * 3600)
+    job_metrics.set_interval('reconcile_sessions', 30 * 60)
+
+    # Start paused: persisted jobs that missed their run are handled by the
+    # catch-up pass below instead of being replayed one by one
+    scheduler.start(paused=True)
+    now = datetime.now(scheduler.timezone)
+    missed = collect_missed_runs(now)
 
     # Schedule daily session generation at 07:55
     scheduler.add_job(
-        func=job_with_context(generate_daily_sessions_job),
+        func=job_with_context,
+        args=['generate_daily_sessions'],
         trigger=CronTrigger(hour=7, minute=55, timezone='Africa/Casablanca'),
         id='daily_session_generation',
         name='Generate daily sessions at 07:55',
+        misfire_grace_time=4 * 3600,
+        replace_existing=True
+    )
+
+    # Pre-generate the upcoming days overnight, off the 07:55 path
+    scheduler.add_job(
+        func=job_with_context,
+        args=['generate_horizon_sessions'],
+        trigger=CronTrigger(hour=1, minute=0, timezone='Africa/Casablanca'),
+        id='horizon_session_generation',
+        name=f'Pre-generate sessions for the next {SESSION_HORIZON_DAYS} days at 01:00',
+        misfire_grace_time=12 * 3600,
         replace_existing=True
     )
 
+    # Activation/closing run from one-shot per-session triggers (see
+    # schedule_session_triggers); this sweep only catches what they missed
     scheduler.add_job(
-        func=job_with_context(auto_activate_scheduled_sessions_job),
-        # trigger="interval",
-        trigger=CronTrigger(minute='*/5', hour='8-18', timezone='Africa/Casablanca'),
-        id='auto_activate_sessions',
-        name='Auto activate sessions every 5 minutes between 08:00 and 18:59',
+        func=job_with_context,
+        args=['reconcile_sessions'],
+        trigger=CronTrigger(minute='*/30', hour='7-19', timezone='Africa/Casablanca'),
+        id='reconcile_sessions',
+        name='Reconcile session states and triggers every 30 minutes between 07:00 and 19:59',
+        misfire_grace_time=10 * 60,
         replace_existing=True
     )
 
+    # Catch up on missed runs and register today's triggers right away
     scheduler.add_job(
-        func=job_with_context(auto_close_completed_sessions_job),
-        # trigger='interval',
-        # minutes=1,
-        trigger=CronTrigger(minute='*/5', hour='8-18', timezone='Africa/Casablanca'),
-        id='auto_close_sessions',
-        name='Auto-close completed sessions every 5 minutes between 08:00 and 18:59',
+        func=job_with_context,
+        args=['catch_up_missed_runs', missed],
+        id='startup_catch_up',
+        name='Catch up missed runs at startup',
+        misfire_grace_time=None,
         replace_existing=True
     )
 
-    scheduler.start()
+    scheduler.resume()
 
-    print("✅ APScheduler started with 3 jobs:")
+    print(f"✅ APScheduler started with {len(scheduler.get_jobs())} jobs:")
     for job in scheduler.get_jobs():
         print(f" - {job.name} (next run: {job.next_run_time})")
 
@@ -89,6 +214,77 @@ def init_scheduler(app):
 
     return scheduler
 
+def start_leader_scheduler(app):
+    """Start the scheduler once elected; a half-started one is shut down on failure"""
+    try:
+        return init_scheduler(app)
+    except Exception:
+        shutdown_scheduler()
+        raise
+
+def start_scheduler_election(app):
+    """Run the scheduler in exactly one worker process
+
+    Every worker joins the election; the one holding the lease starts the
+    scheduler, the others take over if it dies.
+    """
+    global leader_lease
+
+    if leader_lease is not None:
+        return leader_lease
+
+    leader_lease = create_lease_from_env().start(
+        on_elected=lambda: start_leader_scheduler(app),
+        status_provider=scheduler_snapshot,
+        on_message=handle_leader_message
+    )
+    return leader_lease
+
+def forward_to_leader(message):
+    """Hand trigger work to the leader when this worker has no scheduler"""
+    if scheduler and scheduler.running:
+        return False
+    if leader_lease is None or leader_lease.is_leader:
+        return False
+    leader_lease.enqueue(message)
+    return True
+
+def handle_leader_message(message):
+    """Apply a trigger request forwarded by a follower worker"""
+    if message.get('date'):
+        register_session_triggers(message['date'])
+        return
+
+    session_id = message.get('session_id')
+    session = get_session_by_id(session_id) if session_id else None
+    if session:
+        schedule_session_triggers(session)
+    elif session_id:
+        unschedule_session_triggers(session_id)
+
+def scheduler_snapshot():
+    """Scheduler state, jobs and metrics, as published in the leader's heartbeat"""
+    if not scheduler:
+        return {'running': False, 'jobs': [], 'jobs_count': 0, 'metrics': job_metrics.snapshot()}
+
+    jobs = []
+    for job in scheduler.get_jobs():
+        jobs.append({
+            'id': job.id,
+            'name': job.name,
+            'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
+            'trigger': str(job.trigger),
+            'max_instances': job.max_instances,
+            'coalesce': job.coalesce,
+            'misfire_grace_time': job.misfire_grace_time
+        })
+    return {
+        'running': scheduler.running,
+        'jobs': jobs,
+        'jobs_count': len(jobs),
+        'metrics': job_metrics.snapshot()
+    }
+
 def shutdown_scheduler():
     """Shutdown scheduler"""
     global scheduler
@@ -118,52 +314,94 @@ def generate_session_id(date, room, start_time, group):
     # In your structure, rooms don't have underscores
     return f"{date_formatted}_{room}_{start_formatted}_{group}"
 
+def parse_session_location(session_id):
+    """Get (date, room) from a session_id, or (None, None)"""
+    parts = (session_id or '').split('_')
+    if len(parts) < 4 or len(parts[0]) != 8:
+        return None, None
+    date_str = parts[0]
+    date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
+    # In your structure, rooms don't have underscores
+    return date, parts[1]
+
+def session_path(date, room, session_id):
+    """Firebase path of a session node: sessions/<date>/<room>/<session_id>"""
+    return f"sessions/{date}/{room}/{session_id}"
+
+def keyed_room_sessions(date, room, room_sessions):
+    """Convert a legacy list of sessions to a dict keyed by session_id"""
+    keyed = {}
+    for session in iter_room_sessions(room_sessions):
+        session_id = session.get('session_id') or generate_session_id(
+            date, room, session.get('start', ''), session.get('group', '')
+        )
+        keyed[session_id] = {**session, 'session_id': session_id}
+    return keyed
+
+def migrate_sessions_layout(date=None):
+    """Rewrite legacy list nodes sessions/<date>/<room> as dicts keyed by session_id
+
+    Runs as one multi-path update. Returns the number of room nodes migrated.
+    """
+    if date:
+        tree = {date: firebase.get_all(f'sessions/{date}') or {}}
+    else:
+        tree = firebase.get_all('sessions') or {}
+
+    updates = {}
+    for session_date, rooms in tree.items():
+        if not isinstance(rooms, dict):
+            continue
+        for room_id, room_sessions in rooms.items():
+            if isinstance(room_sessions, list):
+                updates[f"{session_date}/{room_id}"] = keyed_room_sessions(session_date, room_id, room_sessions)
+
+    if updates:
+        firebase.update_at_path('sessions', updates)
+        print(f"🔀 Migrated {len(updates)} room session list(s) to keyed layout")
+    return len(updates)
+
+def load_day_sessions(date):
+    """Load sessions/<date> in keyed layout, migrating legacy room lists on the way"""
+    date_sessions = firebase.get_all(f'sessions/{date}') or {}
+    if not isinstance(date_sessions, dict):
+        return {}
+
+    if any(isinstance(room_sessions, list) for room_sessions in date_sessions.values()):
+        migrate_sessions_layout(date)
+        date_sessions = {
+            room_id: keyed_room_sessions(date, room_id, room_sessions)
+            for room_id, room_sessions in date_sessions.items()
+        }
+    return date_sessions
+
 def get_session_by_id(session_id):
-    """Get session by session_id"""
+    """Get session by session_id (reads only that session's node)"""
     try:
-        # Parse session_id to get date
-        date_str = session_id.split('_')[0]
-        if len(date_str) == 8:  # YYYYMMDD format
-            date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
-        else:
-            return None
-        
-        # Get all sessions for this date
-        all_sessions = firebase.get_all('sessions') or {}
-        if date not in all_sessions:
-            return None
-        
-        date_sessions = all_sessions[date]
-        if not isinstance(date_sessions, dict):
-            return None
-        
-        # Parse room from session_id (second part before time)
-        parts = session_id.split('_')
-        if len(parts) < 4:
-            return None
-            
-        room = parts[1]  # room is the second part
-        
-        if room not in date_sessions:
+        date, room = parse_session_location(session_id)
+        if not date:
             return None
-        
-        room_sessions = date_sessions[room]
+
+        session = firebase.get_at_path(session_path(date, room, session_id))
+        if isinstance(session, dict):
+            return {**session, 'date': session.get('date') or date}
+
+        # Legacy layout: sessions/<date>/<room> is a list, migrate that node
+        room_sessions = firebase.get_at_path(f"sessions/{date}/{room}")
         if not isinstance(room_sessions, list):
             return None
-        
-        # Search for the session with matching session_id
-        for session in room_sessions:
-            if isinstance(session, dict) and session.get('session_id') == session_id:
-                return session
-        
-        return None
+
+        keyed = keyed_room_sessions(date, room, room_sessions)
+        firebase.update_at_path(f"sessions/{date}", {room: keyed})
+        session = keyed.get(session_id)
+        return {**session, 'date': session.get('date') or date} if session else None
         
     except Exception as e:
         print(f"Error getting session by ID: {e}")
         return None
 
 def update_session(session_data):
-    """Update session in Firebase structure"""
+    """Update session in Firebase structure (writes only that session's node)"""
     try:
         session_id = session_data.get('session_id')
         date = session_data.get('date')
@@ -173,42 +411,87 @@ def update_session(session_data):
             print(f"Missing required fields: session_id={session_id}, date={date}, room={room}")
             return False
         
-        # Get existing sessions for this date
-        date_sessions = firebase.get_one('sessions', date) or {}
-        
-        # Get or create sessions for this room on this date
-        if room not in date_sessions:
-            date_sessions[room] = []
-        
-        room_sessions = date_sessions[room]
-        if not isinstance(room_sessions, list):
-            room_sessions = []
-        
-        # Find and update the session
-        found = False
-        for i, session in enumerate(room_sessions):
-            if isinstance(session, dict) and session.get('session_id') == session_id:
-                # Update the session
-                room_sessions[i] = {**session, **session_data}
-                found = True
-                break
-        
-        # If not found, add it
-        if not found:
-            room_sessions.append(session_data)
-        
-        date_sessions[room] = room_sessions
-        
-        # Update in Firebase
-        result = firebase.update('sessions', date, date_sessions)
-        if not result:
-            print(f"Failed to update session in Firebase: {session_id}")
-        return result
+        firebase.update_at_path(session_path(date, room, session_id), session_data)
+        return True
         
     except Exception as e:
         print(f"Error updating session: {e}")
         return False
 
+def session_field_updates(session, fields):
+    """Multi-path entries that set only the given fields on a session node"""
+    base = session_path(session['date'], session['room'], session['session_id'])
+    return {f"{base}/{field}": value for field, value in fields.items()}
+
+def commit_session_updates(updates):
+    """Write collected session field updates in a single multi-path request"""
+    if not updates:
+        return True
+    try:
+        firebase.update_at_path('/', updates)
+        job_metrics.add_sessions(len({tuple(path.split('/')[:4]) for path in updates
+                                      if path.startswith('sessions/')}))
+        # Wake devices long-polling on the rooms whose sessions changed
+        publish_updated_rooms(updates)
+        return True
+    except Exception as e:
+        print(f"Error committing session updates: {e}")
+        job_metrics.mark_failed(e)
+        return False
+
+def closing_index_updates(session):
+    """attendance_by_student entries for a session being closed
+
+    Devices write attendance/<session_id> directly, so the session's sheet is
+    copied into the per-student index when it closes.
+    """
+    session_id = session.get('session_id')
+    if not session_id:
+        return {}
+    record = firebase.get_one('attendance', session_id)
+    return attendance_index.session_updates(session_id, record, session)
+
+def activation_roster_updates(session, students=None):
+    """attendance/<session_id>/absent for a session being activated
+
+    Every active member of the session's group (group_members index) who is
+    not already present is listed absent, so devices never build the roster.
+    Callers activating several sessions pass ``students`` (students/ read
+    once); otherwise each member is read on its own.
+    """
+    session_id, group_id = session.get('session_id'), session.get('group')
+    if not session_id or not group_id:
+        return {}
+    present = firebase.get_all(f'attendance/{session_id}/present') or {}
+    roster = {}
+    for student_id in group_members.members(group_id):
+        if student_id in present:
+            continue
+        if students is not None:
+            student = students.get(student_id)
+        else:
+            student = firebase.get_one('students', student_id)
+        if isinstance(student, dict) and student.get('active', True):
+            roster[student_id] = {'name': student.get('name', '')}
+    return attendance_index.roster_updates(session_id, roster, session)
+
+def session_transition_updates(session, fields, students=None):
+    """Field updates of a session, plus the roster (activation) or the
+    per-student index copy (closing) that go out in the same write"""
+    updates = session_field_updates(session, fields)
+    if fields.get('status') == 'ACTIVE' and session.get('status') != 'ACTIVE':
+        updates.update(activation_roster_updates(session, students))
+    if fields.get('status') == 'CLOSED':
+        updates.update(closing_index_updates(session))
+    return updates
+
+def update_session_fields(session, fields):
+    """Update only the given fields of one session"""
+    if not session.get('session_id') or not session.get('date') or not session.get('room'):
+        print(f"Missing required fields for session update: {session.get('session_id')}")
+        return False
+    return commit_session_updates(session_transition_updates(session, fields))
+
 def create_session(session_data):
     """Create session in Firebase structure"""
     try:
@@ -226,28 +509,9 @@ def create_session(session_data):
             print(f"Session already exists: {session_id}")
             return False  # Session already exists
         
-        # Get existing sessions for this date
-        date_sessions = firebase.get_one('sessions', date) or {}
-        
-        # Get or create sessions for this room on this date
-        if room not in date_sessions:
-            date_sessions[room] = []
-        
-        room_sessions = date_sessions[room]
-        if not isinstance(room_sessions, list):
-            room_sessions = []
-        
-        # Add the new session
-        room_sessions.append(session_data)
-        date_sessions[room] = room_sessions
-        
-        # Update in Firebase
-        result = firebase.update('sessions', date, date_sessions)
-        if result:
-            print(f"✅ Created session: {session_id}")
-        else:
-            print(f"❌ Failed to create session: {session_id}")
-        return result
+        firebase.update_at_path(session_path(date, room, session_id), session_data)
+        print(f"✅ Created session: {session_id}")
+        return True
         
     except Exception as e:
         print(f"Error creating session: {e}")
@@ -256,54 +520,333 @@ def create_session(session_data):
 def delete_session_by_id(session_id):
     """Delete session by session_id"""
     try:
-        # Parse session_id to get date and room
-        parts = session_id.split('_')
-        if len(parts) < 4:
-            return False
-            
-        date_str = parts[0]
-        if len(date_str) == 8:  # YYYYMMDD format
-            date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
-        else:
-            return False
-        
-        room = parts[1]  # room is the second part
-        
-        # Get existing sessions for this date
-        date_sessions = firebase.get_one('sessions', date) or {}
-        
-        if room not in date_sessions:
-            return False
-        
-        room_sessions = date_sessions[room]
-        if not isinstance(room_sessions, list):
+        date, room = parse_session_location(session_id)
+        if not date:
             return False
         
-        # Find and remove the session
-        updated_sessions = [
-            session for session in room_sessions 
-            if isinstance(session, dict) and session.get('session_id') != session_id
-        ]
-        
-        if len(updated_sessions) == len(room_sessions):
+        # Also migrates a legacy room list so the keyed delete below applies
+        if not get_session_by_id(session_id):
             return False  # Session not found
         
-        if updated_sessions:
-            date_sessions[room] = updated_sessions
-        else:
-            # Remove the room entry if no sessions left
-            del date_sessions[room]
-        
-        # If no rooms left for this date, remove the date entry
-        if not date_sessions:
-            return firebase.delete('sessions', date)
-        else:
-            return firebase.update('sessions', date, date_sessions)
+        firebase.delete_at_path(session_path(date, room, session_id))
+        return True
         
     except Exception as e:
         print(f"Error deleting session: {e}")
         return False
 
+def plan_sessions_for_date(date, schedule, rooms, subjects, day_sessions, manual=False, not_before=None):
+    """Compute the writes needed to materialize one day's sessions from the schedule
+
+    Pure function: works on data already loaded, returns (updates, report)
+    where updates is a root multi-path dict ready for commit_session_updates.
+    Entries starting at or before ``not_before`` (HH:MM) are left alone.
+    """
+    day_of_week = get_day_of_week(date).lower()
+    now_iso = datetime.now().isoformat()
+    updates = {}
+    report = {'date': date, 'created': 0, 'reactivated': 0, 'skipped': 0, 'session_ids': []}
+
+    for room_id, room_schedule in (schedule or {}).items():
+        if not isinstance(room_schedule, dict):
+            continue
+        day_entries = room_schedule.get(day_of_week)
+        if not isinstance(day_entries, list):
+            continue
+
+        existing_room = (day_sessions or {}).get(room_id) or {}
+        room_info = (rooms or {}).get(room_id) or {}
+
+        for session_data in day_entries:
+            if not isinstance(session_data, dict):
+                continue
+            if not_before and session_data.get('start', '') <= not_before:
+                continue
+
+            session_id = generate_session_id(
+                date,
+                room_id,
+                session_data.get('start', ''),
+                session_data.get('group', '')
+            )
+
+            existing_session = existing_room.get(session_id) if isinstance(existing_room, dict) else None
+            if existing_session:
+                existing_session = {**existing_session, 'room': room_id, 'session_id': session_id}
+                stored_date = existing_session.get('date') or date
+                # Carry-over from another day: reset it for this date
+                if stored_date != date and (manual or existing_session.get('status') == 'CLOSED'):
+                    fields = {'date': date, 'status': 'SCHEDULED'}
+                    if manual:
+                        fields['updated_at'] = now_iso
+                    else:
+                        fields.update({'auto_created': True, 'created_at': now_iso})
+                    updates.update(session_field_updates({**existing_session, 'date': date}, fields))
+                    report['reactivated'] += 1
+                    report['session_ids'].append(session_id)
+                else:
+                    report['skipped'] += 1
+                continue
+
+            session_entry = {
+                'session_id': session_id,
+                'date': date,
+                'room': room_id,
+                'start': session_data.get('start', ''),
+                'end': session_data.get('end', ''),
+                'group': session_data.get('group', ''),
+                'subject': session_data.get('subject', ''),
+                'status': 'SCHEDULED',
+                'created_at': now_iso,
+                'auto_created': not manual,
+                'auto_closed': False,
+                'closed_at': None
+            }
+            if manual:
+                session_entry['manually_created'] = True
+
+            if room_info:
+                session_entry['room_name'] = room_info.get('name', room_id)
+
+            subject_info = (subjects or {}).get(session_data.get('subject', '')) or {}
+            if subject_info:
+                session_entry['subject_name'] = subject_info.get('name', session_data.get('subject', ''))
+
+            updates[session_path(date, room_id, session_id)] = session_entry
+            report['created'] += 1
+            report['session_ids'].append(session_id)
+
+    return updates, report
+
+def generate_sessions_for_date(date, manual=False):
+    """Generate one day's sessions: 4 reads, then a single multi-path write"""
+    schedule = firebase.get_all('schedule') or {}
+    rooms = firebase.get_all('rooms') or {}
+    subjects = firebase.get_all('subjects') or {}
+    day_sessions = load_day_sessions(date)
+
+    updates, report = plan_sessions_for_date(date, schedule, rooms, subjects, day_sessions, manual)
+    if not commit_session_updates(updates):
+        raise RuntimeError(f"Failed to write generated sessions for {date}")
+    register_session_triggers(date)
+    return report
+
+def get_excluded_dates(extra=None):
+    """Dates skipped by generation: keys of the holidays node plus ``extra``"""
+    holidays = firebase.get_all('holidays') or {}
+    excluded = set(holidays.keys()) if isinstance(holidays, dict) else set()
+    excluded.update(extra or [])
+    return excluded
+
+def horizon_dates(start_date=None, days=None):
+    """List of YYYY-MM-DD dates from start_date (default today) for ``days`` days"""
+    start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else datetime.now()
+    return [(start + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range(days or SESSION_HORIZON_DAYS)]
+
+def generate_sessions_horizon(start_date=None, days=None, exclude=None, manual=False):
+    """Materialize sessions for every date of the horizon in one multi-path write
+
+    Idempotent: existing sessions are skipped, so it can run as often as
+    needed. Excluded dates (holidays) are not generated.
+    """
+    schedule = firebase.get_all('schedule') or {}
+    rooms = firebase.get_all('rooms') or {}
+    subjects = firebase.get_all('subjects') or {}
+    excluded = get_excluded_dates(exclude)
+
+    updates = {}
+    report = {'dates': [], 'excluded': [], 'created': 0, 'reactivated': 0, 'skipped': 0}
+    for date in horizon_dates(start_date, days):
+        if date in excluded:
+            report['excluded'].append(date)
+            continue
+
+        day_updates, day_report = plan_sessions_for_date(
+            date, schedule, rooms, subjects, load_day_sessions(date), manual
+        )
+        updates.update(day_updates)
+        report['dates'].append(date)
+        for key in ('created', 'reactivated', 'skipped'):
+            report[key] += day_report[key]
+
+    if not commit_session_updates(updates):
+        raise RuntimeError("Failed to write horizon sessions")
+    for date in report['dates']:
+        register_session_triggers(date)
+    return report
+
+def regenerate_room_day(room_id, day, days=None):
+    """Re-sync future sessions of one room/weekday after a schedule change
+
+    Only dates of the horizon falling on ``day`` are touched, and for today
+    only entries that have not started yet. Sessions no longer in the
+    schedule are removed if they are still SCHEDULED and were generated from
+    the schedule (ad-hoc sessions from /api/sessions/create are kept).
+    """
+    now = datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    current_time = now.strftime('%H:%M')
+
+    day_entries = firebase.get_all(f'schedule/{room_id}/{day}') or []
+    room_schedule = {room_id: {day: day_entries}}
+    rooms = firebase.get_all('rooms') or {}
+    subjects = firebase.get_all('subjects') or {}
+    excluded = get_excluded_dates()
+
+    updates = {}
+    removed_ids = []
+    report = {'room': room_id, 'day': day, 'dates': [], 'created': 0, 'removed': 0}
+    for date in horizon_dates(today, days):
+        if get_day_of_week(date) != day or date in excluded:
+            continue
+
+        not_before = current_time if date == today else None
+        room_sessions = load_day_sessions(date).get(room_id) or {}
+        day_updates, day_report = plan_sessions_for_date(
+            date, room_schedule, rooms, subjects, {room_id: room_sessions}, not_before=not_before
+        )
+        updates.update(day_updates)
+        report['created'] += day_report['created']
+
+        wanted = {
+            generate_session_id(date, room_id, entry.get('start', ''), entry.get('group', ''))
+            for entry in day_entries if isinstance(entry, dict)
+        }
+        for session_id, session in room_sessions.items():
+            if (session_id in wanted or not isinstance(session, dict) or
+                    session.get('status') != 'SCHEDULED' or
+                    not (session.get('auto_created') or session.get('manually_created'))):
+                continue
+            if not_before and session.get('start', '') <= not_before:
+                continue
+            updates[session_path(date, room_id, session_id)] = None
+            removed_ids.append(session_id)
+            report['removed'] += 1
+
+        report['dates'].append(date)
+
+    if not commit_session_updates(updates):
+        raise RuntimeError(f"Failed to regenerate sessions for {room_id}/{day}")
+    # Removed sessions must not be activated/closed by their pending jobs
+    for session_id in removed_ids:
+        unschedule_session_triggers(session_id)
+    for date in report['dates']:
+        register_session_triggers(date)
+    return report
+
+def session_transition_times(session):
+    """(activate_at, close_at) datetimes of a session"""
+    date = session.get('date')
+    start_at = datetime.strptime(f"{date} {session.get('start')}", '%Y-%m-%d %H:%M')
+    end_at = datetime.strptime(f"{date} {session.get('end')}", '%Y-%m-%d %H:%M')
+    return start_at, end_at + timedelta(minutes=CLOSE_DELAY_MINUTES)
+
+def unschedule_session_triggers(session_id):
+    """Remove the one-shot activate/close jobs of a session, if any"""
+    if forward_to_leader({'session_id': session_id}) or not scheduler:
+        return
+    for action in ('activate', 'close'):
+        try:
+            scheduler.remove_job(f'{action}_{session_id}')
+        except JobLookupError:
+            pass
+
+def schedule_session_triggers(session):
+    """Register (or move) the one-shot activate/close jobs of a session
+
+    Returns the number of jobs registered. Transitions already overdue are
+    left to the reconciliation sweep.
+    """
+    session_id = session.get('session_id')
+    if not session_id or forward_to_leader({'session_id': session_id}):
+        return 0
+    if not scheduler or not scheduler.running:
+        return 0
+
+    unschedule_session_triggers(session_id)
+    try:
+        start_at, close_at = session_transition_times(session)
+    except (TypeError, ValueError):
+        return 0
+
+    now = datetime.now()
+    status = session.get('status')
+    registered = 0
+
+    if status == 'SCHEDULED' and now < start_at + timedelta(minutes=ACTIVATION_GRACE_MINUTES):
+        scheduler.add_job(
+            func=job_with_context,
+            trigger=DateTrigger(run_date=max(start_at, now)),
+            args=['session_transition', 'activate', session_id],
+            id=f'activate_{session_id}',
+            name=f'Activate {session_id}',
+            misfire_grace_time=ACTIVATION_GRACE_MINUTES * 60,
+            replace_existing=True
+        )
+        registered += 1
+
+    if status != 'CLOSED' and now < close_at:
+        scheduler.add_job(
+            func=job_with_context,
+            trigger=DateTrigger(run_date=close_at),
+            args=['session_transition', 'close', session_id],
+            id=f'close_{session_id}',
+            name=f'Close {session_id}',
+            misfire_grace_time=None,
+            replace_existing=True
+        )
+        registered += 1
+
+    return registered
+
+def register_session_triggers(date, day_sessions=None):
+    """Register triggers for every session of ``date`` (today only)"""
+    if date != datetime.now().strftime('%Y-%m-%d') or forward_to_leader({'date': date}):
+        return 0
+    if not scheduler or not scheduler.running:
+        return 0
+
+    if day_sessions is None:
+        day_sessions = load_day_sessions(date)
+
+    registered = 0
+    for room_id, room_sessions in day_sessions.items():
+        for session in iter_room_sessions(room_sessions):
+            registered += schedule_session_triggers({'date': date, 'room': room_id, **session})
+    return registered
+
+def apply_session_transition(action, session_id):
+    """Activate or close one session if it is still in the expected state"""
+    session = get_session_by_id(session_id)
+    if not session:
+        print(f"⚠️ Session {session_id} no longer exists, skipping {action}")
+        return False
+
+    now_iso = datetime.now().isoformat()
+    if action == 'activate':
+        if session.get('status') != 'SCHEDULED':
+            return False
+        fields = {'status': 'ACTIVE', 'started_at': now_iso, 'auto_activated': True}
+    else:
+        if session.get('status') == 'CLOSED':
+            return False
+        fields = {'status': 'CLOSED', 'closed_at': now_iso, 'auto_closed': True}
+
+    if not update_session_fields(session, fields):
+        return False
+
+    print(f" {'▶️ Auto-activated' if action == 'activate' else '⏹️ Auto-closed'} session: {session_id}")
+    return True
+
+def run_session_transition(action, session_id):
+    """Entry point of the one-shot per-session jobs"""
+    try:
+        return apply_session_transition(action, session_id)
+    except Exception as e:
+        print(f"❌ Error running {action} for {session_id}: {str(e)}")
+        job_metrics.mark_failed(e)
+
 # Job functions
 def generate_daily_sessions_job():
     """Generate sessions for today based on schedule"""
@@ -313,80 +856,39 @@ def generate_daily_sessions_job():
 
         print(f"🔄 Generating sessions for {today} ({day_of_week})...")
 
-        schedule = firebase.get_all('schedule') or {}
-        sessions_created = 0
-
-        for room_id, room_schedule in schedule.items():
-            if day_of_week in room_schedule:
-                day_sessions = room_schedule[day_of_week]
-
-                if isinstance(day_sessions, list):
-                    for session_data in day_sessions:
-                        if isinstance(session_data, dict):
-                            # Generate session ID
-                            session_id = generate_session_id(
-                                today,
-                                room_id,
-                                session_data.get('start', ''),
-                                session_data.get('group', '')
-                            )
-
-                            # Check if session already exists
-                            existing_session = get_session_by_id(session_id)
-                            if existing_session:
-                                # Check if we need to update the status if it's CLOSED from previous day
-                                if existing_session.get('status') == 'CLOSED' and existing_session.get('date') != today:
-                                    existing_session['status'] = 'SCHEDULED'
-                                    existing_session['date'] = today
-                                    existing_session['auto_created'] = True
-                                    existing_session['created_at'] = datetime.now().isoformat()
-                                    if update_session(existing_session):
-                                        sessions_created += 1
-                                        print(f" 🔄 Reactivated session: {session_id}")
-                                else:
-                                    print(f" ⚠️ Session already exists: {session_id}")
-                                continue
-
-                            # Create session entry
-                            session_entry = {
-                                'session_id': session_id,
-                                'date': today,
-                                'room': room_id,
-                                'start': session_data.get('start', ''),
-                                'end': session_data.get('end', ''),
-                                'group': session_data.get('group', ''),
-                                'subject': session_data.get('subject', ''),
-                                'status': 'SCHEDULED',
-                                'created_at': datetime.now().isoformat(),
-                                'auto_created': True,
-                                'auto_closed': False,
-                                'closed_at': None
-                            }
-
-                            # Get room info
-                            room_info = firebase.get_one('rooms', room_id) or {}
-                            if room_info:
-                                session_entry['room_name'] = room_info.get('name', room_id)
-
-                            # Get subject info
-                            subject_info = firebase.get_one('subjects', session_data.get('subject', '')) or {}
-                            if subject_info:
-                                session_entry['subject_name'] = subject_info.get('name', session_data.get('subject', ''))
-
-                            # Save session
-                            if create_session(session_entry):
-                                sessions_created += 1
-                                print(f" ✅ Created session: {session_id}")
-                            else:
-                                print(f" ❌ Failed to create session: {room_id} at {session_data.get('start')}")
-
-        print(f"✅ Generated {sessions_created} sessions for {today}")
+        report = generate_sessions_for_date(today)
+
+        print(f"✅ Generated sessions for {today}: {report['created']} created, "
+              f"{report['reactivated']} reactivated, {report['skipped']} skipped")
+        return report
 
     except Exception as e:
         print(f"❌ Error generating daily sessions: {str(e)}")
+        job_metrics.mark_failed(e)
+
+def generate_horizon_sessions_job():
+    """Pre-generate sessions for the next SESSION_HORIZON_DAYS days"""
+    try:
+        print(f"🔄 Pre-generating sessions for the next {SESSION_HORIZON_DAYS} days...")
+
+        report = generate_sessions_horizon()
 
-def auto_activate_scheduled_sessions_job():
-    """Automatically activate sessions when their start time arrives"""
+        print(f"✅ Horizon generation: {report['created']} created, "
+              f"{report['reactivated']} reactivated, {report['skipped']} skipped, "
+              f"{len(report['excluded'])} excluded date(s)")
+        return report
+
+    except Exception as e:
+        print(f"❌ Error pre-generating sessions: {str(e)}")
+        job_metrics.mark_failed(e)
+
+def auto_activate_scheduled_sessions_job(today_sessions=None, until_end=False):
+    """Automatically activate sessions when their start time arrives
+
+    ``until_end=True`` (reconcile sweep) activates a SCHEDULED session as long
+    as it has not ended, not only within ACTIVATION_GRACE_MINUTES: a missed
+    one-shot trigger would otherwise outlive the grace window between sweeps.
+    """
     print("🔄 Checking for sessions to auto-activate...")
    
     try:
@@ -394,27 +896,22 @@ def auto_activate_scheduled_sessions_job():
         current_time = datetime.now().strftime('%H:%M')
         current_minutes = time_to_minutes(current_time)
        
-        # Get all sessions for today
-        all_sessions = firebase.get_all('sessions') or {}
+        # Get today's sessions only
+        if today_sessions is None:
+            today_sessions = load_day_sessions(today)
         sessions_activated = 0
+        updates = {}
+        activated_ids = []
+        # Read once, on the first activation of the tick (rosters)
+        students = None
        
         # Check if today has sessions
-        if today not in all_sessions:
+        if not today_sessions:
             print("No sessions for today to activate.")
             return
        
-        today_sessions = all_sessions[today]
-        if not isinstance(today_sessions, dict):
-            return
-       
         for room_id, room_sessions in today_sessions.items():
-            if not isinstance(room_sessions, list):
-                continue
-           
-            for session in room_sessions:
-                if not isinstance(session, dict):
-                    continue
-               
+            for session in iter_room_sessions(room_sessions):
                 if session.get('status') != 'SCHEDULED':
                     continue
                
@@ -423,29 +920,44 @@ def auto_activate_scheduled_sessions_job():
                     continue
                
                 start_minutes = time_to_minutes(start_time)
+                last_minutes = start_minutes + ACTIVATION_GRACE_MINUTES
+                if until_end and session.get('end'):
+                    last_minutes = max(last_minutes, time_to_minutes(session['end']))
                
                 # Activate session when current time is within 5 minutes of start time
                 # or up to 15 minutes after start time
-                if (start_minutes - 5) <= current_minutes <= (start_minutes + 15):
+                if (start_minutes - 5) <= current_minutes <= last_minutes:
                     # Check if session is already in the time window
                     if current_minutes >= start_minutes:
                         if 'date' not in session or not session['date']:
                             session['date'] = today
-                        session['status'] = 'ACTIVE'
-                        session['started_at'] = datetime.now().isoformat()
-                        session['auto_activated'] = True
-                       
-                        if update_session(session):
-                            sessions_activated += 1
-                            print(f" ▶️ Auto-activated session: {session.get('session_id')}")
+                        session.setdefault('room', room_id)
+                        fields = {
+                            'status': 'ACTIVE',
+                            'started_at': datetime.now().isoformat(),
+                            'auto_activated': True
+                        }
+                        if students is None:
+                            students = get_students_by_id()
+                        # The absent roster goes out in the same write
+                        updates.update(session_transition_updates(session, fields, students))
+                        session.update(fields)
+                        activated_ids.append(session.get('session_id'))
+       
+        # All transitions of this tick go out in one request
+        if activated_ids and commit_session_updates(updates):
+            sessions_activated = len(activated_ids)
+            for session_id in activated_ids:
+                print(f" ▶️ Auto-activated session: {session_id}")
        
         if sessions_activated > 0:
             print(f"✅ Auto-activated {sessions_activated} session(s)")
            
     except Exception as e:
         print(f"❌ Error auto-activating sessions: {str(e)}")
+        job_metrics.mark_failed(e)
 
-def auto_close_completed_sessions_job():
+def auto_close_completed_sessions_job(today_sessions=None):
     """Auto-close sessions that have passed their end time"""
     print("🔄 Checking for sessions to auto-close...")
 
@@ -454,28 +966,20 @@ def auto_close_completed_sessions_job():
         current_time = datetime.now().strftime('%H:%M')
         current_minutes = time_to_minutes(current_time)
         
-        # Get all sessions for today
-        all_sessions = firebase.get_all('sessions') or {}
+        # Get today's sessions only
+        if today_sessions is None:
+            today_sessions = load_day_sessions(today)
         sessions_closed = 0
+        updates = {}
+        closed_ids = []
         
         # Check if today has sessions
-        if today not in all_sessions:
+        if not today_sessions:
             print(f"No sessions for today ({today}) to close.")
             return
 
-        today_sessions = all_sessions[today]
-        if not isinstance(today_sessions, dict):
-            print(f"Today's sessions data is not a dict: {type(today_sessions)}")
-            return
-
         for room_id, room_sessions in today_sessions.items():
-            if not isinstance(room_sessions, list):
-                continue
-
-            for session in room_sessions:
-                if not isinstance(session, dict):
-                    continue
-
+            for session in iter_room_sessions(room_sessions):
                 # Skip if already closed
                 if session.get('status') == 'CLOSED':
                     continue
@@ -487,17 +991,25 @@ def auto_close_completed_sessions_job():
                 end_minutes = time_to_minutes(end_time)
 
                 # Close session 5 minutes after end time
-                if current_minutes > (end_minutes + 5):
+                if current_minutes > (end_minutes + CLOSE_DELAY_MINUTES):
                     if 'date' not in session or not session['date']:
                         session['date'] = today
+                    session.setdefault('room', room_id)
                     # Close session
-                    session['status'] = 'CLOSED'
-                    session['closed_at'] = datetime.now().isoformat()
-                    session['auto_closed'] = True
-
-                    if update_session(session):
-                        sessions_closed += 1
-                        print(f" ⏹️ Auto-closed session: {session.get('session_id')} (ended at {end_time}, current: {current_time})")
+                    fields = {
+                        'status': 'CLOSED',
+                        'closed_at': datetime.now().isoformat(),
+                        'auto_closed': True
+                    }
+                    updates.update(session_transition_updates(session, fields))
+                    session.update(fields)
+                    closed_ids.append((session.get('session_id'), end_time))
+
+        # All transitions of this tick go out in one request
+        if closed_ids and commit_session_updates(updates):
+            sessions_closed = len(closed_ids)
+            for session_id, end_time in closed_ids:
+                print(f" ⏹️ Auto-closed session: {session_id} (ended at {end_time}, current: {current_time})")
 
         if sessions_closed > 0:
             print(f"✅ Auto-closed {sessions_closed} session(s) at {current_time}")
@@ -506,6 +1018,34 @@ def auto_close_completed_sessions_job():
 
     except Exception as e:
         print(f"❌ Error auto-closing sessions: {str(e)}")
+        job_metrics.mark_failed(e)
+
+def reconcile_sessions_job():
+    """Safety net: apply overdue transitions, then re-register today's triggers"""
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        today_sessions = load_day_sessions(today)
+
+        auto_activate_scheduled_sessions_job(today_sessions, until_end=True)
+        auto_close_completed_sessions_job(today_sessions)
+
+        # The sweeps above update today_sessions in place
+        registered = register_session_triggers(today, today_sessions)
+        print(f"✅ Reconciled sessions for {today}: {registered} trigger(s) registered")
+        return registered
+
+    except Exception as e:
+        print(f"❌ Error reconciling sessions: {str(e)}")
+        job_metrics.mark_failed(e)
+
+# Jobs runnable through job_with_context, by name
+SCHEDULED_JOBS = {
+    'generate_daily_sessions': generate_daily_sessions_job,
+    'generate_horizon_sessions': generate_horizon_sessions_job,
+    'reconcile_sessions': reconcile_sessions_job,
+    'catch_up_missed_runs': catch_up_missed_runs,
+    'session_transition': run_session_transition
+}
 
 def flatten_sessions(all_sessions):
     """Convert structure to flat list of sessions"""
@@ -519,13 +1059,7 @@ def flatten_sessions(all_sessions):
             continue
 
         for room_id, room_sessions in rooms_data.items():
-            if not isinstance(room_sessions, list):
-                continue
-
-            for session in room_sessions:
-                if not isinstance(session, dict):
-                    continue
-
+            for session in iter_room_sessions(room_sessions):
                 session_with_date = {
                     **session,
                     'date': session.get('date', date)
@@ -535,51 +1069,96 @@ def flatten_sessions(all_sessions):
 
     return flat_sessions
 
-# ================ API ENDPOINTS ================
-@sessions_bp.route('/api/sessions', methods=['GET'])
-def get_sessions():
-    """Get all sessions with optional filters"""
-    try:
-        date = request.args.get('date')
-        room = request.args.get('room')
-        status = request.args.get('status')
-        group = request.args.get('group')
-        subject = request.args.get('subject')
-
-        all_sessions = firebase.get_all('sessions') or {}
-        flat_sessions = flatten_sessions(all_sessions)
-        filtered_sessions = []
-
-        for session in flat_sessions:
-            if date and session.get('date') != date:
-                continue
-
-            if room and session.get('room') != room:
-                continue
-
-            if status and session.get('status') != status:
-                continue
+def session_sort_key(session):
+    """Listing order (newest first when reversed): date, start, then ID"""
+    return (session.get('date', ''), session.get('start', ''), session.get('session_id', ''))
+
+def session_matches(session, filters):
+    """Check a session against the query string filters of GET /api/sessions"""
+    return all(not value or session.get(field) == value for field, value in filters.items())
+
+def enhance_session(session):
+    """Add room and subject display fields to a session"""
+    room_data = firebase.get_one('rooms', session.get('room')) or {}
+    subject_data = firebase.get_one('subjects', session.get('subject')) or {}
+    return {
+        **session,
+        'room_name': room_data.get('name', session.get('room')),
+        'room_active': room_data.get('active', False),
+        'subject_name': subject_data.get('name', session.get('subject'))
+    }
+
+def get_sessions_page(filters, limit, after=None):
+    """One page of sessions, newest first, reading one date node at a time
+
+    ``after`` is the (date, start, session_id) position of the previous
+    page's last session; dates after it are never read again. A one-item
+    position ``[date]`` resumes before that date: it is returned when
+    MAX_PAGE_SCAN_DAYS date nodes were read without filling the page.
+    """
+    date = filters.get('date')
+    if date or not after:
+        day_bound = date
+    else:
+        day_bound = key_before(after[0]) if len(after) == 1 else after[0]
+    matched = []
+    resume = None
+    days_read = 0
+
+    while len(matched) <= limit:
+        if days_read >= MAX_PAGE_SCAN_DAYS:
+            # Reading the next date node is the page's cost: stop before it,
+            # the next page resumes before the last date read (and may be empty)
+            resume = [day]
+            break
+        if date:
+            day, rooms_data = date, firebase.get_all(f'sessions/{date}')
+        else:
+            # Latest date node at or before the bound
+            chunk = firebase.get_range('sessions', end=day_bound, limit_last=1)
+            if not chunk:
+                break
+            day, rooms_data = next(iter(chunk.items()))
 
-            if group and session.get('group') != group:
+        day_sessions = sorted(flatten_sessions({day: rooms_data}), key=session_sort_key, reverse=True)
+        for session in day_sessions:
+            if after and list(session_sort_key(session)) >= after:
                 continue
+            if session_matches(session, filters):
+                matched.append(session)
+        days_read += 1
 
-            if subject and session.get('subject') != subject:
-                continue
+        if date:
+            break
+        day_bound = key_before(day)
 
-            # Get room info
-            room_data = firebase.get_one('rooms', session.get('room')) or {}
+    result = page_response(matched, limit, lambda session: list(session_sort_key(session)), resume)
+    result['data'] = [enhance_session(session) for session in result['data']]
+    return result
 
-            # Get subject info
-            subject_data = firebase.get_one('subjects', session.get('subject')) or {}
+# ================ API ENDPOINTS ================
+@sessions_bp.route('/api/sessions', methods=['GET'])
+def get_sessions():
+    """Get all sessions with optional filters (paginated when limit or cursor is given)"""
+    try:
+        filters = {
+            field: request.args.get(field)
+            for field in ('date', 'room', 'status', 'group', 'subject')
+        }
 
-            enhanced_session = {
-                **session,
-                'room_name': room_data.get('name', session.get('room')),
-                'room_active': room_data.get('active', False),
-                'subject_name': subject_data.get('name', session.get('subject'))
-            }
+        try:
+            paging = page_args(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if paging:
+            return jsonify({'success': True, **get_sessions_page(filters, *paging)})
 
-            filtered_sessions.append(enhanced_session)
+        all_sessions = firebase.get_all('sessions') or {}
+        flat_sessions = flatten_sessions(all_sessions)
+        filtered_sessions = [
+            enhance_session(session) for session in flat_sessions
+            if session_matches(session, filters)
+        ]
 
         # Sort by date and start time
         filtered_sessions.sort(key=lambda x: (
@@ -610,13 +1189,7 @@ def get_today_sessions():
             today_date_sessions = all_sessions[today]
             if isinstance(today_date_sessions, dict):
                 for room_id, room_sessions in today_date_sessions.items():
-                    if not isinstance(room_sessions, list):
-                        continue
-                    
-                    for session in room_sessions:
-                        if not isinstance(session, dict):
-                            continue
-                        
+                    for session in iter_room_sessions(room_sessions):
                         # Get room info
                         room_data = firebase.get_one('rooms', room_id) or {}
                        
@@ -646,77 +1219,47 @@ def get_today_sessions():
 
 @sessions_bp.route('/api/sessions/generate', methods=['POST'])
 def generate_sessions():
-    """Manually generate sessions for a specific date (backup if scheduler fails)"""
+    """Manually generate sessions for a specific date (backup if scheduler fails)
+
+    With ``days`` set, generates the whole horizon starting at ``date``;
+    ``exclude`` lists extra comma-separated dates to skip besides holidays.
+    """
     try:
         date_str = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
-        day_of_week = get_day_of_week(date_str).lower()
-       
-        schedule = firebase.get_all('schedule') or {}
-        sessions_created = 0
-       
-        for room_id, room_schedule in schedule.items():
-            if day_of_week in room_schedule:
-                day_sessions = room_schedule[day_of_week]
-               
-                if isinstance(day_sessions, list):
-                    for session_data in day_sessions:
-                        if isinstance(session_data, dict):
-                            # Generate session ID
-                            session_id = generate_session_id(
-                                date_str,
-                                room_id,
-                                session_data.get('start', ''),
-                                session_data.get('group', '')
-                            )
-                           
-                            # Check if already exists
-                            existing_session = get_session_by_id(session_id)
-                            if existing_session:
-                                # Update if needed - only if date doesn't match (carryover from previous day)
-                                if existing_session.get('date') != date_str:
-                                    existing_session['date'] = date_str
-                                    existing_session['status'] = 'SCHEDULED'
-                                    existing_session['updated_at'] = datetime.now().isoformat()
-                                    if update_session(existing_session):
-                                        sessions_created += 1
-                                        print(f" 🔄 Updated session date: {session_id}")
-                                continue
-                           
-                            # Create session
-                            session_entry = {
-                                'session_id': session_id,
-                                'date': date_str,
-                                'room': room_id,
-                                'start': session_data.get('start', ''),
-                                'end': session_data.get('end', ''),
-                                'group': session_data.get('group', ''),
-                                'subject': session_data.get('subject', ''),
-                                'status': 'SCHEDULED',
-                                'created_at': datetime.now().isoformat(),
-                                'manually_created': True,
-                                'auto_created': False,
-                                'auto_closed': False,
-                                'closed_at': None
-                            }
-                           
-                            # Get room info
-                            room_info = firebase.get_one('rooms', room_id) or {}
-                            if room_info:
-                                session_entry['room_name'] = room_info.get('name', room_id)
-                           
-                            # Get subject info
-                            subject_info = firebase.get_one('subjects', session_data.get('subject', '')) or {}
-                            if subject_info:
-                                session_entry['subject_name'] = subject_info.get('name', session_data.get('subject', ''))
-                           
-                            if create_session(session_entry):
-                                sessions_created += 1
+        days = request.args.get('days')
+        if days is not None:
+            days = int(days) if days.isdigit() else 0
+            if not 1 <= days <= SESSION_HORIZON_DAYS:
+                return jsonify({
+                    'success': False,
+                    'error': f'days must be an integer between 1 and {SESSION_HORIZON_DAYS}'
+                }), 400
+
+        if days:
+            exclude = [d for d in request.args.get('exclude', '').split(',') if d]
+            report = generate_sessions_horizon(date_str, days, exclude, manual=True)
+            sessions_created = report['created'] + report['reactivated']
+
+            return jsonify({
+                'success': True,
+                'message': f'{sessions_created} sessions created/updated over {days} days',
+                'date': date_str,
+                'days': days,
+                'sessions_created': sessions_created,
+                **report
+            })
+
+        report = generate_sessions_for_date(date_str, manual=True)
+        sessions_created = report['created'] + report['reactivated']
        
         return jsonify({
             'success': True,
             'message': f'{sessions_created} sessions created/updated',
             'date': date_str,
-            'sessions_created': sessions_created
+            'sessions_created': sessions_created,
+            'created': report['created'],
+            'reactivated': report['reactivated'],
+            'skipped': report['skipped']
         })
     except Exception as e:
         print(f"Error in generate_sessions endpoint: {e}")
@@ -767,14 +1310,7 @@ def get_sessions_by_room(room_id):
             if not isinstance(rooms, dict) or room_id not in rooms:
                 continue
            
-            room_sessions = rooms[room_id]
-            if not isinstance(room_sessions, list):
-                continue
-           
-            for session in room_sessions:
-                if not isinstance(session, dict):
-                    continue
-               
+            for session in iter_room_sessions(rooms[room_id]):
                 # Get room info
                 room_data = firebase.get_one('rooms', room_id) or {}
                
@@ -818,17 +1354,20 @@ def update_session_status(session_id):
         if not session:
             return jsonify({'success': False, 'error': 'Session not found'}), 404
         
-        # Update session
-        updated_session = {**session, **data}
+        # Only the changed fields are written
+        changes = dict(data)
         
         # Add timestamp for certain actions
         if data.get('status') == 'ACTIVE' and 'started_at' not in session:
-            updated_session['started_at'] = datetime.now().isoformat()
-        elif data.get('status') == 'CLOSED' and 'closed_at' not in session:
-            updated_session['closed_at'] = datetime.now().isoformat()
-            updated_session['auto_closed'] = False
+            changes['started_at'] = datetime.now().isoformat()
+        elif data.get('status') == 'CLOSED' and not session.get('closed_at'):
+            changes['closed_at'] = datetime.now().isoformat()
+            changes['auto_closed'] = False
+        
+        updated_session = {**session, **changes}
         
-        if update_session(updated_session):
+        if update_session_fields(session, changes):
+            schedule_session_triggers(updated_session)
             return jsonify({
                 'success': True,
                 'message': 'Session updated',
@@ -846,6 +1385,7 @@ def delete_session(session_id):
     """Delete a session"""
     try:
         if delete_session_by_id(session_id):
+            unschedule_session_triggers(session_id)
             return jsonify({
                 'success': True,
                 'message': 'Session deleted successfully'
@@ -913,6 +1453,7 @@ def create_session_manual():
             session_entry['subject_name'] = subject_info.get('name', data['subject'])
         
         if create_session(session_entry):
+            schedule_session_triggers(session_entry)
             return jsonify({
                 'success': True,
                 'message': 'Session created successfully',
@@ -943,6 +1484,10 @@ def bulk_update_sessions():
             return jsonify({'success': False, 'error': 'Sessions must be a list'}), 400
         
         updated_count = 0
+        updates = {}
+        updated_sessions = []
+        # Read once if any session is activated (rosters)
+        students = None
         
         for session_data in sessions_to_update:
             session_id = session_data.get('session_id')
@@ -954,10 +1499,20 @@ def bulk_update_sessions():
             if not existing_session:
                 continue
             
-            # Update session
-            updated_session = {**existing_session, **session_data}
-            if update_session(updated_session):
-                updated_count += 1
+            # Collect only the changed fields, with the roster / index copy
+            # that update_session_fields would write for the same transition
+            if session_data.get('status') == 'ACTIVE' and students is None:
+                students = get_students_by_id()
+            updates.update(session_transition_updates(existing_session, session_data, students))
+            updated_sessions.append({**existing_session, **session_data})
+            updated_count += 1
+        
+        # One multi-path write for the whole batch
+        if not commit_session_updates(updates):
+            return jsonify({'success': False, 'error': 'Failed to update sessions'}), 500
+        
+        for updated_session in updated_sessions:
+            schedule_session_triggers(updated_session)
         
         return jsonify({
             'success': True,
@@ -969,27 +1524,41 @@ def bulk_update_sessions():
         print(f"Error in bulk_update_sessions endpoint: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@sessions_bp.route('/api/sessions/migrate', methods=['POST'])
+def migrate_sessions():
+    """Migrate sessions stored as per-room lists to the keyed layout"""
+    try:
+        date = request.args.get('date')
+        migrated = migrate_sessions_layout(date)
+        return jsonify({
+            'success': True,
+            'message': f'{migrated} room session list(s) migrated',
+            'migrated_rooms': migrated
+        })
+    except Exception as e:
+        print(f"Error in migrate_sessions endpoint: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Scheduler endpoints
 @sessions_bp.route('/api/scheduler/status', methods=['GET'])
 def get_scheduler_status():
-    """Check scheduler status"""
+    """Check scheduler status (followers report the leader's last heartbeat)"""
     try:
         global scheduler
+        lease = leader_lease.describe() if leader_lease else None
         if scheduler:
-            jobs = []
-            for job in scheduler.get_jobs():
-                jobs.append({
-                    'id': job.id,
-                    'name': job.name,
-                    'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
-                    'trigger': str(job.trigger)
-                })
-           
             return jsonify({
                 'success': True,
-                'running': scheduler.running,
-                'jobs': jobs,
-                'jobs_count': len(jobs)
+                **scheduler_snapshot(),
+                'lease': lease
+            })
+        elif leader_lease:
+            leader = leader_lease.read_status()
+            return jsonify({
+                'success': leader is not None,
+                'running': bool(leader and not leader['stale'] and (leader.get('scheduler') or {}).get('running')),
+                'lease': lease,
+                'leader': leader
             })
         else:
             return jsonify({
@@ -1031,27 +1600,33 @@ def test_scheduler():
 
 @sessions_bp.route('/api/scheduler/jobs', methods=['GET'])
 def get_scheduler_jobs():
-    """Get detailed info about all scheduler jobs"""
+    """Get detailed info about all scheduler jobs, with their execution metrics"""
     try:
         global scheduler
         if not scheduler:
-            return jsonify({'success': False, 'error': 'Scheduler not initialized'})
+            leader = leader_lease.read_status() if leader_lease else None
+            if not leader or not leader.get('scheduler'):
+                return jsonify({'success': False, 'error': 'Scheduler not initialized'})
+            # Follower: report the leader's last published jobs and metrics
+            snapshot = leader['scheduler']
+            return jsonify({
+                'success': True,
+                'jobs': snapshot.get('jobs', []),
+                'total_jobs': snapshot.get('jobs_count', 0),
+                'metrics': snapshot.get('metrics', {}),
+                'leader_pid': leader.get('pid'),
+                'stale': leader.get('stale')
+            })
        
-        jobs = []
-        for job in scheduler.get_jobs():
-            job_info = {
-                'id': job.id,
-                'name': job.name,
-                'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
-                'trigger': str(job.trigger),
-                'pending': job.pending
-            }
-            jobs.append(job_info)
+        snapshot = scheduler_snapshot()
+        pending = {job.id: job.pending for job in scheduler.get_jobs()}
+        jobs = [{**job_info, 'pending': pending.get(job_info['id'])} for job_info in snapshot['jobs']]
        
         return jsonify({
             'success': True,
             'jobs': jobs,
-            'total_jobs': len(jobs)
+            'total_jobs': len(jobs),
+            'metrics': snapshot['metrics']
         })
     except Exception as e:
         print(f"Error in get_scheduler_jobs endpoint: {e}")
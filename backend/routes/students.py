@@ -1,64 +1,37 @@
 # routes/students.py
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+import csv
+import io
+import json
 from firebase_config import firebase
-from utils import get_next_session_id
+from utils import (get_next_session_id, get_student_by_fingerprint, is_fingerprint_taken,
+                   fingerprint_index, fingerprint_ids, student_ids, group_members)
+from services.pagination import page_args, page_response
+from routes.devices import invalidate_group_rosters
 
 students_bp = Blueprint('students', __name__)
 
-def get_student_by_fingerprint(fingerprint_id):
-    """Get student by fingerprint ID, returns (student_id, student_data)"""
-    try:
-        # Get all students as a dictionary
-        students = firebase.get_all('students')
-        if not students:
-            return None, None
-            
-        # If students is a list (old structure), handle it
-        if isinstance(students, list):
-            for idx, student_data in enumerate(students):
-                if isinstance(student_data, dict) and student_data.get('fingerprint_id') == fingerprint_id:
-                    return f"S{idx+1}", student_data
-        # If students is a dict (new structure with S1, S2 keys)
-        elif isinstance(students, dict):
-            for student_id, student_data in students.items():
-                if isinstance(student_data, dict) and student_data.get('fingerprint_id') == fingerprint_id:
-                    return student_id, student_data
-        
-        return None, None
-    except Exception as e:
-        print(f"Error in get_student_by_fingerprint: {e}")
-        return None, None
+# Students written per multi-path update by the bulk import
+BULK_CHUNK_SIZE = 1000
+# Allocated fingerprint IDs skipped (already in use) before giving up
+MAX_FINGERPRINT_ALLOCATION_ATTEMPTS = 100
 
 def generate_student_id():
-    """Generate next student ID (S1, S2, etc.)"""
-    try:
-        students = firebase.get_all('students')
-        if not students:
-            return "S1"
-        
-        # If students is a list
-        if isinstance(students, list):
-            return f"S{len(students) + 1}"
-        
-        # If students is a dict
-        existing_ids = []
-        for student_id in students.keys():
-            if student_id.startswith('S'):
-                try:
-                    num = int(student_id[1:])
-                    existing_ids.append(num)
-                except ValueError:
-                    continue
-        
-        if not existing_ids:
-            return "S1"
-        
-        next_num = max(existing_ids) + 1
-        return f"S{next_num}"
-    except Exception as e:
-        print(f"Error generating student ID: {e}")
-        return "S1"
+    """Generate next student ID (S1, S2, etc.) from the student_id counter"""
+    return f"S{student_ids.next()}"
+
+def allocate_fingerprint_id():
+    """Next free fingerprint ID from the counter
+
+    IDs below the counter can already be taken (legacy data, manual IDs):
+    those are skipped instead of failing the request.
+    """
+    for _ in range(MAX_FINGERPRINT_ALLOCATION_ATTEMPTS):
+        fingerprint_id = get_next_session_id()
+        if not is_fingerprint_taken(fingerprint_id):
+            return fingerprint_id
+    raise RuntimeError('No free fingerprint ID found')
 
 def get_student_data():
     """Get students data, handling both list and dict structures"""
@@ -71,10 +44,61 @@ def get_student_data():
         print(f"Error getting student data: {e}")
         return {}
 
+def save_student_update(student_id, current_data, update_data):
+    """Write changed student fields and move its index entries, atomically"""
+    try:
+        old_fingerprint_id = current_data.get('fingerprint_id')
+        new_fingerprint_id = update_data.get('fingerprint_id', old_fingerprint_id)
+        old_group = current_data.get('group')
+        
+        updates = {f'students/{student_id}/{field}': value for field, value in update_data.items()}
+        updates.update(fingerprint_index.entry_updates(student_id, old_fingerprint_id, new_fingerprint_id))
+        updates.update(group_members.entry_updates(student_id, old_group, update_data.get('group', old_group)))
+        
+        firebase.update_at_path('/', updates)
+        fingerprint_index.apply(student_id, old_fingerprint_id, new_fingerprint_id)
+        invalidate_group_rosters(old_group, update_data.get('group', old_group))
+        return True
+    except Exception as e:
+        print(f"Error saving student update: {e}")
+        return False
+
+def delete_student_record(student_id, student_data):
+    """Delete a student and its index entries in one write"""
+    fingerprint_id = student_data.get('fingerprint_id')
+    owns_entry = fingerprint_id not in (None, '') and fingerprint_index.refresh(fingerprint_id) == student_id
+    updates = {f'students/{student_id}': None}
+    updates.update(group_members.entry_updates(student_id, student_data.get('group'), None))
+    if owns_entry:
+        updates.update(fingerprint_index.entry_updates(student_id, fingerprint_id, None))
+    firebase.update_at_path('/', updates)
+    if owns_entry:
+        fingerprint_index.apply(student_id, fingerprint_id, None)
+    invalidate_group_rosters(student_data.get('group'))
+
+def get_students_page(limit, after=None):
+    """One page of students ordered by ID, reading only limit + 1 of them"""
+    after_id = after[0] if after else None
+    # start_at is inclusive: ask for one more and drop the cursor's own student
+    chunk = firebase.get_range('students', start=after_id, limit_first=limit + (2 if after_id else 1))
+    students_list = [
+        {**student_data, 'id': student_id}
+        for student_id, student_data in chunk.items()
+        if student_id != after_id and isinstance(student_data, dict)
+    ]
+    return page_response(students_list, limit, lambda student: [student['id']])
+
 @students_bp.route('/api/students', methods=['GET'])
 def get_students():
-    """Get all students"""
+    """Get all students (paginated when limit or cursor is given)"""
     try:
+        try:
+            paging = page_args(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if paging:
+            return jsonify({'success': True, **get_students_page(*paging)})
+        
         students = get_student_data()
         
         # Convert to list format
@@ -118,20 +142,16 @@ def create_student():
         fingerprint_id = data.get('fingerprint_id')
         if not fingerprint_id:
             # Generate new fingerprint_id
-            fingerprint_id = get_next_session_id()
+            fingerprint_id = allocate_fingerprint_id()
         else:
             fingerprint_id = int(fingerprint_id)
-        
-        # Check if fingerprint_id already exists
-        students = get_student_data()
-        if isinstance(students, list):
-            for student_data in students:
-                if isinstance(student_data, dict) and student_data.get('fingerprint_id') == fingerprint_id:
-                    return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
-        elif isinstance(students, dict):
-            for student_data in students.values():
-                if isinstance(student_data, dict) and student_data.get('fingerprint_id') == fingerprint_id:
-                    return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
+            
+            # Check if fingerprint_id already exists (index lookup)
+            if is_fingerprint_taken(fingerprint_id):
+                return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
+            
+            # Keep the counter ahead of manually chosen IDs
+            fingerprint_ids.observe(fingerprint_id)
         
         # Generate student ID
         student_id = generate_student_id()
@@ -146,12 +166,14 @@ def create_student():
             'updated_at': datetime.now().isoformat()
         }
         
-        # Add to students collection
-        # The create method will handle the key (student_id)
-        created_key = firebase.create('students', student_data, student_id)
-        
-        if not created_key:
-            return jsonify({'success': False, 'error': 'Failed to create student'}), 500
+        # Student and its index entries in one multi-path write
+        firebase.update_at_path('/', {
+            f'students/{student_id}': student_data,
+            **fingerprint_index.entry_updates(student_id, None, fingerprint_id),
+            **group_members.entry_updates(student_id, None, student_data['group'])
+        })
+        fingerprint_index.apply(student_id, None, fingerprint_id)
+        invalidate_group_rosters(student_data['group'])
         
         # Add ID to response data
         student_data['id'] = student_id
@@ -231,23 +253,15 @@ def update_student(fingerprint_id):
         if 'fingerprint_id' in data and data['fingerprint_id'] != fingerprint_id:
             new_fingerprint_id = int(data['fingerprint_id'])
             # Check if new fingerprint_id already exists (excluding current student)
-            all_students = get_student_data()
-            if isinstance(all_students, list):
-                for idx, sdata in enumerate(all_students):
-                    if isinstance(sdata, dict) and sdata.get('fingerprint_id') == new_fingerprint_id and f"S{idx+1}" != student_id:
-                        return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
-            elif isinstance(all_students, dict):
-                for sid, sdata in all_students.items():
-                    if isinstance(sdata, dict) and sdata.get('fingerprint_id') == new_fingerprint_id and sid != student_id:
-                        return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
+            if is_fingerprint_taken(new_fingerprint_id, student_id):
+                return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
+            fingerprint_ids.observe(new_fingerprint_id)
             update_data['fingerprint_id'] = new_fingerprint_id
         
         update_data['updated_at'] = datetime.now().isoformat()
         
         # Update in Firebase using student_id (S1, S2, etc.)
-        success = firebase.update('students', student_id, update_data)
-        
-        if not success:
+        if not save_student_update(student_id, student_data, update_data):
             return jsonify({'success': False, 'error': 'Failed to update student'}), 500
         
         # Get updated student
@@ -293,23 +307,15 @@ def update_student_by_id(student_id):
         if 'fingerprint_id' in data and data['fingerprint_id'] != current_fingerprint_id:
             new_fingerprint_id = int(data['fingerprint_id'])
             # Check if new fingerprint_id already exists (excluding current student)
-            all_students = get_student_data()
-            if isinstance(all_students, list):
-                for idx, sdata in enumerate(all_students):
-                    if isinstance(sdata, dict) and sdata.get('fingerprint_id') == new_fingerprint_id and f"S{idx+1}" != student_id:
-                        return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
-            elif isinstance(all_students, dict):
-                for sid, sdata in all_students.items():
-                    if isinstance(sdata, dict) and sdata.get('fingerprint_id') == new_fingerprint_id and sid != student_id:
-                        return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
+            if is_fingerprint_taken(new_fingerprint_id, student_id):
+                return jsonify({'success': False, 'error': 'Fingerprint ID already exists'}), 400
+            fingerprint_ids.observe(new_fingerprint_id)
             update_data['fingerprint_id'] = new_fingerprint_id
         
         update_data['updated_at'] = datetime.now().isoformat()
         
         # Update in Firebase
-        success = firebase.update('students', student_id, update_data)
-        
-        if not success:
+        if not save_student_update(student_id, student_data, update_data):
             return jsonify({'success': False, 'error': 'Failed to update student'}), 500
         
         # Get updated student
@@ -335,7 +341,7 @@ def delete_student(fingerprint_id):
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
         # Delete from Firebase using student_id
-        firebase.delete('students', student_id)
+        delete_student_record(student_id, student_data)
         
         return jsonify({
             'success': True,
@@ -355,7 +361,7 @@ def delete_student_by_id(student_id):
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
         # Delete from Firebase
-        firebase.delete('students', student_id)
+        delete_student_record(student_id, student_data)
         
         return jsonify({
             'success': True,
@@ -446,4 +452,237 @@ def get_student_by_fingerprint_api(fingerprint_id):
             'message': 'Student found'
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@students_bp.route('/api/students/fingerprint-index/rebuild', methods=['POST'])
+def rebuild_fingerprint_index():
+    """Rebuild the fingerprint_id -> student_id index from the students collection"""
+    try:
+        result = fingerprint_index.rebuild()
+        return jsonify({
+            'success': True,
+            'message': f"Fingerprint index rebuilt ({result['entries']} entries)",
+            **result
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def parse_bulk_rows(raw, fmt):
+    """Parse a CSV or JSON lines payload into a list of (row_number, dict|error)
+
+    A JSON array body is parsed as a whole: if it is malformed, ValueError is
+    raised (JSON lines report errors per line instead).
+    """
+    rows = []
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(raw))
+        for row_number, row in enumerate(reader, start=2):  # line 1 is the header
+            rows.append((row_number, {
+                (key or '').strip().lower(): (value or '').strip()
+                for key, value in row.items() if key
+            }))
+        return rows
+    
+    if fmt == 'json' and raw.lstrip().startswith('['):
+        items = json.loads(raw)
+        return [(idx, item) for idx, item in enumerate(items, start=1)]
+    
+    for row_number, line in enumerate(raw.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append((row_number, json.loads(line)))
+        except ValueError as e:
+            rows.append((row_number, f'Invalid JSON: {e}'))
+    return rows
+
+def row_ranges(row_numbers):
+    """Collapse row numbers into [first, last] ranges of consecutive rows"""
+    ranges = []
+    for row_number in sorted(row_numbers):
+        if ranges and row_number == ranges[-1][1] + 1:
+            ranges[-1][1] = row_number
+        else:
+            ranges.append([row_number, row_number])
+    return ranges
+
+def parse_active(value):
+    if isinstance(value, bool):
+        return value
+    if value in (None, ''):
+        return True
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'oui')
+
+def validate_bulk_rows(rows, groups, taken_fingerprints):
+    """Validate rows in memory; returns (valid_rows, errors)"""
+    valid = []
+    errors = []
+    seen_fingerprints = {}
+    
+    for row_number, row in rows:
+        if not isinstance(row, dict):
+            errors.append({'row': row_number, 'error': row if isinstance(row, str) else 'Row must be an object'})
+            continue
+        
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors.append({'row': row_number, 'error': 'Name is required'})
+            continue
+        
+        group = str(row.get('group') or '').strip()
+        if group and group not in groups:
+            errors.append({'row': row_number, 'error': f'Group not found: {group}'})
+            continue
+        
+        fingerprint_id = row.get('fingerprint_id')
+        if fingerprint_id not in (None, ''):
+            try:
+                fingerprint_id = int(fingerprint_id)
+            except (TypeError, ValueError):
+                errors.append({'row': row_number, 'error': f'Invalid fingerprint_id: {fingerprint_id}'})
+                continue
+            if str(fingerprint_id) in taken_fingerprints:
+                errors.append({'row': row_number, 'error': f'Fingerprint ID already exists: {fingerprint_id}'})
+                continue
+            if fingerprint_id in seen_fingerprints:
+                errors.append({
+                    'row': row_number,
+                    'error': f'Duplicate fingerprint_id {fingerprint_id} (also on row {seen_fingerprints[fingerprint_id]})'
+                })
+                continue
+            seen_fingerprints[fingerprint_id] = row_number
+        else:
+            fingerprint_id = None
+        
+        valid.append((row_number, {
+            'name': name,
+            'fingerprint_id': fingerprint_id,
+            'group': group,
+            'email': str(row.get('email') or '').strip(),
+            'phone': str(row.get('phone') or '').strip(),
+            'active': parse_active(row.get('active'))
+        }))
+    
+    return valid, errors
+
+@students_bp.route('/api/students/bulk', methods=['POST'])
+def bulk_import_students():
+    """Import many students from CSV or JSON lines
+
+    Body: raw CSV/JSON lines, or a multipart ``file``. Format from ``format``
+    (csv|jsonl|json) or the content type. ``dry_run=true`` only validates.
+    """
+    try:
+        upload = request.files.get('file')
+        raw = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+        if not raw or not raw.strip():
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+        
+        fmt = request.args.get('format', '').lower()
+        if not fmt:
+            content_type = (upload.content_type if upload else request.content_type) or ''
+            filename = (upload.filename if upload else '') or ''
+            if 'csv' in content_type or filename.lower().endswith('.csv'):
+                fmt = 'csv'
+            elif content_type.startswith('application/json'):
+                fmt = 'json'
+            else:
+                fmt = 'jsonl'
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        
+        try:
+            rows = parse_bulk_rows(raw, fmt)
+        except (ValueError, csv.Error) as e:
+            return jsonify({'success': False, 'error': f'Invalid {fmt.upper()} payload: {e}'}), 400
+        
+        # One read each for the reference data, then validation in memory
+        groups = firebase.get_all('groups') or {}
+        taken_fingerprints = fingerprint_index.reload()
+        valid, errors = validate_bulk_rows(rows, groups, taken_fingerprints)
+        
+        if dry_run or not valid:
+            return jsonify({
+                'success': bool(valid),
+                'dry_run': dry_run,
+                'total_rows': len(rows),
+                'valid': len(valid),
+                'created': 0,
+                'failed': len(errors),
+                'errors': errors
+            }), 200 if valid else 400
+        
+        # Allocate IDs in blocks: one transaction per counter
+        first_student = student_ids.reserve(len(valid))
+        explicit = [student['fingerprint_id'] for _, student in valid if student['fingerprint_id'] is not None]
+        if explicit:
+            fingerprint_ids.observe(max(explicit))
+        missing_fingerprints = len(valid) - len(explicit)
+        fingerprint_pool = []
+        while len(fingerprint_pool) < missing_fingerprints:
+            needed = missing_fingerprints - len(fingerprint_pool)
+            first = fingerprint_ids.reserve(needed)
+            # Skip numbers already assigned outside the counter
+            fingerprint_pool.extend(
+                number for number in range(first, first + needed)
+                if str(number) not in taken_fingerprints
+            )
+        fingerprint_pool.reverse()
+        
+        now = datetime.now().isoformat()
+        created = []
+        updates = {}
+        chunks = []
+        for offset, (row_number, student) in enumerate(valid):
+            student_id = f"S{first_student + offset}"
+            if student['fingerprint_id'] is None:
+                student['fingerprint_id'] = fingerprint_pool.pop()
+            
+            student['updated_at'] = now
+            updates[f'students/{student_id}'] = student
+            updates.update(fingerprint_index.entry_updates(student_id, None, student['fingerprint_id']))
+            updates.update(group_members.entry_updates(student_id, None, student['group']))
+            created.append({'row': row_number, 'id': student_id, 'fingerprint_id': student['fingerprint_id']})
+            
+            # Commit in chunks of multi-path updates
+            if len(created) % BULK_CHUNK_SIZE == 0 or offset == len(valid) - 1:
+                chunks.append((created[len(chunks) * BULK_CHUNK_SIZE:], updates))
+                updates = {}
+        
+        committed = []
+        for chunk, chunk_updates in chunks:
+            try:
+                firebase.update_at_path('/', chunk_updates)
+            except Exception as e:
+                # Earlier chunks are written: report exactly which rows made it
+                for student in committed:
+                    fingerprint_index.apply(student['id'], None, student['fingerprint_id'])
+                invalidate_group_rosters(*{student['group'] for _, student in valid})
+                return jsonify({
+                    'success': False,
+                    'error': f'Write failed after {len(committed)} of {len(created)} students: {e}',
+                    'total_rows': len(rows),
+                    'created': len(committed),
+                    'committed_rows': row_ranges(student['row'] for student in committed),
+                    'failed_rows': row_ranges(student['row'] for student in created[len(committed):]),
+                    'failed': len(errors),
+                    'errors': errors,
+                    'students': committed
+                }), 500
+            committed.extend(chunk)
+        
+        for student in created:
+            fingerprint_index.apply(student['id'], None, student['fingerprint_id'])
+        invalidate_group_rosters(*{student['group'] for _, student in valid})
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(created)} students imported',
+            'total_rows': len(rows),
+            'created': len(created),
+            'failed': len(errors),
+            'errors': errors,
+            'students': created
+        }), 201
+    except Exception as e:
+        print(f"Error in bulk_import_students endpoint: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
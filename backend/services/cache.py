@@ -0,0 +1,98 @@
+# services/cache.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Cache LRU borné en taille avec expiration (TTL) des entrées
+
+    Les clés sont des chemins Firebase normalisés ("rooms", "rooms/roomA").
+    Les valeurs sont copiées à l'entrée et à la sortie pour que l'appelant
+    puisse modifier le résultat sans corrompre le cache.
+    """
+
+    def __init__(self, ttl=300, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Retourne (trouvé, valeur)
+
+        Une clé absente peut être servie depuis un ancêtre en cache:
+        "rooms/roomA" est lu dans l'entrée "rooms" si elle existe.
+        """
+        with self.lock:
+            segments = key.split('/')
+            now = time.monotonic()
+            for depth in range(len(segments), 0, -1):
+                candidate = '/'.join(segments[:depth])
+                entry = self.entries.get(candidate)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    del self.entries[candidate]
+                    continue
+
+                self.entries.move_to_end(candidate)
+                self.hits += 1
+                return True, copy.deepcopy(self._walk(entry[1], segments[depth:]))
+
+            self.misses += 1
+            return False, None
+
+    @staticmethod
+    def _walk(node, segments):
+        for segment in segments:
+            if isinstance(node, dict):
+                node = node.get(segment)
+            elif isinstance(node, list) and segment.isdigit() and int(segment) < len(node):
+                node = node[int(segment)]
+            else:
+                return None
+        return node
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, path):
+        """Invalider path, ses descendants et ses ancêtres"""
+        with self.lock:
+            stale = [
+                key for key in self.entries
+                if not path or key == path or key.startswith(path + '/') or path.startswith(key + '/')
+            ]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl
+            }
@@ -0,0 +1,83 @@
+# services/counters.py
+import threading
+
+COUNTERS_PATH = 'counters'
+
+
+class IdAllocator:
+    """Allocateur d'identifiants numériques adossé à ``counters/<name>``
+
+    Le compteur contient le dernier identifiant attribué et n'avance que par
+    transaction: deux workers ne reçoivent jamais le même numéro. Chaque
+    processus réserve des blocs de ``block_size`` numéros pour ne faire
+    qu'une transaction par bloc; ``reserve(n)`` réserve une plage entière
+    (imports en masse).
+
+    ``seed`` calcule la valeur de départ quand le compteur n'existe pas encore
+    (un seul parcours de la collection, à la première utilisation).
+    """
+
+    def __init__(self, firebase, name, seed=None, block_size=1):
+        self.firebase = firebase
+        self.name = name
+        self.path = f"{COUNTERS_PATH}/{name}"
+        self.seed = seed
+        self.seeded = None
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.next_value = None
+        self.block_end = None
+
+    def _seed_value(self):
+        """Valeur de départ, calculée seulement quand le compteur n'existe pas
+        (une fois: la transaction peut rappeler sa fonction)"""
+        if self.seeded is None:
+            self.seeded = int(self.seed() or 0) if self.seed is not None else 0
+        return self.seeded
+
+    def _current(self, current):
+        return int(current) if current is not None else self._seed_value()
+
+    def reserve(self, count):
+        """Réserver ``count`` numéros consécutifs, renvoie le premier"""
+        if count < 1:
+            raise ValueError('count must be >= 1')
+
+        def advance(current):
+            return self._current(current) + count
+
+        last = self.firebase.transaction(self.path, advance)
+        return last - count + 1
+
+    def next(self):
+        """Numéro suivant, pris dans le bloc local (une transaction par bloc)"""
+        with self.lock:
+            if self.next_value is None or self.next_value > self.block_end:
+                first = self.reserve(self.block_size)
+                self.next_value, self.block_end = first, first + self.block_size - 1
+            value = self.next_value
+            self.next_value += 1
+            return value
+
+    def observe(self, value):
+        """Avancer le compteur au-delà d'un numéro choisi à la main"""
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return
+        def bump(current):
+            return max(self._current(current), value)
+
+        self.firebase.transaction(self.path, bump)
+        with self.lock:
+            if self.next_value is not None and self.next_value <= value <= self.block_end:
+                # Le bloc local chevauche le numéro pris: l'abandonner
+                self.next_value = self.block_end = None
+
+    def status(self):
+        with self.lock:
+            return {
+                'counter': self.firebase.get_at_path(self.path),
+                'block_size': self.block_size,
+                'next_in_block': self.next_value if self.next_value is not None and self.next_value <= self.block_end else None
+            }
@@ -0,0 +1,350 @@
+# services/indexes.py
+import threading
+
+from services.storage import KEY_PREFIX_END
+
+FINGERPRINT_INDEX_PATH = 'fingerprint_index'
+
+
+def index_items(data):
+    """Paires (clé, valeur) d'un noeud d'index (la RTDB renvoie une liste
+    quand les clés sont des entiers consécutifs)"""
+    if isinstance(data, dict):
+        return [(str(key), value) for key, value in data.items() if value is not None]
+    if isinstance(data, list):
+        return [(str(key), value) for key, value in enumerate(data) if value is not None]
+    return []
+
+
+class FingerprintIndex:
+    """Index fingerprint_id -> student_id
+
+    Stocké dans ``fingerprint_index/<fingerprint_id>`` et copié en mémoire.
+    Les écritures de l'index partent dans le même update multi-chemins que
+    l'étudiant (voir ``entry_updates``). La copie mémoire peut être en retard
+    sur un autre worker: une entrée absente est relue depuis le noeud, et
+    l'appelant appelle ``refresh`` s'il constate une entrée périmée.
+    """
+
+    def __init__(self, firebase):
+        self.firebase = firebase
+        self.lock = threading.Lock()
+        self.mapping = None
+
+    def _load(self):
+        with self.lock:
+            if self.mapping is not None:
+                return
+        self.reload()
+
+    def lookup(self, fingerprint_id):
+        """student_id associé à fingerprint_id (copie mémoire), ou None"""
+        self._load()
+        with self.lock:
+            student_id = self.mapping.get(str(fingerprint_id))
+        return student_id or self.refresh(fingerprint_id)
+
+    def refresh(self, fingerprint_id):
+        """Relire l'entrée depuis le noeud et mettre la copie mémoire à jour"""
+        student_id = self.firebase.get_at_path(f"{FINGERPRINT_INDEX_PATH}/{fingerprint_id}")
+        with self.lock:
+            if self.mapping is not None:
+                if student_id:
+                    self.mapping[str(fingerprint_id)] = student_id
+                else:
+                    self.mapping.pop(str(fingerprint_id), None)
+        return student_id
+
+    def reload(self):
+        """Relire tout le noeud (une lecture) et renvoyer une copie du mapping
+
+        Si le noeud n'existe pas encore alors que des étudiants existent,
+        l'index est reconstruit.
+        """
+        data = self.firebase.get_all(FINGERPRINT_INDEX_PATH)
+        if not data and self.firebase.get_all('students'):
+            print("⚠️ Index des empreintes absent, reconstruction...")
+            self.rebuild()
+        else:
+            with self.lock:
+                self.mapping = dict(index_items(data))
+        with self.lock:
+            return dict(self.mapping)
+
+    def entry_updates(self, student_id, old_fingerprint_id=None, new_fingerprint_id=None):
+        """Entrées multi-chemins (depuis la racine) pour déplacer une empreinte"""
+        # Construire l'index d'abord: une première entrée isolée empêcherait
+        # la reconstruction automatique
+        self._load()
+        updates = {}
+        if old_fingerprint_id not in (None, '') and str(old_fingerprint_id) != str(new_fingerprint_id):
+            updates[f"{FINGERPRINT_INDEX_PATH}/{old_fingerprint_id}"] = None
+        if new_fingerprint_id not in (None, ''):
+            updates[f"{FINGERPRINT_INDEX_PATH}/{new_fingerprint_id}"] = student_id
+        return updates
+
+    def apply(self, student_id, old_fingerprint_id=None, new_fingerprint_id=None):
+        """Répercuter en mémoire une écriture faite avec entry_updates"""
+        with self.lock:
+            if self.mapping is None:
+                return
+            if old_fingerprint_id not in (None, ''):
+                self.mapping.pop(str(old_fingerprint_id), None)
+            if new_fingerprint_id not in (None, ''):
+                self.mapping[str(new_fingerprint_id)] = student_id
+
+    def rebuild(self):
+        """Reconstruire l'index depuis students/ (une lecture, une écriture)"""
+        students = self.firebase.get_all('students')
+        if isinstance(students, list):
+            # Ancien format liste: les identifiants sont S1, S2...
+            students = {f"S{idx + 1}": student for idx, student in enumerate(students)}
+
+        mapping = {}
+        duplicates = []
+        for student_id, student in index_items(students):
+            if not isinstance(student, dict) or student.get('fingerprint_id') in (None, ''):
+                continue
+            key = str(student['fingerprint_id'])
+            if key in mapping:
+                duplicates.append({'fingerprint_id': key, 'students': [mapping[key], student_id]})
+                continue
+            mapping[key] = student_id
+
+        self.firebase.update_at_path('/', {FINGERPRINT_INDEX_PATH: mapping or None})
+        with self.lock:
+            self.mapping = dict(mapping)
+
+        print(f"✅ Index des empreintes reconstruit: {len(mapping)} entrées")
+        return {'entries': len(mapping), 'duplicates': duplicates}
+
+
+GROUP_MEMBERS_PATH = 'group_members'
+
+
+class GroupMembersIndex:
+    """Index group_members/<group_id>/<student_id> = true
+
+    Maintenu par les endpoints des étudiants (création, modification,
+    changement de groupe, suppression, import). Un groupe coûte une lecture
+    proportionnelle à sa taille, pas au nombre total d'étudiants. Le noeud
+    n'est pas dans le cache TTL (il est écrit par n'importe quel worker);
+    en mode réplique il est lu depuis la mémoire.
+    """
+
+    def __init__(self, firebase):
+        self.firebase = firebase
+        self.checked = False
+
+    def _ensure_built(self):
+        """Construire l'index à la première utilisation s'il n'existe pas"""
+        if self.checked:
+            return
+        if not self.firebase.get_all(GROUP_MEMBERS_PATH) and self.firebase.get_all('students'):
+            print("⚠️ Index des groupes absent, reconstruction...")
+            self.rebuild()
+        self.checked = True
+
+    def members(self, group_id):
+        """Identifiants des étudiants du groupe"""
+        if not group_id:
+            return []
+        self._ensure_built()
+        return [student_id for student_id, value in index_items(
+            self.firebase.get_all(f"{GROUP_MEMBERS_PATH}/{group_id}")
+        ) if value]
+
+    def count(self, group_id):
+        return len(self.members(group_id))
+
+    def all(self):
+        """{group_id: [student_id, ...]} pour tous les groupes (une lecture)"""
+        self._ensure_built()
+        return {
+            group_id: [student_id for student_id, value in index_items(members) if value]
+            for group_id, members in index_items(self.firebase.get_all(GROUP_MEMBERS_PATH))
+        }
+
+    def entry_updates(self, student_id, old_group=None, new_group=None):
+        """Entrées multi-chemins (depuis la racine) pour changer de groupe"""
+        self._ensure_built()
+        updates = {}
+        if old_group and old_group != new_group:
+            updates[f"{GROUP_MEMBERS_PATH}/{old_group}/{student_id}"] = None
+        if new_group:
+            updates[f"{GROUP_MEMBERS_PATH}/{new_group}/{student_id}"] = True
+        return updates
+
+    def rebuild(self):
+        """Reconstruire l'index depuis students/ (une lecture, une écriture)"""
+        students = self.firebase.get_all('students')
+        if isinstance(students, list):
+            students = {f"S{idx + 1}": student for idx, student in enumerate(students)}
+
+        index = {}
+        for student_id, student in index_items(students):
+            if isinstance(student, dict) and student.get('group'):
+                index.setdefault(student['group'], {})[student_id] = True
+
+        self.firebase.update_at_path('/', {GROUP_MEMBERS_PATH: index or None})
+        self.checked = True
+
+        print(f"✅ Index des groupes reconstruit: {len(index)} groupes")
+        return {'groups': len(index), 'members': sum(len(members) for members in index.values())}
+
+
+ATTENDANCE_BY_STUDENT_PATH = 'attendance_by_student'
+
+
+def session_date_prefix(date):
+    """Préfixe YYYYMMDD des session_id pour une date YYYY-MM-DD"""
+    return str(date or '').replace('-', '')
+
+
+class AttendanceByStudentIndex:
+    """Index attendance_by_student/<student_id>/<session_id> = {status, time}
+
+    Copie dénormalisée de attendance/<session_id>/present|absent: l'historique
+    d'un étudiant se lit en une seule lecture de son noeud. Les entrées
+    portent aussi la matière et l'heure de fin de la session quand elles sont
+    connues, pour ne pas relire sessions/.
+
+    Les marquages faits par le backend passent par ``mark_updates`` (présence
+    et index dans le même update multi-chemins), la liste des absents posée à
+    l'activation par ``roster_updates``. Les présences écrites
+    directement par les ESP32 sont reportées à la clôture de la session
+    (``session_updates``) ou par ``rebuild``. D'ici là l'entrée porte
+    ``live: True`` et ``live_history`` relit la feuille de la session.
+
+    ``find_session(all_sessions, date, room, session_id)`` retrouve une
+    session dans l'arbre sessions/ lors de la reconstruction.
+    """
+
+    def __init__(self, firebase, find_session=None):
+        self.firebase = firebase
+        self.find_session = find_session
+        self.checked = False
+
+    def _ensure_built(self):
+        """Construire l'index à la première utilisation s'il n'existe pas"""
+        if self.checked:
+            return
+        if not self.firebase.get_all(ATTENDANCE_BY_STUDENT_PATH) and self.firebase.get_all('attendance'):
+            print("⚠️ Index des présences par étudiant absent, reconstruction...")
+            self.rebuild()
+        self.checked = True
+
+    @staticmethod
+    def entry(status, time=None, session=None, live=False):
+        entry = {'status': status, 'time': time}
+        if live:
+            # Session pas encore close: attendance/<session_id> fait foi
+            entry['live'] = True
+        if isinstance(session, dict):
+            if session.get('subject'):
+                entry['subject'] = session['subject']
+            if session.get('end'):
+                entry['end'] = session['end']
+        return entry
+
+    def history(self, student_id, start_date=None, end_date=None):
+        """{session_id: entrée} d'un étudiant, filtré par dates (YYYY-MM-DD)"""
+        self._ensure_built()
+        path = f"{ATTENDANCE_BY_STUDENT_PATH}/{student_id}"
+        if start_date or end_date:
+            # Clés YYYYMMDD_...: la plage de dates est une plage de clés
+            entries = self.firebase.get_range(
+                path,
+                f"{session_date_prefix(start_date)}_" if start_date else None,
+                f"{session_date_prefix(end_date)}_{KEY_PREFIX_END}" if end_date else None
+            )
+        else:
+            entries = self.firebase.get_all(path)
+        return {session_id: entry for session_id, entry in index_items(entries) if isinstance(entry, dict)}
+
+    def live_history(self, student_id, start_date=None, end_date=None, today=None):
+        """``history`` où les sessions encore ouvertes (``live``) et celles
+        du jour ``today`` (YYYY-MM-DD) reprennent le statut de
+        attendance/<session_id>, que les ESP32 écrivent directement"""
+        history = self.history(student_id, start_date, end_date)
+        today_prefix = f"{session_date_prefix(today)}_" if today else None
+        for session_id, entry in history.items():
+            if not entry.get('live') and not (today_prefix and session_id.startswith(today_prefix)):
+                continue
+            # Deux lectures de feuilles plutôt que toute la feuille de présence
+            present = self.firebase.get_one(f"attendance/{session_id}/present", student_id)
+            if present:
+                time = present.get('time') if isinstance(present, dict) else None
+                history[session_id] = {**entry, 'status': 'PRESENT', 'time': time}
+            elif self.firebase.get_one(f"attendance/{session_id}/absent", student_id):
+                history[session_id] = {**entry, 'status': 'ABSENT', 'time': None}
+        return history
+
+    def mark_updates(self, session_id, student_id, status, record, session=None):
+        """Entrées multi-chemins (depuis la racine) pour marquer un étudiant
+        présent ou absent: attendance et index partent ensemble"""
+        self._ensure_built()
+        target, other = ('present', 'absent') if status == 'PRESENT' else ('absent', 'present')
+        return {
+            f"attendance/{session_id}/{target}/{student_id}": record,
+            f"attendance/{session_id}/{other}/{student_id}": None,
+            f"{ATTENDANCE_BY_STUDENT_PATH}/{student_id}/{session_id}":
+                self.entry(status, (record or {}).get('time'), session, live=True)
+        }
+
+    def roster_updates(self, session_id, roster, session=None):
+        """Entrées multi-chemins pour inscrire des étudiants absents
+        ({student_id: record}) sans toucher aux présents"""
+        self._ensure_built()
+        updates = {}
+        for student_id, record in roster.items():
+            updates[f"attendance/{session_id}/absent/{student_id}"] = record
+            updates[f"{ATTENDANCE_BY_STUDENT_PATH}/{student_id}/{session_id}"] = self.entry('ABSENT', None, session, live=True)
+        return updates
+
+    def _sheet_entries(self, attendance_record, session=None, live=False):
+        """(student_id, entrée) pour une feuille de présence (present l'emporte)"""
+        entries = {}
+        if not isinstance(attendance_record, dict):
+            return entries
+        for status, key in (('ABSENT', 'absent'), ('PRESENT', 'present')):
+            for student_id, record in index_items(attendance_record.get(key)):
+                time = record.get('time') if isinstance(record, dict) else None
+                entries[student_id] = self.entry(status, time, session, live)
+        return entries
+
+    def session_updates(self, session_id, attendance_record, session=None):
+        """Entrées d'index pour toute la feuille de présence d'une session
+        close (les marques ``live`` sont effacées)"""
+        self._ensure_built()
+        return {
+            f"{ATTENDANCE_BY_STUDENT_PATH}/{student_id}/{session_id}": entry
+            for student_id, entry in self._sheet_entries(attendance_record, session).items()
+        }
+
+    def _lookup_session(self, all_sessions, session_id):
+        parts = session_id.split('_')
+        if not self.find_session or len(parts) < 4 or len(parts[0]) != 8:
+            return None
+        date = f"{parts[0][:4]}-{parts[0][4:6]}-{parts[0][6:8]}"
+        return self.find_session(all_sessions, date, parts[1], session_id)
+
+    def rebuild(self):
+        """Reconstruire l'index depuis attendance/ et sessions/ (deux lectures,
+        une écriture)"""
+        attendance = self.firebase.get_all('attendance')
+        all_sessions = (self.firebase.get_all('sessions') or {}) if self.find_session else {}
+
+        index = {}
+        for session_id, record in index_items(attendance):
+            session = self._lookup_session(all_sessions, session_id)
+            live = isinstance(session, dict) and session.get('status') != 'CLOSED'
+            for student_id, entry in self._sheet_entries(record, session, live).items():
+                index.setdefault(student_id, {})[session_id] = entry
+
+        self.firebase.update_at_path('/', {ATTENDANCE_BY_STUDENT_PATH: index or None})
+        self.checked = True
+
+        entries = sum(len(sessions) for sessions in index.values())
+        print(f"✅ Index des présences par étudiant reconstruit: {entries} entrées")
+        return {'students': len(index), 'entries': entries}
@@ -0,0 +1,162 @@
+# services/job_metrics.py
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Bornes (secondes) des classes de l'histogramme de durée
+DURATION_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 300)
+
+# Seuil d'alerte: une exécution qui dépasse cette part de l'intervalle
+OVERRUN_RATIO = 0.8
+
+
+def percentile(values, ratio):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(ratio * (len(ordered) - 1))))]
+
+
+class JobMetrics:
+    """Mesures d'exécution des jobs du scheduler sur une fenêtre glissante
+
+    Pour chaque job: durée, appels au stockage, sessions touchées et échecs
+    des ``window`` dernières exécutions, plus des compteurs cumulés.
+    ``call_counter`` renvoie le nombre d'appels au stockage du thread courant.
+    """
+
+    def __init__(self, call_counter=None, window=100):
+        self.call_counter = call_counter
+        self.window = window
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.intervals = {}
+        self.current = threading.local()
+
+    def _job(self, job_name):
+        if job_name not in self.jobs:
+            self.jobs[job_name] = {
+                'runs': deque(maxlen=self.window),
+                'total_runs': 0,
+                'total_failures': 0,
+                'near_overruns': 0,
+                'skipped_overlap': 0,
+                'missed': 0,
+                'running': 0,
+                'last_error': None
+            }
+        return self.jobs[job_name]
+
+    def set_interval(self, job_name, seconds):
+        """Intervalle nominal du job, pour l'alerte de dépassement"""
+        self.intervals[job_name] = seconds
+
+    @contextmanager
+    def track(self, job_name):
+        """Mesurer une exécution du job (à utiliser autour de l'appel)"""
+        run = {'sessions': 0, 'error': None}
+        previous = getattr(self.current, 'run', None)
+        self.current.run = run
+        calls_before = self.call_counter() if self.call_counter else 0
+        started = time.monotonic()
+        with self.lock:
+            self._job(job_name)['running'] += 1
+
+        try:
+            yield run
+        except Exception as e:
+            run['error'] = str(e)
+            raise
+        finally:
+            duration = time.monotonic() - started
+            calls = (self.call_counter() - calls_before) if self.call_counter else None
+            self.current.run = previous
+            self._record(job_name, duration, calls, run)
+
+    def _record(self, job_name, duration, calls, run):
+        interval = self.intervals.get(job_name)
+        near_overrun = bool(interval and duration > OVERRUN_RATIO * interval)
+
+        with self.lock:
+            job = self._job(job_name)
+            job['running'] -= 1
+            job['total_runs'] += 1
+            job['runs'].append({
+                'finished_at': time.time(),
+                'duration': duration,
+                'storage_calls': calls,
+                'sessions_touched': run['sessions'],
+                'failed': run['error'] is not None
+            })
+            if run['error'] is not None:
+                job['total_failures'] += 1
+                job['last_error'] = run['error']
+            if near_overrun:
+                job['near_overruns'] += 1
+
+        if near_overrun:
+            print(f"⚠️ Job {job_name} a duré {duration:.1f}s pour un intervalle de {interval}s")
+
+    def add_sessions(self, count):
+        """Ajouter des sessions touchées à l'exécution en cours, s'il y en a une"""
+        run = getattr(self.current, 'run', None)
+        if run is not None:
+            run['sessions'] += count
+
+    def mark_failed(self, error):
+        """Marquer l'exécution en cours comme échouée (erreur déjà gérée)"""
+        run = getattr(self.current, 'run', None)
+        if run is not None:
+            run['error'] = str(error)
+
+    def record_event(self, job_name, kind):
+        """Compter une exécution sautée ('skipped_overlap') ou manquée ('missed')"""
+        with self.lock:
+            self._job(job_name)[kind] += 1
+
+    @staticmethod
+    def _summary(values):
+        values = [v for v in values if v is not None]
+        if not values:
+            return None
+        return {
+            'avg': round(sum(values) / len(values), 4),
+            'p50': round(percentile(values, 0.5), 4),
+            'p95': round(percentile(values, 0.95), 4),
+            'max': round(max(values), 4)
+        }
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for job_name, job in self.jobs.items():
+                runs = list(job['runs'])
+                durations = [run['duration'] for run in runs]
+
+                histogram = [0] * (len(DURATION_BUCKETS) + 1)
+                for duration in durations:
+                    histogram[bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+
+                result[job_name] = {
+                    'total_runs': job['total_runs'],
+                    'total_failures': job['total_failures'],
+                    'window_runs': len(runs),
+                    'window_failures': sum(1 for run in runs if run['failed']),
+                    'running': job['running'],
+                    'near_overruns': job['near_overruns'],
+                    'skipped_overlap': job['skipped_overlap'],
+                    'missed': job['missed'],
+                    'interval_seconds': self.intervals.get(job_name),
+                    'last_run_at': runs[-1]['finished_at'] if runs else None,
+                    'last_error': job['last_error'],
+                    'duration_seconds': self._summary(durations),
+                    'duration_histogram': {
+                        **{f"le_{bound}": count for bound, count in zip(DURATION_BUCKETS, histogram)},
+                        'inf': histogram[-1]
+                    },
+                    'storage_calls': self._summary([run['storage_calls'] for run in runs]),
+                    'sessions_touched': self._summary([run['sessions_touched'] for run in runs])
+                }
+            return result
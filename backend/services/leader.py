@@ -0,0 +1,177 @@
+# services/leader.py
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: pas de flock, un seul processus suppose
+    fcntl = None
+
+DEFAULT_LOCK_PATH = os.path.join(tempfile.gettempdir(), 'iot_attendance_scheduler.lock')
+
+
+class LeaderLease:
+    """Election d'un leader entre workers via un verrou flock
+
+    Le processus qui obtient le verrou exclusif sur ``lock_path`` devient
+    leader et le garde jusqu'à sa mort (le noyau libère alors le verrou).
+    Les autres retentent à chaque battement et prennent le relais.
+
+    Le leader écrit à chaque battement son état dans ``<lock_path>.status``
+    (lu par les followers) et traite les messages déposés par les followers
+    dans ``<lock_path>.queue``.
+    """
+
+    def __init__(self, lock_path=DEFAULT_LOCK_PATH, heartbeat_interval=10):
+        self.lock_path = lock_path
+        self.status_path = f"{lock_path}.status"
+        self.queue_path = f"{lock_path}.queue"
+        self.heartbeat_interval = heartbeat_interval
+        self.is_leader = False
+        self.elected_at = None
+        self.lock_file = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.on_elected = None
+        self.status_provider = None
+        self.on_message = None
+
+    def start(self, on_elected, status_provider=None, on_message=None):
+        """Lancer la boucle d'élection/battement en arrière-plan"""
+        self.on_elected = on_elected
+        self.status_provider = status_provider
+        self.on_message = on_message
+
+        self._tick()
+        self.thread = threading.Thread(target=self._run, name='leader-lease', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.release()
+
+    def _run(self):
+        while not self.stop_event.wait(self.heartbeat_interval):
+            self._tick()
+
+    def _tick(self):
+        try:
+            if not self.is_leader and self.try_acquire():
+                print(f"👑 Worker {os.getpid()} élu leader du scheduler")
+                try:
+                    self.on_elected()
+                except Exception as e:
+                    # Sans scheduler, garder le verrou bloquerait l'élection:
+                    # le rendre pour que ce worker ou un autre réessaie
+                    print(f"⚠️ Démarrage du leader échoué, verrou rendu: {e}")
+                    self.release()
+                    return
+            if self.is_leader:
+                self._drain_queue()
+                self._write_status()
+        except Exception as e:
+            print(f"⚠️ Erreur bail leader: {e}")
+
+    def try_acquire(self):
+        """Tenter de prendre le verrou sans bloquer"""
+        if fcntl is None:
+            self.is_leader = True
+            self.elected_at = time.time()
+            return True
+
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self.lock_file = lock_file
+        self.is_leader = True
+        self.elected_at = time.time()
+        return True
+
+    def release(self):
+        if self.lock_file:
+            try:
+                fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+            finally:
+                self.lock_file.close()
+                self.lock_file = None
+        self.is_leader = False
+
+    # ---- Etat publié par le leader ----
+
+    def _write_status(self):
+        status = {
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            'elected_at': self.elected_at,
+            'heartbeat_at': time.time(),
+            'heartbeat_interval': self.heartbeat_interval,
+            'scheduler': self.status_provider() if self.status_provider else None
+        }
+        tmp_path = f"{self.status_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, default=str)
+        os.replace(tmp_path, self.status_path)
+
+    def read_status(self):
+        """Dernier état publié par le leader (stale si plus de battement)"""
+        try:
+            with open(self.status_path, encoding='utf-8') as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        age = time.time() - status.get('heartbeat_at', 0)
+        status['heartbeat_age_seconds'] = round(age, 3)
+        status['stale'] = age > 3 * status.get('heartbeat_interval', self.heartbeat_interval)
+        return status
+
+    def describe(self):
+        return {
+            'role': 'leader' if self.is_leader else 'follower',
+            'pid': os.getpid(),
+            'lock_path': self.lock_path,
+            'elected_at': self.elected_at if self.is_leader else None
+        }
+
+    # ---- Messages des followers vers le leader ----
+
+    def enqueue(self, message):
+        """Déposer un message (dict JSON) pour le leader"""
+        with open(self.queue_path, 'a', encoding='utf-8') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            f.write(json.dumps(message) + '\n')
+
+    def _drain_queue(self):
+        if not self.on_message or not os.path.exists(self.queue_path):
+            return
+
+        with open(self.queue_path, 'r+', encoding='utf-8') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            lines = f.readlines()
+            f.seek(0)
+            f.truncate()
+
+        for line in lines:
+            try:
+                self.on_message(json.loads(line))
+            except Exception as e:
+                print(f"⚠️ Message leader ignoré ({line.strip()}): {e}")
+
+
+def create_lease_from_env():
+    """Bail configuré par SCHEDULER_LOCK_FILE / SCHEDULER_HEARTBEAT_SECONDS"""
+    return LeaderLease(
+        lock_path=os.environ.get('SCHEDULER_LOCK_FILE', DEFAULT_LOCK_PATH),
+        heartbeat_interval=int(os.environ.get('SCHEDULER_HEARTBEAT_SECONDS', 10))
+    )
@@ -0,0 +1,66 @@
+# services/pagination.py
+import base64
+import json
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+# Jours lus au plus par requête paginée: avec des filtres peu sélectifs, la
+# page revient courte avec un curseur de reprise plutôt que de tout parcourir
+MAX_PAGE_SCAN_DAYS = 31
+
+
+def encode_cursor(position):
+    """Curseur opaque (base64 url) pour une position de tri"""
+    raw = json.dumps(list(position), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Position encodée par encode_cursor; ValueError si le curseur est invalide"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, list) or not all(isinstance(value, str) for value in position):
+        raise ValueError('Invalid cursor')
+    return position
+
+
+def page_args(args):
+    """(limit, position) si la requête demande une page (``limit`` ou
+    ``cursor``), None sinon (ancienne réponse complète)
+
+    Lève ValueError pour une limite ou un curseur invalide.
+    """
+    if 'limit' not in args and 'cursor' not in args:
+        return None
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_LIMIT))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be >= 1')
+    cursor = args.get('cursor')
+    return min(limit, MAX_PAGE_LIMIT), decode_cursor(cursor) if cursor else None
+
+
+def page_response(items, limit, position_of, resume=None):
+    """Couper ``limit + 1`` éléments triés en une page et ses métadonnées
+
+    ``resume`` est la position où reprendre quand la lecture s'est arrêtée
+    avant la fin (limite de jours atteinte): la page peut alors être courte,
+    voire vide, avec ``has_more`` et un ``next_cursor``.
+    """
+    page = items[:limit]
+    if len(items) > limit and page:
+        next_position = position_of(page[-1])
+    else:
+        next_position = resume
+    return {
+        'data': page,
+        'count': len(page),
+        'limit': limit,
+        'has_more': next_position is not None,
+        'next_cursor': encode_cursor(next_position) if next_position is not None else None
+    }
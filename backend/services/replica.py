@@ -0,0 +1,121 @@
+# services/replica.py
+import copy
+import threading
+import time
+
+from services.storage import split_path
+
+
+class SubtreeReplica:
+    """Copie locale d'un sous-arbre tenue à jour par ref.listen()
+
+    Le premier événement put '/' fournit l'état complet; les événements
+    put/patch suivants sont appliqués de façon incrémentale.
+    """
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = '/'.join(split_path(path))
+        self.lock = threading.Lock()
+        self.tree = None
+        self.synced = False
+        self.events = 0
+        self.last_event_at = None
+        self.error = None
+        self.registration = None
+
+    def start(self):
+        try:
+            self.registration = self.backend.reference(self.path).listen(self._on_event)
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Réplique {self.path} non démarrée: {e}")
+        return self
+
+    def stop(self):
+        if self.registration:
+            self.registration.close()
+            self.registration = None
+        with self.lock:
+            self.synced = False
+
+    def _on_event(self, event):
+        try:
+            with self.lock:
+                segments = split_path(event.path)
+                if event.event_type == 'put':
+                    self.tree = self._set(self.tree, segments, copy.deepcopy(event.data))
+                    if not segments:
+                        self.synced = True
+                elif event.event_type == 'patch':
+                    for key, value in (event.data or {}).items():
+                        self.tree = self._set(self.tree, segments + split_path(key), copy.deepcopy(value))
+                self.events += 1
+                self.last_event_at = time.time()
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Erreur réplique {self.path}: {e}")
+
+    @classmethod
+    def _set(cls, node, segments, value):
+        """Retourne node avec node[segments] = value (None supprime)"""
+        if not segments:
+            return value
+
+        head = segments[0]
+        if isinstance(node, list):
+            if head.isdigit() and int(head) <= len(node):
+                index = int(head)
+                child = cls._set(node[index] if index < len(node) else None, segments[1:], value)
+                if index < len(node):
+                    node[index] = child if child != {} else None
+                elif child not in (None, {}):
+                    node.append(child)
+                return node if any(item is not None for item in node) else None
+            node = {str(i): item for i, item in enumerate(node) if item is not None}
+        if not isinstance(node, dict):
+            if value is None:
+                return node
+            node = {}
+
+        child = cls._set(node.get(head), segments[1:], value)
+        if child is None or child == {}:
+            node.pop(head, None)
+        else:
+            node[head] = child
+        return node or None
+
+    def apply_write(self, segments, value):
+        """Appliquer tout de suite une écriture faite par ce processus
+
+        Avec firebase_admin l'écho arrive plus tard par listen(): sans cela
+        une lecture juste après l'écriture verrait l'ancienne valeur. L'écho
+        réapplique ensuite la même valeur.
+        """
+        with self.lock:
+            if self.synced:
+                self.tree = self._set(self.tree, list(segments), copy.deepcopy(value))
+
+    def get(self, segments):
+        """Lire sous le sous-arbre (segments relatifs au chemin répliqué)"""
+        with self.lock:
+            node = self.tree
+            for segment in segments:
+                if isinstance(node, dict):
+                    node = node.get(segment)
+                elif isinstance(node, list) and segment.isdigit() and int(segment) < len(node):
+                    node = node[int(segment)]
+                else:
+                    return None
+            return copy.deepcopy(node)
+
+    def status(self):
+        with self.lock:
+            return {
+                'path': self.path,
+                'synced': self.synced,
+                'events': self.events,
+                'last_event_at': self.last_event_at,
+                'staleness_seconds': round(time.time() - self.last_event_at, 3) if self.last_event_at else None,
+                'error': self.error
+            }
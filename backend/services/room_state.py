@@ -0,0 +1,72 @@
+# services/room_state.py
+import hashlib
+import json
+import threading
+
+
+def state_version(state):
+    """Version d'un état: empreinte du contenu, identique d'un worker à l'autre"""
+    raw = json.dumps(state, separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class RoomStateTable:
+    """Table en mémoire room_id -> (version, état de la session de la salle)
+
+    Le scheduler publie l'état d'une salle quand une session change de
+    statut; les requêtes long-poll attendent sur la condition jusqu'à ce
+    que la version de leur salle diffère de celle qu'elles connaissent.
+    ``waiters`` compte les requêtes en attente (pour le rafraîchissement
+    périodique des workers qui ne font pas tourner le scheduler).
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.states = {}
+        self.waiters = 0
+        self.published = 0
+        self.rejected = 0
+
+    def publish(self, room_id, state):
+        """Enregistrer l'état d'une salle, réveiller les attentes s'il a changé"""
+        version = state_version(state)
+        with self.condition:
+            current = self.states.get(room_id)
+            if current and current[0] == version:
+                return False
+            self.states[room_id] = (version, state)
+            self.published += 1
+            self.condition.notify_all()
+            return True
+
+    def get(self, room_id):
+        """(version, état) de la salle, ou (None, None) si elle est inconnue"""
+        with self.condition:
+            return self.states.get(room_id, (None, None))
+
+    def wait(self, room_id, since, timeout, max_waiters=None):
+        """Attendre (au plus timeout secondes) une version différente de since
+
+        Au-delà de ``max_waiters`` attentes en cours, répond sans attendre.
+        Renvoie (version, état, changé, attendu).
+        """
+        def changed():
+            return self.states.get(room_id, (None,))[0] not in (None, since)
+
+        with self.condition:
+            if max_waiters is not None and self.waiters >= max_waiters:
+                version, state = self.states.get(room_id, (None, None))
+                self.rejected += 1
+                return version, state, changed(), False
+            self.waiters += 1
+            try:
+                result = self.condition.wait_for(changed, timeout)
+            finally:
+                self.waiters -= 1
+            version, state = self.states.get(room_id, (None, None))
+            return version, state, bool(result), True
+
+    def status(self):
+        with self.condition:
+            return {'rooms': len(self.states), 'waiters': self.waiters,
+                    'published': self.published, 'rejected': self.rejected}
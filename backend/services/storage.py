@@ -0,0 +1,425 @@
+# services/storage.py
+import copy
+import heapq
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import firebase_admin
+from firebase_admin import credentials, db
+
+DATABASE_URL = 'https://iot-attendance-systeme-default-rtdb.europe-west1.firebasedatabase.app'
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SEED_PATH = os.path.join(BACKEND_DIR, '..', 'Database', 'db2.json')
+
+
+def split_path(path):
+    """Découper un chemin Firebase en segments"""
+    if not path:
+        return []
+    return [segment for segment in str(path).split('/') if segment]
+
+
+# Borne haute d'un préfixe de clé (endAt(prefix + KEY_PREFIX_END))
+KEY_PREFIX_END = '\uf8ff'
+
+
+def key_before(key):
+    """Borne endAt qui exclut ``key`` et garde toutes les clés (chaînes)
+    inférieures: dernier caractère décrémenté suivi de KEY_PREFIX_END"""
+    key = str(key)
+    return key[:-1] + chr(ord(key[-1]) - 1) + KEY_PREFIX_END
+
+
+def key_sort_value(key):
+    """Ordre des clés de la RTDB (orderByKey): les entiers 32 bits d'abord,
+    par valeur, puis les chaînes par ordre lexicographique"""
+    key = str(key)
+    if key.lstrip('-').isdigit() and -2 ** 31 <= int(key) < 2 ** 31:
+        return (0, int(key), '')
+    return (1, 0, key)
+
+
+def node_items(node):
+    """Paires (clé, valeur) des enfants d'un noeud (dict ou ancienne liste)"""
+    if isinstance(node, dict):
+        return [(str(key), value) for key, value in node.items() if value is not None]
+    if isinstance(node, list):
+        return [(str(key), value) for key, value in enumerate(node) if value is not None]
+    return []
+
+
+def key_range(node, start=None, end=None, limit_first=None, limit_last=None):
+    """Appliquer orderByKey/startAt/endAt/limitTo* à un noeud déjà en mémoire"""
+    low = key_sort_value(start) if start is not None else None
+    high = key_sort_value(end) if end is not None else None
+    # Filtrer avant de trier: seule la plage demandée est triée
+    items = []
+    for key, value in node_items(node):
+        sort_value = key_sort_value(key)
+        if (low is None or sort_value >= low) and (high is None or sort_value <= high):
+            items.append((sort_value, key, value))
+
+    if limit_first is not None:
+        items = heapq.nsmallest(limit_first, items, key=lambda item: item[0])
+    elif limit_last is not None:
+        items = sorted(heapq.nlargest(limit_last, items, key=lambda item: item[0]), key=lambda item: item[0])
+    else:
+        items.sort(key=lambda item: item[0])
+    return OrderedDict((key, value) for _, key, value in items)
+
+
+class StorageBackend:
+    """Interface commune des backends de stockage
+
+    Un backend fournit des références qui se comportent comme
+    ``firebase_admin.db.Reference`` (get, set, update, delete, child, push).
+    """
+
+    name = 'base'
+
+    def reference(self, path=''):
+        raise NotImplementedError
+
+
+class FirebaseAdminBackend(StorageBackend):
+    """Backend Realtime Database via firebase_admin"""
+
+    name = 'firebase'
+
+    def __init__(self, service_key_path="serviceAccountKey.json", database_url=DATABASE_URL):
+        # Initialiser Firebase une seule fois
+        if not firebase_admin._apps:
+            try:
+                if os.path.exists(service_key_path):
+                    cred = credentials.Certificate(service_key_path)
+                    firebase_admin.initialize_app(cred, {
+                        'databaseURL': database_url
+                    })
+                    print("✅ Firebase initialisé avec le fichier de service")
+                else:
+                    print("⚠️  ATTENTION: serviceAccountKey.json non trouvé")
+                    print("🔗 Utilisation de la base de données en lecture seule")
+
+                    # Initialiser sans credentials (lecture seule)
+                    firebase_admin.initialize_app(options={
+                        'databaseURL': database_url
+                    })
+            except Exception as e:
+                print(f"❌ Erreur initialisation Firebase: {e}")
+                raise
+
+    def reference(self, path=''):
+        return db.reference(path or '/')
+
+
+class LocalReference:
+    """Référence sur l'arbre du LocalBackend (même API que db.Reference)"""
+
+    def __init__(self, backend, path=''):
+        self._backend = backend
+        self._segments = split_path(path)
+
+    @property
+    def key(self):
+        return self._segments[-1] if self._segments else None
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self._segments)
+
+    @property
+    def parent(self):
+        if not self._segments:
+            return None
+        return LocalReference(self._backend, '/'.join(self._segments[:-1]))
+
+    def child(self, path):
+        return LocalReference(self._backend, '/'.join(self._segments + split_path(path)))
+
+    def get(self):
+        return self._backend.read(self._segments)
+
+    def set(self, value):
+        self._backend.write(self._segments, value)
+
+    def update(self, value):
+        if not isinstance(value, dict) or not value:
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        self._backend.write_many([
+            (self._segments + split_path(key), val) for key, val in value.items()
+        ], base=self._segments)
+
+    def delete(self):
+        self._backend.write(self._segments, None)
+
+    def transaction(self, transaction_update):
+        """Lecture-modification-écriture atomique (sous le verrou du backend)"""
+        with self._backend.lock:
+            new_value = transaction_update(self.get())
+            self.set(new_value)
+            return new_value
+
+    def push(self, value=''):
+        key = self._backend.next_push_key()
+        ref = self.child(key)
+        ref.set(value)
+        return ref
+
+    def listen(self, callback):
+        return self._backend.add_listener(self._segments, callback)
+
+    def order_by_key(self):
+        return LocalQuery(self)
+
+
+class LocalQuery:
+    """Requête ordonnée par clé (sous-ensemble de db.Query utilisé ici)"""
+
+    def __init__(self, ref):
+        self._ref = ref
+        self._start = None
+        self._end = None
+        self._limit_first = None
+        self._limit_last = None
+
+    def start_at(self, start):
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        self._end = end
+        return self
+
+    def equal_to(self, value):
+        self._start = self._end = value
+        return self
+
+    def limit_to_first(self, limit):
+        self._limit_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_last = limit
+        return self
+
+    def get(self):
+        return self._ref._backend.read_range(
+            self._ref._segments, self._start, self._end, self._limit_first, self._limit_last
+        )
+
+
+class LocalEvent:
+    """Evénement de streaming (mêmes attributs que db.Event)"""
+
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class LocalListenerRegistration:
+    """Equivalent local de db.ListenerRegistration"""
+
+    def __init__(self, backend, listener_id):
+        self._backend = backend
+        self._listener_id = listener_id
+
+    def close(self):
+        self._backend.remove_listener(self._listener_id)
+
+
+class LocalBackend(StorageBackend):
+    """Arbre JSON en mémoire qui remplace la Realtime Database
+
+    Amorcé depuis ``Database/db.json`` ou ``db2.json``. Si ``persist_path``
+    est fourni, l'arbre est relu depuis ce fichier au démarrage et réécrit
+    après chaque écriture.
+    """
+
+    name = 'local'
+
+    def __init__(self, seed_path=DEFAULT_SEED_PATH, persist_path=None):
+        self.lock = threading.RLock()
+        self.persist_path = persist_path
+        self._push_counter = 0
+        self._listeners = {}
+        self._listener_counter = 0
+
+        source = persist_path if persist_path and os.path.exists(persist_path) else seed_path
+        self.tree = {}
+        if source and os.path.exists(source):
+            with open(source, encoding='utf-8') as f:
+                self.tree = json.load(f) or {}
+            print(f"✅ Base locale chargée depuis {source}")
+        else:
+            print("⚠️  Base locale vide (aucun fichier d'amorçage)")
+
+    def reference(self, path=''):
+        return LocalReference(self, path)
+
+    def add_listener(self, segments, callback):
+        """Abonner callback aux changements sous segments (put initial compris)"""
+        with self.lock:
+            self._listener_counter += 1
+            listener_id = self._listener_counter
+            self._listeners[listener_id] = (list(segments), callback)
+            callback(LocalEvent('put', '/', self.read(segments)))
+        return LocalListenerRegistration(self, listener_id)
+
+    def remove_listener(self, listener_id):
+        with self.lock:
+            self._listeners.pop(listener_id, None)
+
+    def next_push_key(self):
+        with self.lock:
+            self._push_counter += 1
+            return f"-L{self._push_counter:012d}"
+
+    # ---- Lecture / écriture sur l'arbre ----
+
+    @staticmethod
+    def _child(node, segment):
+        if isinstance(node, dict):
+            return node.get(segment)
+        if isinstance(node, list) and segment.isdigit():
+            index = int(segment)
+            return node[index] if index < len(node) else None
+        return None
+
+    def _node(self, segments):
+        node = self.tree
+        for segment in segments:
+            node = self._child(node, segment)
+            if node is None:
+                return None
+        return node
+
+    def read(self, segments):
+        with self.lock:
+            return copy.deepcopy(self._node(segments))
+
+    def read_range(self, segments, start=None, end=None, limit_first=None, limit_last=None):
+        """Lire seulement les enfants dont la clé est dans l'intervalle"""
+        with self.lock:
+            return copy.deepcopy(key_range(self._node(segments), start, end, limit_first, limit_last))
+
+    def write(self, segments, value):
+        self.write_many([(segments, value)])
+
+    def write_many(self, writes, base=None):
+        """Appliquer des écritures puis notifier les listeners
+
+        ``base`` est le chemin d'un update() multi-chemins: les listeners
+        situés au-dessus reçoivent alors un seul événement patch.
+        """
+        with self.lock:
+            for segments, value in writes:
+                self._write(segments, copy.deepcopy(value))
+            self._persist()
+
+            # Notifier sous le verrou pour garder l'ordre des écritures
+            for callback, event in self._collect_events(writes, base):
+                callback(event)
+
+    def _collect_events(self, writes, base):
+        events = []
+        for listen_segments, callback in self._listeners.values():
+            depth = len(listen_segments)
+
+            if base is not None and base[:depth] == listen_segments:
+                relative = base[depth:]
+                data = {
+                    '/'.join(segments[len(base):]): copy.deepcopy(value)
+                    for segments, value in writes
+                }
+                events.append((callback, LocalEvent('patch', '/' + '/'.join(relative), data)))
+                continue
+
+            replaced = False
+            for segments, value in writes:
+                if segments[:depth] == listen_segments:
+                    relative = segments[depth:]
+                    events.append((callback, LocalEvent('put', '/' + '/'.join(relative), copy.deepcopy(value))))
+                elif listen_segments[:len(segments)] == segments and not replaced:
+                    # Un ancêtre a été réécrit: renvoyer tout le sous-arbre écouté
+                    events.append((callback, LocalEvent('put', '/', self.read(listen_segments))))
+                    replaced = True
+        return events
+
+    def _write(self, segments, value):
+        if not segments:
+            self.tree = value if isinstance(value, dict) else {}
+            return
+
+        # Descendre en créant les noeuds intermédiaires
+        parents = []
+        node = self.tree
+        for segment in segments[:-1]:
+            child = self._child(node, segment)
+            if not isinstance(child, (dict, list)):
+                if value is None:
+                    return
+                child = {}
+                node = self._assign(node, segment, child, parents)
+            parents.append((node, segment))
+            node = child
+
+        self._assign(node, segments[-1], value, parents)
+        self._prune(parents + [(node, segments[-1])])
+
+    def _assign(self, node, segment, value, parents):
+        """Affecter node[segment] en convertissant une liste en dict si besoin"""
+        if isinstance(node, list):
+            if segment.isdigit() and int(segment) < len(node):
+                node[int(segment)] = value
+                return node
+            if segment.isdigit() and int(segment) == len(node) and value is not None:
+                node.append(value)
+                return node
+            converted = {str(i): item for i, item in enumerate(node) if item is not None}
+            if parents:
+                parent, parent_key = parents[-1]
+                self._assign(parent, parent_key, converted, parents[:-1])
+            else:
+                self.tree = converted
+            node = converted
+
+        if value is None:
+            node.pop(segment, None)
+        else:
+            node[segment] = value
+        return node
+
+    def _prune(self, chain):
+        """Supprimer les noeuds vides (la RTDB ne stocke pas de noeud vide)"""
+        for node, segment in reversed(chain):
+            child = self._child(node, segment)
+            if child is None or child == {} or child == []:
+                if isinstance(node, dict):
+                    node.pop(segment, None)
+                elif isinstance(node, list) and segment.isdigit() and int(segment) < len(node):
+                    node[int(segment)] = None
+            else:
+                break
+
+    def _persist(self):
+        if not self.persist_path:
+            return
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.tree, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.persist_path)
+
+
+def create_backend_from_env():
+    """Choisir le backend selon STORAGE_BACKEND (firebase par défaut)"""
+    backend_name = os.environ.get('STORAGE_BACKEND', 'firebase').lower()
+    if backend_name == 'local':
+        return LocalBackend(
+            seed_path=os.environ.get('LOCAL_DB_SEED', DEFAULT_SEED_PATH),
+            persist_path=os.environ.get('LOCAL_DB_FILE') or None
+        )
+    return FirebaseAdminBackend()
@@ -0,0 +1,55 @@
+# tests/conftest.py
+import copy
+import os
+import sys
+
+# Local stand-in for the RTDB; no scheduler job store on disk
+os.environ.setdefault('STORAGE_BACKEND', 'local')
+os.environ.setdefault('SCHEDULER_JOBSTORE_URL', 'memory')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from firebase_config import firebase
+from services.storage import LocalBackend
+import utils
+
+
+@pytest.fixture
+def local_db():
+    """The shared firebase object over an empty LocalBackend, restored afterwards"""
+    previous = firebase.backend
+    firebase.backend = LocalBackend(seed_path=None)
+    firebase.cache.invalidate('')
+    utils.fingerprint_index.mapping = None
+    utils.group_members.checked = False
+    utils.attendance_index.checked = False
+    yield firebase
+    firebase.disable_replica()
+    firebase.backend = previous
+    firebase.cache.invalidate('')
+    utils.fingerprint_index.mapping = None
+    utils.group_members.checked = False
+    utils.attendance_index.checked = False
+
+
+def seed(db, tree):
+    """Replace the whole local tree"""
+    db.backend.tree = copy.deepcopy(tree)
+    db.cache.invalidate('')
+
+
+@pytest.fixture
+def device_client(local_db):
+    """Test client with only the device endpoints, with their caches emptied"""
+    from flask import Flask
+    from routes import devices
+
+    devices.roster_cache.invalidate('')
+    devices.room_states.states.clear()
+    app = Flask(__name__)
+    app.register_blueprint(devices.devices_bp)
+    yield app.test_client()
+    devices.roster_cache.invalidate('')
+    devices.room_states.states.clear()
@@ -0,0 +1,120 @@
+# tests/test_device_scans.py
+import threading
+
+from routes import devices
+
+from conftest import seed
+
+DAY = '2026-01-05'
+SESSION_ID = '20260105_roomA_0800_G1'
+
+
+def school():
+    return {
+        'rooms': {'roomA': {'esp32_id': 'ESP32_A'}},
+        'students': {
+            'S1': {'name': 'Ali', 'group': 'G1', 'fingerprint_id': 1},
+            'S2': {'name': 'Sara', 'group': 'G2', 'fingerprint_id': 2},
+            'S3': {'name': 'Omar', 'group': 'G1', 'fingerprint_id': 3},
+        },
+        'fingerprint_index': {'1': 'S1', '2': 'S2', '3': 'S3'},
+        'sessions': {DAY: {'roomA': {SESSION_ID: {
+            'session_id': SESSION_ID, 'date': DAY, 'room': 'roomA', 'group': 'G1',
+            'subject': 'Maths', 'start': '08:00', 'end': '10:00', 'status': 'ACTIVE'
+        }}}},
+    }
+
+
+def scan(seq, fingerprint_id, time='08:05'):
+    return {'seq': seq, 'fingerprint_id': fingerprint_id, 'timestamp': f'{DAY}T{time}:00'}
+
+
+def post_batch(client, scans):
+    response = client.post('/api/devices/ESP32_A/scans/batch', json={'scans': scans})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def verdicts(body):
+    return [(result['seq'], result['verdict'], result.get('duplicate', False)) for result in body['results']]
+
+
+def test_batch_verdicts(local_db, device_client):
+    seed(local_db, school())
+    body = post_batch(device_client, [
+        scan(1, 1), scan(2, 2), scan(3, 99), scan(4, 1, '08:06'), scan(5, 3, '11:00'),
+        {'seq': 'x', 'fingerprint_id': 3}, {'seq': 6, 'fingerprint_id': 3, 'timestamp': 'yesterday'},
+    ])
+    assert verdicts(body) == [
+        (1, 'present', False), (2, 'wrong_group', False), (3, 'unknown', False),
+        (4, 'already_present', False), (5, 'no_session', False), ('x', 'invalid', False), (6, 'invalid', False),
+    ]
+    assert body['applied'] == 1
+    assert local_db.get_all(f'attendance/{SESSION_ID}/present') == {'S1': {'name': 'Ali', 'time': '08:05'}}
+    assert local_db.get_at_path(f'attendance_by_student/S1/{SESSION_ID}')['status'] == 'PRESENT'
+
+
+def test_replayed_batch_is_not_applied_twice(local_db, device_client):
+    seed(local_db, school())
+    batch = [scan(1, 1), scan(2, 3), scan(2, 3)]
+    first = post_batch(device_client, batch)
+    assert verdicts(first) == [(1, 'present', False), (2, 'present', False), (2, 'present', True)]
+
+    local_db.delete_at_path(f'attendance/{SESSION_ID}/present')
+    replay = post_batch(device_client, batch)
+    assert verdicts(replay) == [(1, 'present', True), (2, 'present', True), (2, 'present', True)]
+    assert replay['applied'] == 0 and replay['duplicates'] == 3
+    # Nothing was written again
+    assert local_db.get_all(f'attendance/{SESSION_ID}/present') == {}
+
+
+def test_replay_dedup_with_list_answer(local_db, device_client, monkeypatch):
+    """Integer seq keys come back from the RTDB as a list"""
+    seed(local_db, school())
+    post_batch(device_client, [scan(0, 1), scan(1, 3)])
+
+    get_range = local_db.get_range
+
+    def as_list(path, *args, **kwargs):
+        found = get_range(path, *args, **kwargs)
+        if not path.startswith(devices.DEVICE_SCANS_PATH) or not found:
+            return found
+        listed = [None] * (max(int(key) for key in found) + 1)
+        for key, value in found.items():
+            listed[int(key)] = value
+        return listed
+
+    monkeypatch.setattr(local_db, 'get_range', as_list)
+    replay = post_batch(device_client, [scan(0, 1), scan(1, 3), scan(2, 2)])
+    assert verdicts(replay) == [(0, 'present', True), (1, 'present', True), (2, 'wrong_group', False)]
+
+
+def test_batch_and_live_scans_mark_a_student_once(local_db, device_client):
+    seed(local_db, school())
+    session = local_db.get_one(f'sessions/{DAY}/roomA', SESSION_ID)
+    outcomes = []
+
+    def live():
+        outcomes.append(devices.record_scan(session, 1, '08:05')['verdict'])
+
+    def batch(seq):
+        outcomes.append(post_batch(device_client, [scan(seq, 1)])['results'][0]['verdict'])
+
+    threads = [threading.Thread(target=live) if n % 2 else threading.Thread(target=batch, args=(n,))
+               for n in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count('present') == 1
+    assert outcomes.count('already_present') == 19
+
+
+def test_batch_validation(local_db, device_client):
+    seed(local_db, school())
+    post = device_client.post
+    assert post('/api/devices/ESP32_A/scans/batch', json={'scans': []}).status_code == 400
+    assert post('/api/devices/ESP32_A/scans/batch',
+                json={'scans': [scan(n, 1) for n in range(devices.MAX_BATCH_SCANS + 1)]}).status_code == 400
+    assert post('/api/devices/UNKNOWN/scans/batch', json={'scans': [scan(1, 1)]}).status_code == 404
@@ -0,0 +1,87 @@
+# tests/test_device_state.py
+from datetime import datetime
+
+import pytest
+
+from routes import devices
+from routes.students import delete_student_record, save_student_update
+
+from conftest import seed
+
+DAY = '2026-01-05'
+SESSION_ID = '20260105_roomA_0800_G1'
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 1, 5, 8, 30)
+
+
+@pytest.fixture(autouse=True)
+def half_past_eight(monkeypatch):
+    monkeypatch.setattr(devices, 'datetime', FrozenDatetime)
+
+
+def school():
+    return {
+        'rooms': {'roomA': {'esp32_id': 'ESP32_A'}, 'roomB': {'esp32_id': 'ESP32_B'}},
+        'students': {
+            'S1': {'name': 'Ali', 'group': 'G1', 'fingerprint_id': 1},
+            'S2': {'name': 'Sara', 'group': 'G2', 'fingerprint_id': 2},
+            'S3': {'name': 'Omar', 'group': 'G1', 'fingerprint_id': 3},
+        },
+        'group_members': {'G1': {'S1': True, 'S3': True}, 'G2': {'S2': True}},
+        'sessions': {DAY: {'roomA': {
+            SESSION_ID: {'session_id': SESSION_ID, 'date': DAY, 'room': 'roomA', 'group': 'G1',
+                         'subject': 'Maths', 'start': '08:00', 'end': '10:00', 'status': 'ACTIVE'},
+            'later': {'session_id': 'later', 'date': DAY, 'room': 'roomA', 'group': 'G2',
+                      'subject': 'Physics', 'start': '14:00', 'end': '16:00', 'status': 'SCHEDULED'},
+        }}},
+    }
+
+
+def test_state_is_packed(local_db, device_client):
+    seed(local_db, school())
+    body = device_client.get('/api/devices/ESP32_A/state').get_json()
+    assert body['session'] == [SESSION_ID, 'ACTIVE', '08:00', '10:00', 'G1', 'Maths']
+    assert body['roster'] == [['S1', 1, 'Ali'], ['S3', 3, 'Omar']]
+
+    # Nothing running: the next scheduled session of the day
+    local_db.update_at_path('/', {f'sessions/{DAY}/roomA/{SESSION_ID}/status': 'CLOSED'})
+    body = device_client.get('/api/devices/ESP32_A/state').get_json()
+    assert body['session'][0] == 'later' and body['roster'] == [['S2', 2, 'Sara']]
+
+    body = device_client.get('/api/devices/ESP32_B/state').get_json()
+    assert body['session'] is None and body['roster'] == []
+    assert device_client.get('/api/devices/UNKNOWN/state').status_code == 404
+
+
+def test_etag_revalidation(local_db, device_client):
+    seed(local_db, school())
+    first = device_client.get('/api/devices/ESP32_A/state')
+    version = first.get_json()['v']
+    assert first.headers['ETag'] == f'"{version}"'
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    unchanged = device_client.get('/api/devices/ESP32_A/state', headers={'If-None-Match': f'"{version}"'})
+    assert unchanged.status_code == 304 and unchanged.data == b''
+
+    local_db.update_at_path('/', {f'sessions/{DAY}/roomA/{SESSION_ID}/status': 'CLOSED'})
+    changed = device_client.get('/api/devices/ESP32_A/state', headers={'If-None-Match': f'"{version}"'})
+    assert changed.status_code == 200 and changed.get_json()['v'] != version
+
+
+def test_roster_follows_student_writes(local_db, device_client):
+    seed(local_db, school())
+
+    def roster():
+        return [row[0] for row in device_client.get('/api/devices/ESP32_A/state').get_json()['roster']]
+
+    assert roster() == ['S1', 'S3']
+    save_student_update('S2', local_db.get_one('students', 'S2'), {'group': 'G1'})
+    assert roster() == ['S1', 'S2', 'S3']
+    save_student_update('S1', local_db.get_one('students', 'S1'), {'active': False})
+    assert roster() == ['S2', 'S3']
+    delete_student_record('S3', local_db.get_one('students', 'S3'))
+    assert roster() == ['S2']
@@ -0,0 +1,84 @@
+# tests/test_device_wait.py
+import threading
+import time
+
+import pytest
+
+import routes.sessions as sessions
+from routes import devices
+
+from conftest import seed
+from test_device_state import DAY, SESSION_ID, half_past_eight, school  # noqa: F401
+
+
+@pytest.fixture(autouse=True)
+def stop_refresher():
+    yield
+    devices.stop_room_state_refresher()
+
+
+def wait(client, since='', timeout=0.2):
+    response = client.get(f'/api/devices/ESP32_A/wait?since={since}&timeout={timeout}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_wait_and_state_share_the_version(local_db, device_client):
+    seed(local_db, school())
+    state = device_client.get('/api/devices/ESP32_A/state').get_json()
+
+    body = wait(device_client, since=state['v'])
+    assert body['changed'] is False and body['v'] == state['v']
+    assert {key: body[key] for key in ('room', 'session', 'roster')} == \
+        {key: state[key] for key in ('room', 'session', 'roster')}
+
+    # A stale or missing version answers at once
+    assert wait(device_client, since='stale', timeout=5)['changed'] is True
+    assert wait(device_client, timeout=5)['v'] == state['v']
+
+
+def test_session_change_wakes_the_waiter(local_db, device_client):
+    seed(local_db, school())
+    version = wait(device_client)['v']
+    answers = []
+    waiter = threading.Thread(target=lambda: answers.append(wait(device_client, since=version, timeout=10)))
+    waiter.start()
+    for _ in range(100):
+        if devices.room_states.waiters:
+            break
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    session = local_db.get_one(f'sessions/{DAY}/roomA', SESSION_ID)
+    assert sessions.update_session_fields(session, {'status': 'CLOSED'})
+    waiter.join()
+
+    assert time.monotonic() - started < 2
+    [answer] = answers
+    assert answer['changed'] is True and answer['v'] != version
+    assert answer['session'][0] == 'later'
+
+
+def test_waiters_over_the_cap_answer_at_once(local_db, device_client, monkeypatch):
+    seed(local_db, school())
+    version = wait(device_client)['v']
+    monkeypatch.setattr(devices, 'DEVICE_MAX_WAITERS', 0)
+
+    started = time.monotonic()
+    body = wait(device_client, since=version, timeout=10)
+    assert time.monotonic() - started < 1
+    assert body['changed'] is False and body['retry_after'] == devices.ROOM_STATE_REFRESH_SECONDS
+
+
+def test_wait_validation(local_db, device_client):
+    seed(local_db, school())
+    assert device_client.get('/api/devices/ESP32_A/wait?timeout=soon').status_code == 400
+    assert device_client.get('/api/devices/UNKNOWN/wait').status_code == 404
+
+
+def test_refresher_can_be_stopped():
+    devices.ensure_room_state_refresher()
+    thread = devices.room_state_refresher
+    assert thread.is_alive()
+    devices.stop_room_state_refresher()
+    assert not thread.is_alive() and devices.room_state_refresher is None
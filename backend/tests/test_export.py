@@ -0,0 +1,64 @@
+# tests/test_export.py
+import json
+
+import pytest
+from flask import Flask
+
+from routes.attendance import attendance_bp
+
+from conftest import seed
+
+DAYS = ('2026-01-05', '2026-01-06', '2026-01-07')
+
+
+@pytest.fixture
+def client(local_db):
+    app = Flask(__name__)
+    app.register_blueprint(attendance_bp)
+    return app.test_client()
+
+
+def school():
+    attendance = {}
+    for day in DAYS:
+        session_id = f"{day.replace('-', '')}_roomA_0800_G1"
+        attendance[session_id] = {'present': {'S1': {'name': 'Ali', 'time': '08:05'}},
+                                  'absent': {'S2': {'name': 'Sara'}}}
+    return {'students': {'S1': {'name': 'Ali', 'group': 'G1'}, 'S2': {'name': 'Sara', 'group': 'G1'}},
+            'attendance': attendance}
+
+
+def fail_reads_from(db, monkeypatch, key_prefix):
+    """Range reads of attendance starting at key_prefix fail, like a dropped connection"""
+    read_range = db.backend.read_range
+
+    def flaky(segments, start=None, end=None, limit_first=None, limit_last=None):
+        if segments == ['attendance'] and start and start.startswith(key_prefix):
+            raise ConnectionError('connection reset')
+        return read_range(segments, start, end, limit_first, limit_last)
+
+    monkeypatch.setattr(db.backend, 'read_range', flaky)
+
+
+def test_ndjson_export(local_db, client):
+    seed(local_db, school())
+    lines = client.get('/api/attendance/export?format=ndjson').get_data(as_text=True).splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert [(row['date'], row['status']) for row in rows] == [
+        (day, status) for day in DAYS for status in ('PRESENT', 'ABSENT')]
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_read_error_ends_the_export_with_a_trailer(local_db, client, monkeypatch, fmt):
+    seed(local_db, school())
+    fail_reads_from(local_db, monkeypatch, '20260106')
+    lines = client.get(f'/api/attendance/export?format={fmt}').get_data(as_text=True).splitlines()
+
+    # The first day is exported, then the error is written instead of silently stopping
+    if fmt == 'csv':
+        assert lines[0].startswith('date,') and len(lines) == 4
+        assert lines[-1] == '# export incomplete: connection reset'
+    else:
+        assert len(lines) == 3
+        assert json.loads(lines[-1]) == {'error': 'connection reset', 'complete': False}
+    assert all('2026-01-07' not in line for line in lines)
@@ -0,0 +1,71 @@
+# tests/test_key_range.py
+from services.storage import KEY_PREFIX_END, key_before, key_range, key_sort_value
+from utils import get_attendance_for_dates
+
+from conftest import seed
+
+
+def test_integer_keys_sort_before_strings():
+    keys = ['b', '10', 'a_1', '2', '-1', '2147483648', 'A']
+    assert sorted(keys, key=key_sort_value) == ['-1', '2', '10', '2147483648', 'A', 'a_1', 'b']
+
+
+def test_bounds_are_inclusive_and_prefix_end_covers_a_prefix():
+    node = {'20260105_roomA': 1, '20260105_roomB': 2, '20260106_roomA': 3, '20260107_roomA': 4}
+    assert list(key_range(node, '20260105_', '20260106_' + KEY_PREFIX_END)) == [
+        '20260105_roomA', '20260105_roomB', '20260106_roomA'
+    ]
+    assert list(key_range(node, '20260105_roomB', '20260106_roomA')) == ['20260105_roomB', '20260106_roomA']
+    assert list(key_range(node, start='20260107_')) == ['20260107_roomA']
+    assert list(key_range(node, end='20260105_roomA')) == ['20260105_roomA']
+
+
+def test_bare_date_bound_is_an_integer_key():
+    # YYYYMMDD alone is ordered as a number, before every string key
+    node = {'20260105_roomA': 1, '20260106_roomA': 2}
+    assert list(key_range(node, '20260106')) == ['20260105_roomA', '20260106_roomA']
+    assert list(key_range(node, '20260106_')) == ['20260106_roomA']
+
+
+def test_limits_keep_key_order():
+    node = {str(n): n for n in range(10)}
+    assert list(key_range(node, limit_first=3)) == ['0', '1', '2']
+    assert list(key_range(node, limit_last=3)) == ['7', '8', '9']
+    assert list(key_range(node, '4', '8', limit_last=2)) == ['7', '8']
+
+
+def test_list_nodes_and_empty_nodes():
+    assert key_range([None, 'a', None, 'c'], '1', '3') == {'1': 'a', '3': 'c'}
+    assert key_range(None) == {}
+    assert key_range('scalar') == {}
+
+
+def test_key_before_excludes_the_key_only():
+    keys = ['S1', 'S10', 'S2', 'S20', 'S3']
+    end = key_before('S2')
+    assert [key for key in keys if key_sort_value(key) <= key_sort_value(end)] == ['S1', 'S10']
+    assert list(key_range(dict.fromkeys(keys, True), end=key_before('S3'))) == ['S1', 'S10', 'S2', 'S20']
+
+
+def test_local_query_matches_key_range(local_db):
+    node = {f'2026010{day}_room{room}_0800_G1': {'n': day} for day in range(1, 8) for room in 'AB'}
+    seed(local_db, {'attendance': node})
+    for start, end, first, last in [('20260103_', '20260105_' + KEY_PREFIX_END, None, None),
+                                    (None, '20260102_roomB', None, None),
+                                    ('20260104_', None, 3, None),
+                                    (None, None, None, 2)]:
+        assert local_db.get_range('attendance', start, end, first, last) == key_range(node, start, end, first, last)
+
+
+def test_attendance_for_dates_reads_only_the_range(local_db):
+    seed(local_db, {'attendance': {
+        '20260104_roomA_0800_G1': {'absent': {'S1': True}}, '20260105_roomA_0800_G1': {'present': {'S1': True}},
+        '20260105_roomB_0800_G2': {'present': {'S2': True}}, '20260106_roomA_1000_G1': {'present': {'S1': True}},
+    }})
+    assert list(get_attendance_for_dates('2026-01-05', '2026-01-06')) == [
+        '20260105_roomA_0800_G1', '20260105_roomB_0800_G2', '20260106_roomA_1000_G1'
+    ]
+    assert list(get_attendance_for_dates('2026-01-05', '2026-01-05', room='roomB')) == ['20260105_roomB_0800_G2']
+    assert list(get_attendance_for_dates(end_date='2026-01-04')) == ['20260104_roomA_0800_G1']
+    assert list(get_attendance_for_dates(start_date='2026-01-07')) == []
+    assert len(get_attendance_for_dates()) == 4
@@ -0,0 +1,40 @@
+# tests/test_leader.py
+from services.leader import LeaderLease
+
+
+def test_failed_start_gives_the_lease_back(tmp_path):
+    lock_path = str(tmp_path / 'scheduler.lock')
+    attempts = []
+
+    def broken_start():
+        attempts.append(1)
+        raise RuntimeError('job store unavailable')
+
+    first = LeaderLease(lock_path, heartbeat_interval=3600)
+    first.on_elected = broken_start
+    first._tick()
+    assert attempts == [1] and not first.is_leader
+
+    # The lock is free again: another worker can be elected
+    second = LeaderLease(lock_path, heartbeat_interval=3600)
+    second.on_elected = lambda: None
+    second._tick()
+    assert second.is_leader
+    second.release()
+
+    # And the failed worker retries on its next heartbeat
+    first._tick()
+    assert attempts == [1, 1] and not first.is_leader
+
+
+def test_elected_worker_keeps_the_lease(tmp_path):
+    lock_path = str(tmp_path / 'scheduler.lock')
+    leader = LeaderLease(lock_path, heartbeat_interval=3600)
+    leader.on_elected = lambda: None
+    leader._tick()
+    follower = LeaderLease(lock_path, heartbeat_interval=3600)
+    follower.on_elected = lambda: None
+    follower._tick()
+    assert leader.is_leader and not follower.is_leader
+    assert follower.read_status()['pid'] == leader.describe()['pid']
+    leader.release()
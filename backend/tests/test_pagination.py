@@ -0,0 +1,172 @@
+# tests/test_pagination.py
+import pytest
+from flask import Flask
+
+from routes import attendance, sessions
+from routes.attendance import attendance_bp
+from routes.sessions import sessions_bp
+from routes.students import students_bp
+from services.pagination import MAX_PAGE_LIMIT, decode_cursor, encode_cursor, page_args, page_response
+
+from conftest import seed
+
+
+@pytest.fixture
+def client(local_db):
+    app = Flask(__name__)
+    for blueprint in (students_bp, sessions_bp, attendance_bp):
+        app.register_blueprint(blueprint)
+    return app.test_client()
+
+
+def walk(client, url, limit):
+    """All items of a paginated listing, following next_cursor"""
+    items, cursor = [], None
+    while True:
+        separator = '&' if '?' in url else '?'
+        page = client.get(f"{url}{separator}limit={limit}" + (f"&cursor={cursor}" if cursor else '')).get_json()
+        assert page['success'] and page['count'] <= limit
+        items.extend(page['data'])
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            return items
+        cursor = page['next_cursor']
+
+
+def test_cursor_round_trip():
+    position = ['2026-01-05', '08:00', '20260105_roomA_0800_G1']
+    assert decode_cursor(encode_cursor(position)) == position
+    assert '=' not in encode_cursor(position)
+
+
+@pytest.mark.parametrize('cursor', ['%%%', 'bm90IGpzb24', 'eyJhIjoxfQ', 'WzFd'])
+def test_invalid_cursors_are_rejected(cursor):
+    # not base64, not JSON ("not json"), not a list ({"a":1}), not strings ([1])
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_page_args():
+    assert page_args({}) is None
+    assert page_args({'limit': '10'}) == (10, None)
+    assert page_args({'limit': str(MAX_PAGE_LIMIT * 10)}) == (MAX_PAGE_LIMIT, None)
+    assert page_args({'cursor': encode_cursor(['S5'])})[1] == ['S5']
+    for args in ({'limit': '0'}, {'limit': 'ten'}, {'cursor': '%%%'}):
+        with pytest.raises(ValueError):
+            page_args(args)
+
+
+def test_page_response():
+    page = page_response([1, 2, 3], 2, lambda item: [str(item)])
+    assert page['data'] == [1, 2] and page['has_more']
+    assert decode_cursor(page['next_cursor']) == ['2']
+    last = page_response([3], 2, lambda item: [str(item)])
+    assert not last['has_more'] and last['next_cursor'] is None
+
+
+def test_students_pages_cover_the_listing(local_db, client):
+    seed(local_db, {'students': {f'S{n}': {'name': f'Student {n}', 'group': 'G1'} for n in range(1, 24)}})
+    full = client.get('/api/students').get_json()['data']
+    for limit in (1, 5, 23, 50):
+        assert walk(client, '/api/students', limit) == sorted(full, key=lambda student: student['id'])
+    assert client.get('/api/students?limit=0').status_code == 400
+    assert client.get('/api/students?cursor=bad').status_code == 400
+
+
+def test_short_page_resumes_from_its_cursor():
+    page = page_response([], 2, lambda item: [str(item)], resume=['2026-01-05'])
+    assert page['count'] == 0 and page['has_more']
+    assert decode_cursor(page['next_cursor']) == ['2026-01-05']
+
+
+def sessions_tree():
+    tree = {}
+    for day in ('2026-01-05', '2026-01-06', '2026-01-08'):
+        for room in ('roomA', 'roomB'):
+            for start in ('08:00', '10:00', '14:00'):
+                session_id = f"{day.replace('-', '')}_{room}_{start.replace(':', '')}_G1"
+                tree.setdefault(day, {}).setdefault(room, {})[session_id] = {
+                    'session_id': session_id, 'date': day, 'room': room, 'start': start,
+                    'end': '23:00', 'group': 'G1', 'status': 'CLOSED' if start == '08:00' else 'SCHEDULED'
+                }
+    return tree
+
+
+def test_sessions_pages_cover_the_listing(local_db, client):
+    seed(local_db, {'sessions': sessions_tree()})
+
+    full = client.get('/api/sessions').get_json()['data']
+    for limit in (1, 4, 7, 100):
+        paged = walk(client, '/api/sessions', limit)
+        assert paged == sorted(
+            full, key=lambda session: (session['date'], session['start'], session['session_id']), reverse=True
+        )
+
+    scheduled = walk(client, '/api/sessions?status=SCHEDULED', 3)
+    assert len(scheduled) == 12 and all(session['status'] == 'SCHEDULED' for session in scheduled)
+    one_day = walk(client, '/api/sessions?date=2026-01-06', 4)
+    assert len(one_day) == 6 and {session['date'] for session in one_day} == {'2026-01-06'}
+
+
+def test_sparse_session_filters_stop_at_the_day_cap(local_db, client, monkeypatch):
+    monkeypatch.setattr(sessions, 'MAX_PAGE_SCAN_DAYS', 1)
+    seed(local_db, {'sessions': sessions_tree()})
+    first = client.get('/api/sessions?status=CLOSED&limit=5').get_json()
+    # One date node read: a short page and a cursor to resume before it
+    assert first['count'] == 2 and first['has_more']
+    closed = walk(client, '/api/sessions?status=CLOSED', 5)
+    assert [session['date'] for session in closed] == ['2026-01-08'] * 2 + ['2026-01-06'] * 2 + ['2026-01-05'] * 2
+
+
+def attendance_tree():
+    attendance, sessions = {}, {}
+    for day in ('2026-01-05', '2026-01-07'):
+        for start in ('08:00', '10:00'):
+            session_id = f"{day.replace('-', '')}_roomA_{start.replace(':', '')}_G1"
+            sessions.setdefault(day, {}).setdefault('roomA', {})[session_id] = {
+                'session_id': session_id, 'date': day, 'room': 'roomA', 'start': start,
+                'end': '12:00', 'group': 'G1', 'subject': 'Maths', 'status': 'CLOSED'
+            }
+            attendance[session_id] = {
+                'present': {f'S{n}': {'name': f'Student {n}', 'time': start} for n in range(1, 4)},
+                'absent': {'S4': {'name': 'Student 4'}}
+            }
+    return {'sessions': sessions, 'attendance': attendance}
+
+
+def test_attendance_pages_cover_the_listing(local_db, client):
+    seed(local_db, attendance_tree())
+
+    def keys(records):
+        return [(record['session_id'], record['student_id']) for record in records]
+
+    full = client.get('/api/attendance').get_json()['data']
+    for limit in (1, 3, 16, 40):
+        paged = walk(client, '/api/attendance', limit)
+        assert len(paged) == 16
+        assert sorted(keys(paged)) == sorted(keys(full))
+        assert keys(paged) == sorted(keys(paged), reverse=True)
+
+    one_day = walk(client, '/api/attendance?date=2026-01-05', 3)
+    assert {record['session_id'][:8] for record in one_day} == {'20260105'}
+
+
+def test_sparse_attendance_filters_stop_at_the_day_cap(local_db, client, monkeypatch):
+    monkeypatch.setattr(attendance, 'MAX_PAGE_SCAN_DAYS', 1)
+    seed(local_db, attendance_tree())
+    first = client.get('/api/attendance?group=G1&limit=20').get_json()
+    assert first['count'] == 8 and first['has_more']
+    assert len(walk(client, '/api/attendance?group=G1', 20)) == 16
+    assert walk(client, '/api/attendance?room=roomB', 20) == []
+
+
+def test_student_pages_come_from_the_student_index(local_db, client, monkeypatch):
+    monkeypatch.setattr(attendance, 'MAX_PAGE_SCAN_DAYS', 1)
+    seed(local_db, attendance_tree())
+    full = client.get('/api/attendance?student_id=S4').get_json()['data']
+    paged = walk(client, '/api/attendance?student_id=S4', 1)
+    assert len(paged) == 4 and all(record['status'] == 'ABSENT' for record in paged)
+    assert [record['session_id'] for record in paged] == sorted(
+        (record['session_id'] for record in full), reverse=True)
+    # Not limited by the day cap: one read of attendance_by_student/S4
+    assert client.get('/api/attendance?student_id=S1&limit=10').get_json()['count'] == 4
@@ -0,0 +1,48 @@
+# tests/test_replica.py
+from conftest import seed
+
+
+def test_replica_follows_backend_writes(local_db):
+    seed(local_db, {'sessions': {'2026-01-05': {'roomA': {'s1': {'status': 'SCHEDULED'}}}}})
+    local_db.enable_replica(('sessions',))
+    assert local_db.replica_status()['paths']['sessions']['synced']
+
+    # Written behind FirebaseConfig's back: only the listen() event updates the copy
+    local_db.backend.reference('sessions/2026-01-05/roomA/s1/status').set('ACTIVE')
+    assert local_db.get_one('sessions/2026-01-05/roomA', 's1') == {'status': 'ACTIVE'}
+
+
+def test_replica_reads_its_own_writes_before_the_echo(local_db):
+    seed(local_db, {'sessions': {}, 'students': {'S1': {'name': 'A'}}})
+    local_db.enable_replica(('sessions', 'students'))
+    # firebase_admin delivers listen() events later: drop them altogether
+    local_db.backend._listeners.clear()
+
+    local_db.update_at_path('/', {'sessions/2026-01-05/roomA/s1': {'status': 'SCHEDULED'}})
+    assert local_db.get_one('sessions/2026-01-05/roomA', 's1') == {'status': 'SCHEDULED'}
+
+    local_db.update('sessions/2026-01-05/roomA', 's1', {'status': 'ACTIVE'})
+    assert local_db.get_one('sessions/2026-01-05/roomA', 's1') == {'status': 'ACTIVE'}
+    assert local_db.get_range('sessions', '2026-01-05', '2026-01-05') == {
+        '2026-01-05': {'roomA': {'s1': {'status': 'ACTIVE'}}}
+    }
+
+    local_db.create('students', {'name': 'B'}, key='S2')
+    local_db.delete('students', 'S1')
+    assert local_db.get_all('students') == {'S2': {'name': 'B'}}
+
+    local_db.delete_at_path('sessions/2026-01-05')
+    assert local_db.get_all('sessions/2026-01-05') == {}
+
+
+def test_created_session_is_readable_in_replica_mode(local_db):
+    from routes.sessions import create_session, get_session_by_id
+
+    seed(local_db, {'sessions': {'2026-01-05': {'roomA': {'s0': {'session_id': 's0'}}}}})
+    local_db.enable_replica(('sessions',))
+    local_db.backend._listeners.clear()
+
+    session_id = '20260105_roomA_0800_G1'
+    assert create_session({'session_id': session_id, 'date': '2026-01-05', 'room': 'roomA',
+                           'group': 'G1', 'start': '08:00', 'end': '10:00', 'status': 'SCHEDULED'})
+    assert get_session_by_id(session_id)['status'] == 'SCHEDULED'
@@ -0,0 +1,87 @@
+# tests/test_scheduler_catch_up.py
+from datetime import datetime
+
+import pytest
+
+import routes.sessions as sessions
+from conftest import seed
+
+TODAY = '2026-01-05'  # a Monday
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 1, 5, 10, 0)
+
+
+@pytest.fixture
+def at_ten(monkeypatch):
+    monkeypatch.setattr(sessions, 'datetime', FrozenDatetime)
+
+
+def session(session_id, room, group, start, end, status):
+    return {'session_id': session_id, 'date': TODAY, 'room': room, 'group': group,
+            'subject': 'Maths', 'start': start, 'end': end, 'status': status}
+
+
+def school(day_sessions=None):
+    return {
+        'students': {
+            'S1': {'name': 'Ali', 'group': 'G1', 'fingerprint_id': 1},
+            'S2': {'name': 'Sara', 'group': 'G2', 'fingerprint_id': 2},
+            'S3': {'name': 'Omar', 'group': 'G1', 'fingerprint_id': 3, 'active': False},
+        },
+        'group_members': {'G1': {'S1': True, 'S3': True}, 'G2': {'S2': True}},
+        'sessions': {TODAY: day_sessions} if day_sessions else {},
+    }
+
+
+def test_catch_up_applies_missed_transitions(local_db, at_ten):
+    seed(local_db, school({
+        'roomA': {
+            'missed': session('missed', 'roomA', 'G1', '09:20', '11:00', 'SCHEDULED'),
+            'later': session('later', 'roomA', 'G1', '14:00', '16:00', 'SCHEDULED'),
+        },
+        'roomB': {'overdue': session('overdue', 'roomB', 'G2', '08:00', '09:30', 'ACTIVE')},
+    }))
+    local_db.update_at_path('/', {'attendance/overdue/present/S2': {'name': 'Sara', 'time': '08:05'}})
+
+    sessions.catch_up_missed_runs(['activate_missed', 'close_overdue'])
+
+    day = local_db.get_all(f'sessions/{TODAY}')
+    assert day['roomA']['missed']['status'] == 'ACTIVE'
+    assert day['roomA']['later']['status'] == 'SCHEDULED'
+    assert day['roomB']['overdue']['status'] == 'CLOSED'
+    # Activation writes the absent roster (active members only)
+    assert local_db.get_all('attendance/missed/absent') == {'S1': {'name': 'Ali'}}
+    # Closing copies the sheet into the per-student index
+    assert local_db.get_at_path('attendance_by_student/S2/overdue')['status'] == 'PRESENT'
+
+
+def test_grace_window_only_bounds_the_regular_activation(local_db, at_ten):
+    # Started 40 minutes ago: past ACTIVATION_GRACE_MINUTES but still running
+    seed(local_db, school({'roomA': {'missed': session('missed', 'roomA', 'G1', '09:20', '11:00', 'SCHEDULED')}}))
+
+    sessions.auto_activate_scheduled_sessions_job()
+    assert local_db.get_at_path(f'sessions/{TODAY}/roomA/missed/status') == 'SCHEDULED'
+
+    sessions.reconcile_sessions_job()
+    assert local_db.get_at_path(f'sessions/{TODAY}/roomA/missed/status') == 'ACTIVE'
+
+
+def test_catch_up_generates_today_when_nothing_exists(local_db, at_ten):
+    tree = school()
+    tree.update({
+        'rooms': {'roomA': {'esp32_id': 'ESP32_A'}},
+        'schedule': {'roomA': {'monday': [{'start': '09:30', 'end': '11:00', 'group': 'G1', 'subject': 'Maths'}]}},
+    })
+    seed(local_db, tree)
+
+    sessions.catch_up_missed_runs([])
+
+    day = local_db.get_all(f'sessions/{TODAY}')
+    [(session_id, generated)] = day['roomA'].items()
+    assert session_id == '20260105_roomA_0930_G1'
+    # Generated, then activated by the reconcile pass of the same catch-up
+    assert generated['status'] == 'ACTIVE'
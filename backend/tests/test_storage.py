@@ -0,0 +1,95 @@
+# tests/test_storage.py
+from services.storage import LocalBackend
+
+from conftest import seed
+
+
+def test_set_get_and_child_paths():
+    backend = LocalBackend(seed_path=None)
+    ref = backend.reference('rooms')
+    ref.child('roomA').set({'esp32_id': 'ESP32_A'})
+    assert backend.reference('rooms/roomA/esp32_id').get() == 'ESP32_A'
+    assert backend.reference('/rooms/').get() == {'roomA': {'esp32_id': 'ESP32_A'}}
+    assert backend.reference('rooms/missing').get() is None
+
+
+def test_multi_path_update_sets_and_deletes():
+    backend = LocalBackend(seed_path=None)
+    root = backend.reference('/')
+    root.update({'students/S1': {'name': 'A', 'group': 'G1'}, 'group_members/G1/S1': True})
+    root.update({'students/S1/group': 'G2', 'group_members/G1/S1': None, 'group_members/G2/S1': True})
+
+    assert backend.reference('students/S1').get() == {'name': 'A', 'group': 'G2'}
+    # Empty parents are pruned, like the RTDB
+    assert backend.reference('group_members').get() == {'G2': {'S1': True}}
+
+
+def test_update_requires_a_non_empty_dict():
+    backend = LocalBackend(seed_path=None)
+    try:
+        backend.reference('students').update({})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('empty update accepted')
+
+
+def test_write_into_legacy_list_converts_to_dict():
+    backend = LocalBackend(seed_path=None)
+    backend.reference('students').set([{'name': 'A'}, {'name': 'B'}])
+    backend.reference('students/S3').set({'name': 'C'})
+    assert backend.reference('students').get() == {'0': {'name': 'A'}, '1': {'name': 'B'}, 'S3': {'name': 'C'}}
+
+
+def test_transaction_and_push():
+    backend = LocalBackend(seed_path=None)
+    counter = backend.reference('counters/student_id')
+    assert counter.transaction(lambda current: (current or 0) + 5) == 5
+    assert counter.transaction(lambda current: current + 1) == 6
+
+    first = backend.reference('logs').push({'n': 1})
+    second = backend.reference('logs').push({'n': 2})
+    assert first.key < second.key
+    assert list(backend.reference('logs').get()) == [first.key, second.key]
+
+
+def test_listen_gets_initial_put_then_changes():
+    backend = LocalBackend(seed_path=None)
+    backend.reference('sessions/2026-01-05/roomA/s1').set({'status': 'SCHEDULED'})
+    events = []
+    registration = backend.reference('sessions').listen(events.append)
+
+    # Multi-path update below the listener: one patch relative to it
+    backend.reference('sessions/2026-01-05').update({'roomA/s1/status': 'ACTIVE'})
+    # From above the listener: one put per written path
+    backend.reference('/').update({'sessions/2026-01-05/roomA/s1/status': 'CLOSED'})
+    backend.reference('sessions/2026-01-05/roomA/s1').delete()
+    registration.close()
+    backend.reference('sessions/2026-01-06/roomA/s2').set({'status': 'SCHEDULED'})
+
+    assert [(event.event_type, event.path, event.data) for event in events] == [
+        ('put', '/', {'2026-01-05': {'roomA': {'s1': {'status': 'SCHEDULED'}}}}),
+        ('patch', '/2026-01-05', {'roomA/s1/status': 'ACTIVE'}),
+        ('put', '/2026-01-05/roomA/s1/status', 'CLOSED'),
+        ('put', '/2026-01-05/roomA/s1', None),
+    ]
+
+
+def test_firebase_config_reads_and_cache_invalidation(local_db):
+    seed(local_db, {'rooms': {'roomA': {'esp32_id': 'ESP32_A'}}})
+    assert local_db.get_all('rooms') == {'roomA': {'esp32_id': 'ESP32_A'}}
+    assert local_db.get_all('nothing') == {}
+    assert local_db.get_one('rooms', 'missing') is None
+
+    # Cached collection: a write through FirebaseConfig is seen right away
+    local_db.update('rooms', 'roomA', {'esp32_id': 'ESP32_Z'})
+    assert local_db.get_one('rooms', 'roomA') == {'esp32_id': 'ESP32_Z'}
+    local_db.update_at_path('/', {'rooms/roomB': {'esp32_id': 'ESP32_B'}})
+    assert sorted(local_db.get_all('rooms')) == ['roomA', 'roomB']
+
+
+def test_legacy_list_lookup_by_fingerprint(local_db):
+    seed(local_db, {'students': [{'name': 'A', 'fingerprint_id': 1}, {'name': 'B', 'fingerprint_id': 2}]})
+    assert local_db.get_one('students', '2', legacy_list=True) == {'name': 'B', 'fingerprint_id': 2}
+    assert local_db.update('students', '2', {'group': 'G1'}, legacy_list=True)
+    assert local_db.get_all('students')[1]['group'] == 'G1'
@@ -0,0 +1,101 @@
+# tests/test_student_attendance.py
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from routes import attendance
+from routes.sessions import activation_roster_updates, commit_session_updates, update_session_fields
+from utils import attendance_index
+
+from conftest import seed
+
+DAY = '2026-01-05'
+SESSION_ID = '20260105_roomA_0800_G1'
+PAST_ID = '20260102_roomA_0800_G1'
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 1, 5, 8, 30)
+
+
+@pytest.fixture
+def client(local_db, monkeypatch):
+    monkeypatch.setattr(attendance, 'datetime', FrozenDatetime)
+    app = Flask(__name__)
+    app.register_blueprint(attendance.attendance_bp)
+    return app.test_client()
+
+
+def session():
+    return {'session_id': SESSION_ID, 'date': DAY, 'room': 'roomA', 'group': 'G1',
+            'subject': 'Maths', 'start': '08:00', 'end': '10:00', 'status': 'SCHEDULED'}
+
+
+def school():
+    return {
+        'students': {
+            'S1': {'name': 'Ali', 'group': 'G1', 'fingerprint_id': 1},
+            'S3': {'name': 'Omar', 'group': 'G1', 'fingerprint_id': 3},
+        },
+        'group_members': {'G1': {'S1': True, 'S3': True}},
+        'sessions': {DAY: {'roomA': {SESSION_ID: session()}}},
+        # Past session already closed and copied to the index
+        'attendance': {PAST_ID: {'present': {'S1': {'name': 'Ali', 'time': '08:05'}}}},
+        'attendance_by_student': {'S1': {PAST_ID: {'status': 'PRESENT', 'time': '08:05'}}},
+    }
+
+
+def device_scan(db, student_id, time):
+    """What an ESP32 writes: attendance/<session_id> only, not the index"""
+    db.update_at_path('/', {
+        f"attendance/{SESSION_ID}/present/{student_id}": {'name': 'Ali', 'time': time},
+        f"attendance/{SESSION_ID}/absent/{student_id}": None,
+    })
+
+
+def today_status(client, student_id):
+    body = client.get(f'/api/attendance/student/{student_id}/today').get_json()
+    assert body['success']
+    return body['is_absent'], {r['session_id']: r['status'] for r in body['attendance_records']}
+
+
+def test_device_marks_show_before_the_session_closes(local_db, client):
+    seed(local_db, school())
+    assert commit_session_updates(activation_roster_updates(session()))
+    assert today_status(client, 'S1') == (True, {SESSION_ID: 'ABSENT'})
+
+    device_scan(local_db, 'S1', '08:12')
+    assert today_status(client, 'S1') == (False, {SESSION_ID: 'PRESENT'})
+    assert today_status(client, 'S3') == (True, {SESSION_ID: 'ABSENT'})
+
+    history = client.get('/api/attendance/student/S1').get_json()
+    by_session = {record['session_id']: record for record in history['data']}
+    assert by_session[SESSION_ID]['status'] == 'PRESENT' and by_session[SESSION_ID]['time'] == '08:12'
+    assert history['stats']['present'] == 2
+
+    # Closing copies the sheet into the index and drops the live mark
+    assert update_session_fields({**session(), 'status': 'ACTIVE'}, {'status': 'CLOSED'})
+    entry = local_db.get_one('attendance_by_student/S1', SESSION_ID)
+    assert entry['status'] == 'PRESENT' and 'live' not in entry
+
+
+def test_only_open_sessions_are_read_back(local_db):
+    seed(local_db, school())
+    assert commit_session_updates(activation_roster_updates(session()))
+    # A closed past session is served from the index alone
+    local_db.update_at_path('/', {f'attendance/{PAST_ID}': None})
+    device_scan(local_db, 'S1', '08:12')
+    history = attendance_index.live_history('S1')
+    assert history[PAST_ID]['status'] == 'PRESENT'
+    assert history[SESSION_ID]['status'] == 'PRESENT'
+
+
+def test_rebuild_marks_open_sessions_live(local_db):
+    seed(local_db, school())
+    device_scan(local_db, 'S1', '08:12')
+    attendance_index.rebuild()
+    assert local_db.get_one('attendance_by_student/S1', SESSION_ID)['live'] is True
+    assert 'live' not in local_db.get_one('attendance_by_student/S1', PAST_ID)
@@ -1,6 +1,43 @@
 # utils.py
 from datetime import datetime, timedelta
-from firebase_config import firebase
+from firebase_config import firebase, KEY_PREFIX_END
+from services.indexes import AttendanceByStudentIndex, FingerprintIndex, GroupMembersIndex, session_date_prefix
+from services.counters import IdAllocator
+
+# fingerprint_id -> student_id, kept in sync by the students endpoints
+fingerprint_index = FingerprintIndex(firebase)
+# group_members/<group_id>/<student_id>, kept in sync by the students endpoints
+group_members = GroupMembersIndex(firebase)
+
+def _iter_students():
+    students = firebase.get_all('students') or {}
+    if isinstance(students, list):
+        return [(f"S{idx + 1}", student) for idx, student in enumerate(students)]
+    return list(students.items())
+
+def get_students_by_id():
+    """{student_id: student} in one read (legacy list layout included)"""
+    return dict(_iter_students())
+
+def max_student_number():
+    """Highest numeric part of existing S<n> student IDs (counter seed)"""
+    numbers = [0]
+    for student_id, _ in _iter_students():
+        if str(student_id).startswith('S') and str(student_id)[1:].isdigit():
+            numbers.append(int(student_id[1:]))
+    return max(numbers)
+
+def max_fingerprint_id():
+    """Highest fingerprint_id in use (counter seed)"""
+    used_ids = [0]
+    for _, student in _iter_students():
+        if isinstance(student, dict) and str(student.get('fingerprint_id', '')).isdigit():
+            used_ids.append(int(student['fingerprint_id']))
+    return max(used_ids)
+
+# Counters under counters/, advanced by transaction
+student_ids = IdAllocator(firebase, 'student_id', seed=max_student_number)
+fingerprint_ids = IdAllocator(firebase, 'fingerprint_id', seed=max_fingerprint_id)
 
 # utils.py (add these functions if not present)
 
@@ -45,6 +82,51 @@ def check_for_scheduled_session(esp32_id):
     
     return None, "No scheduled session found"
 
+def iter_room_sessions(room_sessions):
+    """Yield session dicts from a room node (keyed by session_id or legacy list)"""
+    if isinstance(room_sessions, dict):
+        values = room_sessions.values()
+    elif isinstance(room_sessions, list):
+        values = room_sessions
+    else:
+        return
+    for session in values:
+        if isinstance(session, dict):
+            yield session
+
+def find_session(all_sessions, date, room, session_id):
+    """Find a session in a tree loaded from sessions/ (either layout)"""
+    date_sessions = all_sessions.get(date) if isinstance(all_sessions, dict) else None
+    if not isinstance(date_sessions, dict):
+        return None
+    room_sessions = date_sessions.get(room)
+    if isinstance(room_sessions, dict) and isinstance(room_sessions.get(session_id), dict):
+        return room_sessions[session_id]
+    for session in iter_room_sessions(room_sessions):
+        if session.get('session_id') == session_id:
+            return session
+    return None
+
+# attendance_by_student/<student_id>/<session_id>, written with each present/absent mark
+attendance_index = AttendanceByStudentIndex(firebase, find_session=find_session)
+
+def get_attendance_for_dates(start_date=None, end_date=None, room=None):
+    """Attendance nodes between two dates (YYYY-MM-DD, inclusive) via a key-range query
+
+    Keys are YYYYMMDD_room_HHMM_group: the date is a key prefix, and for a
+    single day so is the room. Bounds keep the trailing '_' because a bare
+    YYYYMMDD would be ordered as an integer key, before every string key.
+    Without dates the whole tree is read.
+    """
+    if not start_date and not end_date:
+        return firebase.get_all('attendance') or {}
+
+    start = f"{session_date_prefix(start_date)}_" if start_date else None
+    end = f"{session_date_prefix(end_date)}_" if end_date else None
+    if room and start and start == end:
+        start = end = f"{start}{room}_"
+    return firebase.get_range('attendance', start, end + KEY_PREFIX_END if end else None)
+
 def calculate_session_stats(date, room_id, group_id):
     """Calculate attendance statistics for a session"""
     try:
@@ -60,9 +142,7 @@ def calculate_session_stats(date, room_id, group_id):
         group_name = group.get('name', group_id)
         
         # Count students in group
-        all_students = firebase.get_all('students') or {}
-        students_in_group = sum(1 for student in all_students.values() 
-                               if isinstance(student, dict) and student.get('group') == group_id)
+        students_in_group = group_members.count(group_id)
         
         stats = {
             'date': date,
@@ -89,15 +169,13 @@ def get_active_session_for_room(room_id):
         current_date = now.strftime('%Y-%m-%d')
         current_time = now.strftime('%H:%M')
         
-        # Get today's sessions
-        today_sessions = firebase.get_all(f'sessions/{current_date}') or {}
+        # Get today's sessions for this room only
+        room_sessions = firebase.get_all(f'sessions/{current_date}/{room_id}') or {}
         
-        for room_session_data in today_sessions.values():
-            if isinstance(room_session_data, dict):
-                if (room_session_data.get('room') == room_id and 
-                    room_session_data.get('status') == 'ACTIVE' and
-                    room_session_data.get('start') <= current_time <= room_session_data.get('end')):
-                    return room_session_data
+        for session in iter_room_sessions(room_sessions):
+            if (session.get('status') == 'ACTIVE' and
+                session.get('start', '') <= current_time <= session.get('end', '')):
+                return session
         
         return None
     except Exception as e:
@@ -114,29 +192,33 @@ def get_today_schedule_for_room(room_id):
         print(f"Error in get_today_schedule_for_room: {e}")
         return {}
 
-# utils.py - Update the get_student_by_fingerprint function
 def get_student_by_fingerprint(fingerprint_id):
-    students = firebase.get_all('students') or []
-    fingerprint_id = int(fingerprint_id)
-
-    for index, student in enumerate(students):
-        if student.get('fingerprint_id') == fingerprint_id:
-            return index, student
+    """Get student by fingerprint ID via the fingerprint index, returns (student_id, student_data)"""
+    try:
+        fingerprint_id = int(fingerprint_id)
+    except (TypeError, ValueError):
+        return None, None
 
+    student_id = fingerprint_index.lookup(fingerprint_id)
+    for attempt in range(2):
+        if not student_id:
+            return None, None
+        student = firebase.get_one('students', student_id)
+        if isinstance(student, dict) and str(student.get('fingerprint_id')) == str(fingerprint_id):
+            return student_id, student
+        # Stale in-memory entry (changed by another worker): re-read the index node once
+        if attempt == 0:
+            student_id = fingerprint_index.refresh(fingerprint_id)
     return None, None
 
+def is_fingerprint_taken(fingerprint_id, student_id=None):
+    """Check fingerprint uniqueness against the index node (ignores student_id itself)"""
+    owner_id = fingerprint_index.refresh(fingerprint_id)
+    if not owner_id or owner_id == student_id:
+        return False
+    owner = firebase.get_one('students', owner_id)
+    return isinstance(owner, dict) and str(owner.get('fingerprint_id')) == str(fingerprint_id)
+
 def get_next_session_id():
-    """Generate next student ID"""
-    students = firebase.get_all('students') or []
-    if not students:
-        return 1
-    
-    # Find max fingerprint_id
-    max_id = 0
-    for student in students:
-        if isinstance(student, dict):
-            fid = student.get('fingerprint_id')
-            if fid and fid > max_id:
-                max_id = fid
-    
-    return max_id + 1
\ No newline at end of file
+    """Generate next fingerprint ID (from the fingerprint_id counter)"""
+    return fingerprint_ids.next()